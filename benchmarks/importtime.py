@@ -0,0 +1,136 @@
+"""Cold-start import benchmark for Cliqq's entry paths.
+
+Each entry path runs in a fresh interpreter under ``python -X importtime``.
+The cumulative import time of everything it loads is reported, and modules
+that must stay lazy on that path are checked.
+
+Usage:
+    python benchmarks/importtime.py            # report
+    python benchmarks/importtime.py --check    # exit 1 on regression
+    python benchmarks/importtime.py --save     # record a new baseline
+
+Baselines are machine specific, re-record them when changing machines.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).parent / "baselines" / "importtime.json"
+
+# what each entry path has to import before it can do its job
+ENTRY_PATHS = {
+    # argv parsing and every command except /q: /help, /log, /wipe, ...
+    "startup": "import cliqq.main",
+    # building the prompt context for a question
+    "prompt": (
+        "import cliqq.main\n"
+        "from cliqq.prep import prep_prompt\n"
+        "prep_prompt('hi', '<SHELL>')"
+    ),
+    # sending a prompt to the API
+    "network": (
+        "import cliqq.main\n"
+        "from cliqq.models import ApiConfig\n"
+        "api_config = ApiConfig()\n"
+        "api_config.set_config({'model_name': 'm', 'base_url': 'http://b', 'api_key': 'k'})\n"
+        "api_config.client"
+    ),
+}
+
+# heavy dependencies that must not be imported on each path
+LAZY_MODULES = {
+    "startup": ["openai", "httpx", "psutil", "dotenv"],
+    "prompt": ["openai", "httpx", "dotenv"],
+    "network": [],
+}
+
+# allowed slowdown over the baseline before --check fails
+TOLERANCE = 1.5
+SLACK_MS = 20.0
+
+
+def import_profile(code: str) -> dict[str, float]:
+    """Run `code` in a fresh interpreter and return the cumulative import
+    time in milliseconds of every module it imported."""
+
+    env = dict(os.environ, PYTHONPATH=str(ROOT / "src"))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env,
+    )
+
+    profile = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # nested imports are indented, only keep top-level entries in the total
+        profile[name.rstrip()] = float(cumulative) / 1000
+    return profile
+
+
+def total_ms(profile: dict[str, float]) -> float:
+    return sum(ms for name, ms in profile.items() if not name.startswith("  "))
+
+
+def imported(profile: dict[str, float]) -> set[str]:
+    return {name.strip() for name in profile}
+
+
+def measure(runs: int) -> dict[str, float]:
+    results = {}
+    for path, code in ENTRY_PATHS.items():
+        totals = [total_ms(import_profile(code)) for _ in range(runs)]
+        results[path] = statistics.median(totals)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--save", action="store_true")
+    args = parser.parse_args()
+
+    failed = False
+
+    for path, code in ENTRY_PATHS.items():
+        loaded = imported(import_profile(code))
+        for module in LAZY_MODULES[path]:
+            if module in loaded:
+                print(f"FAIL {path}: imports {module}")
+                failed = True
+
+    results = measure(args.runs)
+    baseline = {}
+    if BASELINE_PATH.exists():
+        baseline = json.loads(BASELINE_PATH.read_text(encoding="utf-8"))
+
+    for path, ms in results.items():
+        line = f"{path:<10} {ms:8.1f} ms"
+        if path in baseline:
+            line += f"   (baseline {baseline[path]:.1f} ms)"
+            if args.check and ms > baseline[path] * TOLERANCE + SLACK_MS:
+                line += "   REGRESSION"
+                failed = True
+        print(line)
+
+    if args.save:
+        BASELINE_PATH.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print(f"baseline saved to {BASELINE_PATH}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
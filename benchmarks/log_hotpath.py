@@ -0,0 +1,100 @@
+"""Logging benchmark: time spent on the calling thread per log record, for the
+old handler that reopened the log file on every flush against the queued
+pipeline with a persistent file handle.
+
+Usage:
+    python benchmarks/log_hotpath.py                 # 20000 records
+    python benchmarks/log_hotpath.py --records 100000 --buffer 1
+"""
+
+import argparse
+import logging
+import logging.handlers
+import queue
+import tempfile
+import time
+from pathlib import Path
+
+from cliqq.log import BufferingFileHandler, LogWriter
+
+
+class ReopeningFileHandler(logging.Handler):
+    """The previous handler: buffers records, then opens the file, writes
+    and closes it again on every flush."""
+
+    def __init__(self, path: Path, buffer_size: int):
+        super().__init__()
+        self._buffer_size = buffer_size
+        self._buffer: list[str] = []
+        self._filename = path
+
+    def emit(self, record: logging.LogRecord):
+        self._buffer.append(self.format(record))
+        if len(self._buffer) >= self._buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            with open(self._filename, "a", encoding="utf-8") as f:
+                f.write("".join(self._buffer) + "\n\n")
+            self._buffer.clear()
+
+
+def timed(logger: logging.Logger, records: int) -> float:
+    """Microseconds per record on the calling thread."""
+
+    start = time.perf_counter()
+    for i in range(records):
+        logger.debug("record %d of the benchmark, with some text", i)
+    return (time.perf_counter() - start) / records * 1e6
+
+
+def make_logger(name: str, handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    logger.addHandler(handler)
+    return logger
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--buffer", type=int, default=1, help="records per flush")
+    args = parser.parse_args()
+
+    formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+
+        old = ReopeningFileHandler(directory / "old.log", args.buffer)
+        old.setFormatter(formatter)
+        old_us = timed(make_logger("bench.old", old), args.records)
+
+        new = BufferingFileHandler("direct.log", args.buffer, directory=directory)
+        new.setFormatter(formatter)
+        direct_us = timed(make_logger("bench.direct", new), args.records)
+        new.close()
+
+        log_queue: queue.Queue = queue.Queue()
+        queued = BufferingFileHandler("queued.log", args.buffer, directory=directory)
+        queued.setFormatter(formatter)
+        writer = LogWriter(log_queue, queued)
+        writer.start()
+        logger = make_logger("bench.queued", logging.handlers.QueueHandler(log_queue))
+        queued_us = timed(logger, args.records)
+        start = time.perf_counter()
+        writer.stop()
+        drain_ms = (time.perf_counter() - start) * 1000
+        queued.close()
+
+    print(f"{args.records} records, flush every {args.buffer}")
+    print(f"reopen per flush  {old_us:8.2f} us/record")
+    print(f"persistent handle {direct_us:8.2f} us/record ({old_us / direct_us:.1f}x)")
+    print(f"queued            {queued_us:8.2f} us/record ({old_us / queued_us:.1f}x)")
+    print(f"queue drain       {drain_ms:8.1f} ms (on exit)")
+
+
+if __name__ == "__main__":
+    main()
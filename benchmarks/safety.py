@@ -0,0 +1,88 @@
+"""Safety classifier benchmark: the compiled classifier against the old
+linear scan over every rule, with thousands of rules and long pipelines.
+
+Usage:
+    python benchmarks/safety.py                 # 5000 rules, 40-stage pipelines
+    python benchmarks/safety.py --rules 20000 --stages 100
+"""
+
+import argparse
+import random
+import string
+import time
+
+from cliqq.safety import SafetyClassifier
+
+
+def linear_classify(command: str, deny: list[str], confirm: list[str]) -> str:
+    """The previous classifier: a substring scan over every rule."""
+
+    lowered = command.lower()
+    if any(token in lowered for token in deny):
+        return "deny"
+    if any(token in lowered for token in confirm):
+        return "confirm"
+    return "safe"
+
+
+def synthetic_rules(count: int, rng: random.Random) -> list[str]:
+    """Rules shaped like the real ones: a program name and maybe an option."""
+
+    rules = []
+    for _ in range(count):
+        name = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9)))
+        option = rng.choice(["", " -rf", " --force", " /q", " install"])
+        rules.append(name + option)
+    return rules
+
+
+def synthetic_commands(count: int, stages: int, rng: random.Random) -> list[str]:
+    """Long, mostly harmless pipelines."""
+
+    words = ["cat", "grep -v foo", "sort", "uniq -c", "awk '{print $1}'", "head"]
+    return [
+        " | ".join(rng.choice(words) for _ in range(stages)) + f" > out{i}.txt"
+        for i in range(count)
+    ]
+
+
+def timed(fn, commands: list[str]) -> float:
+    """Seconds per command."""
+
+    start = time.perf_counter()
+    for command in commands:
+        fn(command)
+    return (time.perf_counter() - start) / len(commands)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules", type=int, default=5000)
+    parser.add_argument("--stages", type=int, default=40)
+    parser.add_argument("--commands", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    deny = synthetic_rules(args.rules // 2, rng)
+    confirm = synthetic_rules(args.rules - len(deny), rng)
+    commands = synthetic_commands(args.commands, args.stages, rng)
+
+    start = time.perf_counter()
+    classifier = SafetyClassifier({"DENY_ALWAYS": deny, "CONFIRM_FIRST": confirm})
+    compile_ms = (time.perf_counter() - start) * 1000
+
+    for command in commands:
+        # both have to agree before their speed means anything
+        assert classifier.classify(command) == linear_classify(command, deny, confirm)
+
+    linear = timed(lambda c: linear_classify(c, deny, confirm), commands)
+    compiled = timed(classifier.classify, commands)
+
+    print(f"{args.rules} rules, {args.stages}-stage pipelines")
+    print(f"compile    {compile_ms:9.1f} ms (once per session)")
+    print(f"linear     {linear * 1e6:9.1f} us/command")
+    print(f"compiled   {compiled * 1e6:9.1f} us/command ({linear / compiled:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+"""Streaming benchmark: real turns against a local stand-in for an
+OpenAI-compatible API, plus the per-delta hot paths.
+
+A server speaking the chat-completions streaming protocol (server-sent
+events) runs in a subprocess, so its CPU isn't counted, with a configurable
+first-token latency, token rate and jitter. Each turn goes through the same
+steps as the REPL: prep_prompt, ai_response (ensure_api, streaming, action
+parsing, rendering), parse_action and classify_command. Reported are time
+to first token, end-to-end latency, client CPU per token, peak allocations
+per turn (in a separate pass under tracemalloc) and the cost per call of
+parsing a whole answer, program_output and classify_command.
+
+Rendering goes to /dev/null unless --tty is given, and HOME points to a
+temporary directory so the benchmark never writes to ~/.cliqq.
+
+Usage:
+    python benchmarks/streaming.py                     # report
+    python benchmarks/streaming.py --check             # exit 1 on regression
+    python benchmarks/streaming.py --save              # record a new baseline
+    python benchmarks/streaming.py --rate 50 --latency 0.3 --jitter 0.5
+
+Baselines are machine specific, re-record them when changing machines.
+Changing the server settings changes the results, so --check only makes
+sense with the defaults.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+BASELINE_PATH = Path(__file__).parent / "baselines" / "streaming.json"
+
+# allowed slowdown over the baseline before --check fails. Calls of a few
+# microseconds swing about 2x between runs on a busy machine, so the hot
+# path timings (the *_us metrics) get more room than whole turns
+TOLERANCE = 1.5
+CALL_TOLERANCE = 2.5
+# metrics that are better when higher, the rest are better when lower
+HIGHER_IS_BETTER = {"tokens_per_s"}
+
+# a typical answer: some prose, then an action block
+PROSE = (
+    "You can list every file in this folder, including hidden ones, with "
+    "`ls -la`. The first column shows the permissions and the fifth the size. "
+)
+ACTION = '\x1e\n{"type": "command", "command": "ls -la"}\n\x1f'
+
+
+def answer_pieces(tokens: int) -> list[str]:
+    """An answer of about `tokens` deltas of ~4 characters, ending in an
+    action, split the way a model streams it."""
+
+    prose = (PROSE * (tokens * 4 // len(PROSE) + 1))[: tokens * 4]
+    pieces = [prose[i : i + 4] for i in range(0, len(prose), 4)]
+    return pieces + [ACTION]
+
+
+class StreamingHandler(BaseHTTPRequestHandler):
+    """Answers chat completions like an OpenAI-compatible API, streamed as
+    server-sent events over a keep-alive connection."""
+
+    protocol_version = "HTTP/1.1"
+    # like real API servers, or small chunks on a reused connection wait
+    # for the client's delayed ACK
+    disable_nagle_algorithm = True
+    server: "StandInServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        # /models, for connection warm-ups and credential checks
+        self.send_json({"object": "list", "data": [{"id": "bench", "object": "model"}]})
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        pieces = server.pieces
+
+        time.sleep(server.jittered(server.latency))
+
+        if not request.get("stream"):
+            text = "".join(pieces)
+            self.send_json(
+                {
+                    "id": "bench",
+                    "object": "chat.completion",
+                    "created": 0,
+                    "model": request["model"],
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": text},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": 0,
+                        "completion_tokens": len(pieces),
+                        "total_tokens": len(pieces),
+                    },
+                }
+            )
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(delta: dict, finish_reason: str | None = None) -> bytes:
+            chunk = {
+                "id": "bench",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": request["model"],
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+            }
+            return b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n"
+
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(server.jittered(1 / server.rate))
+            self.send_chunk(event({"content": piece}))
+        self.send_chunk(event({}, "stop"))
+        if request.get("stream_options", {}).get("include_usage"):
+            usage = {
+                "prompt_tokens": 0,
+                "completion_tokens": len(pieces),
+                "total_tokens": len(pieces),
+            }
+            chunk = {
+                "id": "bench",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": request["model"],
+                "choices": [],
+                "usage": usage,
+            }
+            self.send_chunk(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+        self.send_chunk(b"data: [DONE]\n\n")
+        self.send_chunk(b"")
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, tokens: int, rate: float, latency: float, jitter: float):
+        super().__init__(("127.0.0.1", 0), StreamingHandler)
+        self.pieces = answer_pieces(tokens)
+        self.rate = rate
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(0)
+
+    def jittered(self, seconds: float) -> float:
+        return seconds * self.rng.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+def serve(args: argparse.Namespace) -> None:
+    """Run the stand-in server until stdin closes, after printing its port."""
+
+    server = StandInServer(args.tokens, args.rate, args.latency, args.jitter)
+    print(server.server_address[1], flush=True)
+    with contextlib.suppress(KeyboardInterrupt):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        sys.stdin.read()
+    server.shutdown()
+
+
+def start_server(args: argparse.Namespace) -> tuple[subprocess.Popen, int]:
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            __file__,
+            "--serve",
+            f"--tokens={args.tokens}",
+            f"--rate={args.rate}",
+            f"--latency={args.latency}",
+            f"--jitter={args.jitter}",
+        ],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    port = int(process.stdout.readline())  # type: ignore[union-attr]
+    return process, port
+
+
+def us_per_call(fn, number: int) -> float:
+    """Best of five runs of `number` calls, each long enough to not be noise."""
+
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def run_turns(args: argparse.Namespace, port: int) -> dict[str, float]:
+    # imported only now, so the logs go to the temporary HOME
+    from cliqq import ai, stats
+    from cliqq.action import classify_command
+    from cliqq.io import program_output
+    from cliqq.models import ActionParser, ApiConfig, ChatHistory, PathManager
+    from cliqq.prep import load_prompt_templates, parse_action, prep_prompt
+
+    api_config = ApiConfig(prewarm=False)
+    api_config.set_config(
+        {
+            "model_name": "bench",
+            "base_url": f"http://127.0.0.1:{port}/v1",
+            "api_key": "bench",
+        }
+    )
+    paths = PathManager()
+    system, template = load_prompt_templates(paths)
+
+    def turn(history: ChatHistory) -> tuple[dict, float, float]:
+        """One turn as the REPL does it: its stats, wall and CPU time."""
+
+        stats.start_turn()
+        started = time.perf_counter()
+        cpu = time.process_time()
+        with stats.stage("prep_prompt"):
+            user_prompt = prep_prompt("how do I list the files here?", template)
+        action_str, _ = ai.ai_response(user_prompt, paths.env_path, api_config, history)
+        action = parse_action(action_str) if action_str else None
+        if not action:
+            raise RuntimeError("the stand-in's action wasn't parsed")
+        classify_command(action["command"])
+        cpu = time.process_time() - cpu
+        elapsed = time.perf_counter() - started
+        return stats.finish_turn() or {}, elapsed, cpu
+
+    def new_history() -> ChatHistory:
+        # every turn starts from the same history, so turns are comparable
+        history = ChatHistory()
+        history.remember({"role": "system", "content": system})
+        return history
+
+    for _ in range(args.warmup):
+        turn(new_history())
+
+    records, latencies, cpu_times = [], [], []
+    for _ in range(args.turns):
+        record, elapsed, cpu = turn(new_history())
+        records.append(record)
+        latencies.append(elapsed)
+        cpu_times.append(cpu)
+
+    tracemalloc.start()
+    peaks = []
+    for _ in range(args.alloc_turns):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        turn(new_history())
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    tokens = len(answer_pieces(args.tokens))
+    summary = stats.summarize(records)
+    results = {
+        "ttft_p50_ms": summary["ttft"]["p50"] * 1000,
+        "ttft_p95_ms": summary["ttft"]["p95"] * 1000,
+        "e2e_p50_ms": statistics.median(latencies) * 1000,
+        "e2e_p95_ms": stats.percentile(sorted(latencies), 95) * 1000,
+        "tokens_per_s": tokens
+        / statistics.median(r["stream"] - r["ttft"] for r in records),
+        "cpu_us_per_token": sum(cpu_times) / (tokens * args.turns) * 1e6,
+        "peak_kib_per_turn": statistics.median(peaks) / 1024,
+    }
+
+    # the per-delta hot paths on their own
+    pieces = answer_pieces(args.tokens)
+
+    def parse_answer() -> None:
+        # what parse_prose_async does for every delta
+        parser = ActionParser()
+        for piece in pieces:
+            parser.feed(piece)
+        parser.close()
+
+    results["parse_answer_us"] = us_per_call(parse_answer, 500)
+    results["program_output_us"] = us_per_call(
+        lambda: program_output("ls -la", style_name="action", log=False), 100
+    )
+    results["classify_command_us"] = us_per_call(
+        lambda: classify_command("cat notes.txt | grep -v todo | sort | uniq -c"), 5000
+    )
+    return results
+
+
+def compare(results: dict[str, float], baseline: dict[str, float], check: bool) -> bool:
+    """Print the results next to the baseline. True if any regressed."""
+
+    failed = False
+    for metric, value in results.items():
+        line = f"{metric:<22} {value:10.2f}"
+        if metric in baseline:
+            line += f"   (baseline {baseline[metric]:.2f})"
+            tolerance = CALL_TOLERANCE if metric.endswith("_us") else TOLERANCE
+            if metric in HIGHER_IS_BETTER:
+                regressed = value * tolerance < baseline[metric]
+            else:
+                regressed = value > baseline[metric] * tolerance
+            if check and regressed:
+                line += "   REGRESSION"
+                failed = True
+        print(line)
+    return failed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--alloc-turns", type=int, default=5)
+    parser.add_argument("--tokens", type=int, default=200, help="per answer")
+    parser.add_argument("--rate", type=float, default=200, help="tokens per second")
+    parser.add_argument("--latency", type=float, default=0.05, help="first token")
+    parser.add_argument("--jitter", type=float, default=0.2, help="share of delays")
+    parser.add_argument("--tty", action="store_true", help="render to the terminal")
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--save", action="store_true")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return 0
+
+    baseline = {}
+    if BASELINE_PATH.exists():
+        baseline = json.loads(BASELINE_PATH.read_text(encoding="utf-8"))
+
+    process, port = start_server(args)
+    stdout = sys.stdout
+    try:
+        with tempfile.TemporaryDirectory() as home:
+            os.environ["HOME"] = home
+            with open(os.devnull, "w") as devnull:
+                if not args.tty:
+                    sys.stdout = devnull
+                try:
+                    results = run_turns(args, port)
+                finally:
+                    sys.stdout = stdout
+                    from cliqq.log import stop_logging
+
+                    # before the temporary HOME goes away
+                    stop_logging()
+    finally:
+        process.stdin.close()  # type: ignore[union-attr]
+        process.wait()
+
+    print(
+        f"{args.turns} turns of {args.tokens} tokens at {args.rate:g} tokens/s, "
+        f"first token after {args.latency * 1000:g} ms, jitter {args.jitter:g}"
+    )
+    failed = compare(results, baseline, args.check)
+
+    if args.save:
+        rounded = {metric: round(value, 3) for metric, value in results.items()}
+        BASELINE_PATH.write_text(json.dumps(rounded, indent=2) + "\n", encoding="utf-8")
+        print(f"baseline saved to {BASELINE_PATH}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,34 @@
-import json
 from pathlib import Path
+import locale
+import os
+import signal
 import subprocess
-import shlex
+import sys
+import threading
+import time
+from typing import IO, Callable
 
 from cliqq.log import logger
+from cliqq.journal import log_turn
 from cliqq.io import user_input, program_output, program_choice
-from cliqq.models import ApiConfig, ChatHistory, PathManager
-
-# load safety rules once
-with open(Path(__file__).parent / "safety_rules.json", encoding="utf-8") as f:
-    RULES = json.load(f)
-
-DENY_ALWAYS = [t.lower() for t in RULES["DENY_ALWAYS"]]
-CONFIRM_FIRST = [t.lower() for t in RULES["CONFIRM_FIRST"]]
+from cliqq.models import (
+    ApiConfig,
+    ChatHistory,
+    CommandResult,
+    OutputBuffer,
+    PathManager,
+)
+from cliqq.reduce import reduce_output
+from cliqq.safety import SafetyClassifier, load_rules
+from cliqq.stats import stage
+
+# compiled on the first classification, see safety_classifier
+_classifier: SafetyClassifier | None = None
+
+# bytes read from a pipe at a time
+CHUNK_SIZE = 64 * 1024
+# seconds a timed out process gets to exit before it is killed outright
+KILL_GRACE = 2.0
 
 
 def run(
@@ -50,6 +66,7 @@ def run_command(
     if danger_level == "deny":
 
         logger.error(f"Command denied: {command}")
+        log_turn("command", command=command, status="denied")
         program_output(
             f"This command is considered too dangerous and will not be run:\n  {command}",
             style_name="error",
@@ -69,59 +86,272 @@ def run_command(
         )
         if user_choice == "no":
             program_output("Command aborted.", style_name="error")
+            log_turn("command", command=command, status="aborted")
             return False
 
-    code, stdout, stderr = execute_command(command)
+    options = paths.config.get("execution", {})
+    program_output(f"Running `{command}`:", style_name="action")
+    # output is shown live as the command produces it
+    with stage("execute_command"):
+        result = run_process(
+            command,
+            timeout=options.get("timeout"),
+            on_output=echo_output,
+            head_bytes=options.get("head_bytes", 64 * 1024),
+            tail_bytes=options.get("tail_bytes", 64 * 1024),
+        )
+    report_result(command, result)
+    log_turn(
+        "command",
+        command=command,
+        status="ran",
+        code=result.code,
+        elapsed=round(result.wall_time, 3),
+        timed_out=result.timed_out,
+        interrupted=result.interrupted,
+        output_bytes=result.stdout_bytes + result.stderr_bytes,
+    )
 
-    if stdout:
-        program_output(
-            f"Command `{command}` succeeded with exit code {code}:\n{stdout}\n"
+    if ask:
+        offer_analyze_output(
+            result.stdout,
+            paths.env_path,
+            api_config,
+            history,
+            stderr=result.stderr,
+            max_tokens=options.get("analysis_tokens", 3000),
         )
 
-    if stderr:
+    return result.code == 0 and not (result.timed_out or result.interrupted)
+
+
+def report_result(command: str, result: CommandResult) -> None:
+    """Summarise how a command ended."""
+
+    produced = f"{result.stdout_bytes + result.stderr_bytes} bytes of output"
+    if result.timed_out:
         program_output(
-            f"Command `{command}` failed with exit code {code}:\n{stderr}\n",
+            f"\nCommand `{command}` timed out after {result.wall_time:.1f}s and was stopped ({produced}).",
             style_name="error",
         )
+    elif result.interrupted:
+        program_output(
+            f"\nCommand `{command}` was interrupted after {result.wall_time:.1f}s ({produced}).",
+            style_name="error",
+        )
+    elif result.code == 0:
+        program_output(
+            f"\nCommand `{command}` succeeded in {result.wall_time:.1f}s ({produced})."
+        )
+    else:
+        program_output(
+            f"\nCommand `{command}` failed with exit code {result.code} in {result.wall_time:.1f}s ({produced}).",
+            style_name="error",
+        )
+    logger.info(
+        "Command %r exited with %s in %.3fs, %d stdout bytes, %d stderr bytes",
+        command,
+        result.code,
+        result.wall_time,
+        result.stdout_bytes,
+        result.stderr_bytes,
+    )
 
-    if ask:
-        offer_analyze_output(stdout, paths.env_path, api_config, history)
 
-    return code == 0
+_echo_lock = threading.Lock()
+
+
+def echo_output(stream_name: str, data: bytes) -> None:
+    """Write a command's output to the terminal as it arrives."""
+
+    target = sys.stderr if stream_name == "stderr" else sys.stdout
+    with _echo_lock:
+        target.buffer.write(data)
+        target.flush()
 
 
 def execute_command(command: str) -> tuple[int, str, str]:
-    """Runs a command"""
+    """Runs a command without showing its output.
+
+    Returns:
+        tuple[int, str, str]: Exit code, stdout and stderr.
+    """
+
+    result = run_process(command)
+    return result.code, result.stdout.strip(), result.stderr.strip()
 
-    try:
-        cmd = shlex.split(command)
 
-        # NOTE: This program executes commands with `shell=True` to support a broader range of functionality. While this improves compatibility, it also increases potential security risks. A strict denylist is enforced, and the AI is instructed not to generate dangerous commands. However, please exercise caution and use this software with an understanding of the associated risks.
+def run_process(
+    command: str,
+    timeout: float | None = None,
+    on_output: Callable[[str, bytes], None] | None = None,
+    head_bytes: int = 64 * 1024,
+    tail_bytes: int = 64 * 1024,
+) -> CommandResult:
+    """Run a shell command, streaming its output as it is produced.
 
-        output = subprocess.run(
-            cmd, capture_output=True, text=True, check=False, shell=True
+    stdout and stderr are read concurrently and handed to `on_output` chunk
+    by chunk, while only the head and tail of each are kept. The command
+    runs in its own process group, so a timeout or Ctrl-C stops everything
+    it started, not just the shell.
+
+    Args:
+        command (str): Command line, run by the shell.
+        timeout (float, optional): Seconds before the command is killed.
+            None waits forever.
+        on_output (Callable, optional): Called from reader threads with
+            ("stdout" | "stderr", bytes) for every chunk read.
+        head_bytes (int, optional): Bytes of each stream kept from the start.
+        tail_bytes (int, optional): Bytes of each stream kept from the end.
+
+    Returns:
+        CommandResult: Exit code, kept output, wall time and byte counts.
+    """
+
+    # NOTE: This program executes commands with `shell=True` to support a broader range of functionality. While this improves compatibility, it also increases potential security risks. A strict denylist is enforced, and the AI is instructed not to generate dangerous commands. However, please exercise caution and use this software with an understanding of the associated risks.
+
+    buffers = {
+        "stdout": OutputBuffer(head_bytes, tail_bytes),
+        "stderr": OutputBuffer(head_bytes, tail_bytes),
+    }
+    if sys.platform == "win32":
+        group = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        group = {"start_new_session": True}
+
+    start = time.monotonic()
+    try:
+        process = subprocess.Popen(
+            command,
+            shell=True,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0,
+            **group,
+        )
+    except OSError as e:
+        logger.exception("%s: Unable to start command\n%s", type(e).__name__, e)
+        return CommandResult(127, "", f"Command not found: {command}")
+
+    readers = [
+        threading.Thread(
+            target=read_pipe,
+            args=(pipe, buffers[name], name, on_output),
+            daemon=True,
         )
+        for name, pipe in (("stdout", process.stdout), ("stderr", process.stderr))
+    ]
+    for reader in readers:
+        reader.start()
+
+    timed_out = interrupted = False
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        kill_process_group(process)
+    except KeyboardInterrupt:
+        interrupted = True
+        kill_process_group(process)
+    wall_time = time.monotonic() - start
+
+    # a background process that left the group may still hold the pipes
+    for reader in readers:
+        reader.join(timeout=1.0)
+
+    encoding = locale.getpreferredencoding(False)
+    return CommandResult(
+        code=process.returncode,
+        stdout=buffers["stdout"].text(encoding),
+        stderr=buffers["stderr"].text(encoding),
+        wall_time=wall_time,
+        stdout_bytes=buffers["stdout"].total,
+        stderr_bytes=buffers["stderr"].total,
+        timed_out=timed_out,
+        interrupted=interrupted,
+    )
 
-        return output.returncode, output.stdout.strip(), output.stderr.strip()
-    except FileNotFoundError:
-        return 127, "", f"Command not found: {command}"
+
+def read_pipe(
+    pipe: IO[bytes],
+    buffer: OutputBuffer,
+    name: str,
+    on_output: Callable[[str, bytes], None] | None,
+) -> None:
+    """Drain `pipe` into `buffer` until the process closes it."""
+
+    with pipe:
+        while chunk := pipe.read(CHUNK_SIZE):
+            buffer.write(chunk)
+            if on_output:
+                on_output(name, chunk)
+
+
+def kill_process_group(process: subprocess.Popen) -> None:
+    """Stop a command and everything it started: politely first, then
+    forcefully if it is still running after KILL_GRACE seconds."""
+
+    try:
+        if sys.platform == "win32":
+            # /T takes the child processes along
+            subprocess.run(
+                ["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                capture_output=True,
+                check=False,
+            )
+        else:
+            os.killpg(process.pid, signal.SIGTERM)
+            try:
+                process.wait(timeout=KILL_GRACE)
+                return
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        # already gone
+        pass
+    process.wait()
+
+
+def safety_classifier() -> SafetyClassifier:
+    """The safety rules, loaded and compiled once on first use rather than
+    on import, since finding the user rules means reading config.json.
+    User rules in ~/.cliqq extend the packaged ones."""
+
+    global _classifier
+
+    if _classifier is None:
+        home = PathManager().home_path
+        _classifier = SafetyClassifier(
+            load_rules(
+                Path(__file__).parent / "safety_rules.json",
+                home / "safety_rules.json",
+                *sorted((home / "rules").glob("*.json")),
+            )
+        )
+    return _classifier
 
 
 def classify_command(command: str) -> str:
     """Classifies and returns the danger level/status of a command"""
-    lowered = command.lower()
-    if any(token in lowered for token in DENY_ALWAYS):
-        return "deny"
-    if any(token in lowered for token in CONFIRM_FIRST):
-        return "confirm"
-    return "safe"
+    return safety_classifier().classify(command)
 
 
 def offer_analyze_output(
-    stdout: str, env_path: Path, api_config: ApiConfig, history: ChatHistory
+    stdout: str,
+    env_path: Path,
+    api_config: ApiConfig,
+    history: ChatHistory,
+    stderr: str = "",
+    max_tokens: int = 3000,
 ) -> None:
-    """Retrieves user input as to whether stdout from command execution
-    should be sent and analyzed by the AI"""
+    """Retrieves user input as to whether output from command execution
+    should be sent and analyzed by the AI. The output is reduced to about
+    `max_tokens` first, see cliqq.reduce."""
+
+    if not (stdout.strip() or stderr.strip()):
+        return
+
     choices = [
         ("yes", "Yes"),
         ("no", "No"),
@@ -133,7 +363,8 @@ def offer_analyze_output(
     if user_choice == "yes":
         from cliqq.ai import ai_response
 
-        ai_response(stdout.strip(), env_path, api_config, history)
+        reduced = reduce_output(stdout, stderr, max_tokens)
+        ai_response(reduced, env_path, api_config, history)
 
 
 def save_file(file: dict[str, str], overwrite: bool = False) -> bool:
@@ -1,14 +1,43 @@
+import asyncio
+import importlib
 import os
-import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+from functools import partial
 from pathlib import Path
-from dotenv import dotenv_values
-from typing import Iterable
-import httpx
-import openai
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    TypeVar,
+)
 
 from cliqq.log import logger
-from cliqq.io import program_output, user_input, program_choice
-from cliqq.models import ApiConfig, ChatHistory
+from cliqq.io import program_output, user_input, program_choice, stream_writer
+from cliqq.models import ActionParser, ApiConfig, ChatHistory, Endpoint, EndpointHealth
+from cliqq.cache import forget_validated, is_validated, remember_validated
+from cliqq.journal import log_turn
+from cliqq.loop import run_sync, submit
+from cliqq.stats import TurnTimer, current_turn, stage
+
+T = TypeVar("T")
+
+# openai, httpx and dotenv are slow to import, so they are only imported on
+# the code paths that talk to the API (see __getattr__ at the bottom)
+
+# config being validated, set by ensure_api so validation uses its credential
+# cache and warms the same pooled connections the chat completions stream over
+_active_config: ContextVar[ApiConfig | None] = ContextVar("active_config", default=None)
+
+# how long streamed text may be held back to be written together, in seconds
+MIN_FRAME = 1 / 60
+MAX_FRAME = 0.25
+# writing may take up to this share of each frame
+WRITE_SHARE = 0.25
 
 
 def ai_response(
@@ -18,6 +47,8 @@ def ai_response(
     history: ChatHistory,
 ) -> tuple[str | None, str]:
     """Send a user prompt to the AI model and stream back the response.
+    Runs ai_response_async on the session's event loop, Ctrl-C stops the
+    answer early.
 
     Args:
         user_prompt (str): The formatted user input to send to the AI.
@@ -31,12 +62,52 @@ def ai_response(
         text response from the AI.
     """
 
+    return run_sync(ai_response_async(user_prompt, env_path, api_config, history))
+
+
+async def ai_response_async(
+    user_prompt: str,
+    env_path: Path,
+    api_config: ApiConfig,
+    history: ChatHistory,
+) -> tuple[str | None, str]:
+    """Send a user prompt to the AI model and render the response as it
+    streams in.
+
+    Cancelling the task (Ctrl-C in ai_response) closes the HTTP stream right
+    away. The partial answer is still shown, logged and remembered, but any
+    action in it is dropped since the user didn't let it finish.
+
+    Args and return value are the same as ai_response.
+    """
+
     try:
+        import openai
 
         history.remember({"role": "user", "content": user_prompt})
-
-        # ensure api info is valid every time an api call is made
-        if not ensure_api(env_path, api_config):
+        log_turn("user", content=user_prompt)
+
+        interrupted = False
+        started = time.monotonic()
+        # splits prose from the action as the deltas arrive
+        parser = ActionParser(on_action=partial(log_action, started))
+
+        async def attempt() -> bool:
+            nonlocal parser, interrupted
+            # a fresh one for each endpoint tried
+            parser = ActionParser(on_action=partial(log_action, started))
+            try:
+                return await stream_answer(env_path, api_config, history, parser)
+            except asyncio.CancelledError:
+                # leaving the stream's context already closed the connection
+                interrupted = True
+                program_output(" [interrupted]", style_name="error", log=False)
+                return True
+
+        # only retried if the user hasn't seen any of this answer yet
+        if not await send_with_failover(
+            api_config, attempt, retry=lambda: not parser.raw_text
+        ):
             # false if program couldn't get valid api info
             program_output(
                 f"I'm sorry, I cannot process your request! Please verify your API credentials and update your {env_path} and/or your system environment variables. If you need further guidance, please refer to the README.md.",
@@ -44,142 +115,494 @@ def ai_response(
             )
             return None, ""
 
-        # generator
-        deltas = stream_chunks(
-            api_config,
-            history.chat_history,
-        )
-
-        raw_accum = []
-        action_started = False
-
-        # also generator
-        for delta in buffer_output(deltas):
-            # delimiter = flush immediately and stop
-            raw_accum.append(delta)
-
-            if not action_started and ("\x1e" in delta or "\\x1e" in delta):
-                action_started = True
-                
-            if not action_started:
-                program_output(
-                    delta, end="", style_name="info", continuous=True, log=False
-                )
-
-        raw_full_text = "".join(raw_accum)
-
-        action = extract_action(raw_full_text)
-
-        clean_full_text = re.sub(r"[\x1e\x1f]+", "", raw_full_text)
+        action = None if interrupted else parser.action
+        clean_full_text = parser.clean_text
 
         # AI will remember raw text so it remembers the format needed
-        history.remember({"role": "assistant", "content": raw_full_text})
+        if parser.raw_text:
+            history.remember({"role": "assistant", "content": parser.raw_text})
 
         # log the full cleaned text
         logger.info(clean_full_text)
+        log_turn(
+            "assistant",
+            content=clean_full_text,
+            elapsed=round(time.monotonic() - started, 3),
+            action=action,
+            interrupted=interrupted,
+        )
 
         return action, clean_full_text
 
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        # Ctrl-C before anything was streamed, e.g. while ensure_api was
+        # prompting for credentials
+        return None, ""
+
     except Exception as e:
         logger.exception(
             "%s: Error while generating AI response\n%s", type(e).__name__, e
         )
+        # retries are used up by now, say what went wrong if it's known
+        known = (
+            []
+            if isinstance(e, ImportError)
+            else [
+                msg for cls, msg in api_error_messages().items() if isinstance(e, cls)
+            ]
+        )
         program_output(
-            f"{type(e).__name__}: Error while generating AI response:\n",
+            f"{type(e).__name__}: Error while generating AI response:\n"
+            + (known[0] if known else ""),
             style_name="error",
         )
         return None, ""
 
 
-def stream_chunks(
+async def stream_answer(
+    env_path: Path, api_config: ApiConfig, history: ChatHistory, parser: ActionParser
+) -> bool:
+    """Send the history to the endpoint `api_config` is set to and render
+    the answer through `parser`.
+
+    Credentials from .env or the environment that the API rejects are
+    looked up and validated once more. A routed endpoint's credentials come
+    from config.json, so its errors are raised for the caller to fail over.
+
+    Returns:
+        bool: False if no valid credentials could be found.
+    """
+
+    import openai
+
+    # cached credentials are only re-validated if the API rejects them
+    for attempt in range(2):
+
+        # ensure api info is valid every time an api call is made
+        # (in a thread, since it may have to prompt the user)
+        with stage("ensure_api"):
+            valid = await asyncio.to_thread(ensure_api, env_path, api_config)
+        if not valid:
+            return False
+
+        # async generator (or any iterable of deltas)
+        # a snapshot, a background summary may rewrite the history
+        # while the request is being sent
+        messages = history.messages()
+        if api_config.response_cache:
+            deltas = cached_chunks(api_config, messages)
+        else:
+            deltas = stream_chunks(
+                api_config,
+                messages,
+            )
+        if api_config.endpoint is not None:
+            deltas = track_health(deltas, api_config.endpoint.health)
+        deltas = time_stream(deltas, current_turn())
+
+        try:
+            # once the action starts the prose is final, show it right away
+            await render_stream(
+                parse_prose_async(deltas, parser),
+                stream_writer(style_name="info"),
+                flush=lambda: parser.action_started,
+            )
+            return True
+        except (openai.AuthenticationError, openai.NotFoundError) as e:
+            if attempt or api_config.endpoint is not None:
+                raise
+            logger.warning(
+                "%s: Cached API credentials were rejected, validating again\n%s",
+                type(e).__name__,
+                e,
+            )
+            forget_api(api_config)
+    return True
+
+
+async def track_health(
+    deltas: Iterable[str] | AsyncIterable[str], health: EndpointHealth
+) -> AsyncIterator[str]:
+    """Pass deltas through, recording the time to the first one (or the
+    error) in the endpoint's health. Cancellation isn't the endpoint's
+    fault and isn't recorded."""
+
+    started = time.monotonic()
+    first = True
+    try:
+        async for delta in aiter_deltas(deltas):
+            if first:
+                health.record(True, time.monotonic() - started)
+                first = False
+            yield delta
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        health.record(False)
+        raise
+    if first:
+        # an empty answer still means the endpoint works
+        health.record(True, time.monotonic() - started)
+
+
+async def time_stream(
+    deltas: Iterable[str] | AsyncIterable[str], turn: TurnTimer
+) -> AsyncIterator[str]:
+    """Pass deltas through, recording the time to the first one, the time
+    to the last one and the (estimated) tokens streamed in `turn`. A retried
+    request replaces what the failed one recorded."""
+
+    started = time.monotonic()
+    chars = 0
+    turn.durations.pop("ttft", None)
+    try:
+        async for delta in aiter_deltas(deltas):
+            if not chars:
+                turn.durations["ttft"] = time.monotonic() - started
+            chars += len(delta)
+            yield delta
+    finally:
+        turn.durations["stream"] = time.monotonic() - started
+        # same ~4 characters per token as the history's estimate
+        turn.tokens = chars // 4
+
+
+async def send_with_failover(
     api_config: ApiConfig,
-    chat_history: list[dict[str, str]],
-):
-    """Yield buffered chunks of output from a streaming response.
+    request: Callable[[], Awaitable[T]],
+    retry: Callable[[], bool] = lambda: True,
+) -> T:
+    """Send a request to the router's endpoints in turn, healthiest first,
+    until one answers. Once every endpoint has failed, the last one is
+    retried after the scheduler's delay.
 
-    Buffers incoming deltas until a threshold is reached or a special delimiter
-    (e.g., ``\x1e``) is encountered.
+    `request` is called right after api_config is switched to the
+    endpoint, so it should read the client and model before it awaits
+    anything, in case a concurrent request switches endpoints.
 
     Args:
-        deltas (Iterable[str]): Stream of partial output strings.
-        max_count (int, optional): Maximum number of items per buffer. Defaults to 5.
-        max_chars (int, optional): Maximum number of characters per buffer. Defaults to 200.
+        api_config (ApiConfig): Its router, if any, and scheduler are used.
+        request (Callable): Makes a new request each time it is called.
+        retry (Callable, optional): False if a failed request must not be
+            sent again, e.g. part of a streamed answer was already shown.
+
+    Returns:
+        The result of the request that succeeded.
+    """
+
+    # endpoints to try in turn, None is the single configured one
+    router = api_config.router
+    endpoints: list[Endpoint | None] = list(router.ordered()) if router else [None]
+
+    i = 0
+    retries = 0
+    while True:
+        endpoint = endpoints[i]
+        if endpoint is not None:
+            api_config.use_endpoint(endpoint)
+        try:
+            return await request()
+        except failover_errors() as e:
+            if not retry():
+                raise
+            if i < len(endpoints) - 1:
+                i += 1
+                logger.warning(
+                    "%s: Endpoint %s failed, trying %s\n%s",
+                    type(e).__name__,
+                    endpoint.name,  # type: ignore[union-attr]
+                    endpoints[i].name,  # type: ignore[union-attr]
+                    e,
+                )
+                continue
+            # out of endpoints, wait and try the last one again
+            delay = api_config.scheduler.retry_delay(e, retries)
+            if delay is None:
+                raise
+            logger.warning(
+                "%s: Request failed, retrying in %.1fs\n%s",
+                type(e).__name__,
+                delay,
+                e,
+            )
+            retries += 1
+            await asyncio.sleep(delay)
+
+
+def failover_errors() -> tuple[type[Exception], ...]:
+    """Errors after which the same request is sent to the next endpoint:
+    the endpoint is down, overloaded or rejects its configured credentials.
+    On the last endpoint, the transient ones are retried after a delay."""
+
+    import openai
+
+    return (
+        openai.APIConnectionError,
+        openai.InternalServerError,
+        openai.RateLimitError,
+        openai.AuthenticationError,
+        openai.NotFoundError,
+    )
+
+
+async def stream_chunks(
+    api_config: ApiConfig,
+    chat_history: list[dict[str, str]],
+) -> AsyncIterator[str]:
+    """Stream a chat completion over the shared async connection pool.
+
+    Args:
+        api_config (ApiConfig): Credentials and pooled client to use.
+        chat_history (list[dict[str, str]]): Messages to send.
 
     Yields:
-        str: Concatenated chunk of buffered deltas.
+        str: Partial response text streamed from the model.
     """
 
-    try:
-        client = api_config.client
-    except Exception:
-        client = None
-
-    if client is None:
-        http_client = httpx.Client(timeout=httpx.Timeout(30.0, connect=10.0))
-        client = openai.OpenAI(
-            api_key=api_config.api_key, 
-            base_url=api_config.base_url,
-            http_client=http_client
-        )
-        api_config.client = client
+    client = api_config.async_client
 
-    with client.chat.completions.create(
+    # the usage, including cached prompt tokens, comes in a last chunk
+    # without choices
+    options = (
+        {"stream_options": {"include_usage": True}} if api_config.stream_usage else {}
+    )
+
+    # paced with every other request, see RequestScheduler
+    await api_config.scheduler.acquire()
+    stream = await client.chat.completions.create(
         model=api_config.model_name,
         messages=chat_history,  # type: ignore
         stream=True,
-    ) as stream:
-        for chunk in stream:
+        **options,
+    )
+    # closing the stream (also on cancellation) closes the response
+    async with stream:
+        async for chunk in stream:
+            if chunk.usage is not None:
+                record_usage(chunk.usage)
+            if not chunk.choices:
+                continue
             # ChatCompletionChunk(id='...', choices=[Choice(delta=ChoiceDelta(content='Two', function_call=None, role=None, tool_calls=None), finish_reason=None, ..., usage=None)
             if chunk.choices[0].delta and chunk.choices[0].delta.content:
                 # accumulate the content, print until end of content or recieve actionable
                 delta = str(chunk.choices[0].delta.content)
                 yield delta
-            if chunk.choices[0].finish_reason == "stop":
+            if chunk.choices[0].finish_reason == "stop" and not options:
                 break
 
+    api_config.mark_active()
 
-def buffer_output(deltas: Iterable[str], max_count: int = 5, max_chars: int = 200):
-    """Generator for streaming text chunks from the OpenAI client.
 
-    Args:
-        client: OpenAI client object for making API requests.
-        user_prompt (str): The formatted user input prompt.
-        api_config (ApiConfig): Contains model and API configuration.
-        history (ChatHistory): Conversation history to include in the context.
+def record_usage(usage: Any) -> None:
+    """Keep a response's token counts on the turn being timed, so /stats can
+    show how much of the prompt the provider had cached."""
+
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or 0
+    current_turn().usage = {
+        "prompt_tokens": usage.prompt_tokens,
+        "cached_tokens": cached,
+        "completion_tokens": usage.completion_tokens,
+    }
+    logger.debug(
+        "Prompt cache: %d of %d prompt tokens cached", cached, usage.prompt_tokens
+    )
+
+
+async def cached_chunks(
+    api_config: ApiConfig,
+    chat_history: list[dict[str, str]],
+) -> AsyncIterator[str]:
+    """stream_chunks through api_config.response_cache: a cached response is
+    replayed delta by delta, otherwise the response is streamed and stored
+    once it is complete. Waits if the same request is already in flight.
 
     Yields:
-        str: Partial response text streamed from the model.
+        str: Partial response text, cached or streamed.
     """
 
-    buffer: list[str] = []
-    buffered_chars = 0
+    cache = api_config.response_cache
+    key = cache.key(api_config.model_name, api_config.base_url, chat_history)
 
-    for delta in deltas:
-        buffer.append(delta)
-        buffered_chars += len(delta)
+    cached = await cache.lookup(key)
+    if cached is not None:
+        logger.debug("Replaying cached response %s", key)
+        for delta in cached:
+            yield delta
+        return
+
+    # we hold the claim on key until the response is stored or abandoned
+    try:
+        deltas = []
+        async for delta in aiter_deltas(stream_chunks(api_config, chat_history)):
+            deltas.append(delta)
+            yield delta
+        await asyncio.to_thread(cache.put, key, deltas)
+    finally:
+        await asyncio.to_thread(cache.release, key)
 
-        if len(buffer) >= max_count or buffered_chars >= max_chars:
-            yield "".join(buffer)
-            buffer.clear()
-            buffered_chars = 0
 
-    if buffer:
-        yield "".join(buffer)
+def summarize_messages(api_config: ApiConfig, messages: list[dict[str, str]]) -> str:
+    """Condense earlier turns into a short summary. Used by ChatHistory,
+    on a background thread, for turns evicted to stay within its budget.
 
+    Args:
+        api_config (ApiConfig): Credentials and pooled client to use.
+        messages (list[dict[str, str]]): Messages (and any previous summary)
+            to condense.
 
-def extract_action(text: str) -> str | None:
+    Returns:
+        str: The summary text.
     """
-    Extract the JSON action object from raw model output by looking
-    for delimiters \x1e` and `\x1f`
+
+    return run_sync(summarize_messages_async(api_config, messages))
+
+
+async def summarize_messages_async(
+    api_config: ApiConfig, messages: list[dict[str, str]]
+) -> str:
+    """Async version of summarize_messages."""
+
+    transcript = "\n\n".join(f"{msg['role']}: {msg['content']}" for msg in messages)
+    response = await api_config.scheduler.call(
+        lambda: api_config.async_client.chat.completions.create(
+            model=api_config.model_name,
+            messages=[
+                {
+                    "role": "system",
+                    "content": "Summarize this conversation between a user and a command-line assistant in a few sentences. Keep facts, file paths, commands and decisions that later questions may refer to.",
+                },
+                {"role": "user", "content": transcript},
+            ],
+            max_tokens=300,
+        )
+    )
+    api_config.mark_active()
+    return (response.choices[0].message.content or "").strip()
+
+
+async def aiter_deltas(deltas: Iterable[str] | AsyncIterable[str]):
+    """Iterate over sync or async deltas alike, so the engine can also
+    render deltas that don't come from the network."""
+
+    if isinstance(deltas, AsyncIterable):
+        async for delta in deltas:
+            yield delta
+    else:
+        for delta in deltas:
+            yield delta
+
+
+async def render_stream(
+    deltas: Iterable[str] | AsyncIterable[str],
+    write: Callable[[str], Any],
+    flush: Callable[[], bool] | None = None,
+    clock: Callable[[], float] = time.monotonic,
+) -> None:
+    """Write streamed text as it arrives, coalesced into frames.
+
+    The first text is written right away. After that, text that arrives
+    within one frame of the last write is held back and written together,
+    so a fast stream doesn't turn into many tiny terminal writes, and a
+    slow one isn't held back at all. The frame is a few times as long as
+    writes have been taking, between MIN_FRAME and MAX_FRAME, so a slow
+    terminal (e.g. over SSH) gets fewer, larger writes.
+
+    Args:
+        deltas: Text to write, e.g. from parse_prose_async. Empty deltas
+            don't add text, but do check `flush`.
+        write (Callable): Writes text to the terminal, see stream_writer.
+        flush (Callable, optional): If it returns True after a delta, held
+            back text is written right away.
+        clock (Callable, optional): Seconds, for tests.
     """
 
-    variants = [("\x1e", "\x1f"), ("\\x1e", "\\x1f")]
-    for start_tag, end_tag in variants:
-        start = text.find(start_tag)
-        end = text.find(end_tag, start + len(start_tag))
-        if start != -1 and end != -1:
-            return text[start + len(start_tag) : end].strip()
-    return None
+    iterator = aiter_deltas(deltas).__aiter__()
+    pending: list[str] = []
+    frame = MIN_FRAME
+    write_cost = 0.0
+    written_at = 0.0
+    first = True
+    next_delta: asyncio.Future | None = None
+
+    def emit() -> None:
+        nonlocal frame, write_cost, written_at, first
+        text = "".join(pending)
+        pending.clear()
+        start = clock()
+        write(text)
+        written_at = clock()
+        cost = written_at - start
+        # moving average, one slow write shouldn't stall the stream
+        write_cost = cost if first else 0.8 * write_cost + 0.2 * cost
+        frame = min(max(write_cost / WRITE_SHARE, MIN_FRAME), MAX_FRAME)
+        first = False
+
+    try:
+        while True:
+            if next_delta is None:
+                next_delta = asyncio.ensure_future(iterator.__anext__())
+            # wait for the next delta, but not past the end of the frame
+            timeout = max(written_at + frame - clock(), 0) if pending else None
+            done, _ = await asyncio.wait({next_delta}, timeout=timeout)
+            if not done:
+                emit()
+                continue
+
+            try:
+                delta = next_delta.result()
+            except StopAsyncIteration:
+                next_delta = None
+                break
+            next_delta = None
+
+            if delta:
+                pending.append(delta)
+            if pending and (
+                first
+                or clock() - written_at >= frame
+                or (flush is not None and flush())
+            ):
+                emit()
+    finally:
+        if next_delta is not None:
+            # cancelled while waiting, closes the stream behind the deltas
+            next_delta.cancel()
+            await asyncio.gather(next_delta, return_exceptions=True)
+        if pending:
+            emit()
+
+
+async def parse_prose_async(
+    deltas: Iterable[str] | AsyncIterable[str], parser: ActionParser
+):
+    """Feed streamed deltas through `parser` in a single pass.
+
+    Args:
+        deltas: Partial response text, e.g. from stream_chunks.
+        parser (ActionParser): Collects the raw text, clean text and action.
+
+    Yields:
+        str: The prose before the action, as soon as it can be displayed.
+        Also empty prose, so a consumer can react to the parser's state
+        after every delta.
+    """
+
+    async for delta in aiter_deltas(deltas):
+        yield parser.feed(delta)
+
+    prose = parser.close()
+    if prose:
+        yield prose
+
+
+def log_action(started: float, action: str) -> None:
+    """ActionParser hook: the action is complete, the rest of the stream
+    is only read so its connection goes back to the pool."""
+
+    logger.debug(
+        "Action complete after %.0f ms: %s", (time.monotonic() - started) * 1000, action
+    )
 
 
 def prompt_api_info() -> dict[str, str]:
@@ -246,8 +669,17 @@ def validate_api(
         source (str, optional): Source of the configuration ('prompt',
             'env', or 'sys').
     """
+    import openai
+
+    api_config = _active_config.get()
+
     try:
-        if ping_api(config):
+        trusted = is_trusted(config)
+        if trusted or ping_api(config):
+            if not trusted and api_config and api_config.credential_cache:
+                remember_validated(
+                    api_config.credential_cache, config, api_config.credential_ttl
+                )
             if source == "prompt":
                 offer_save_env(config, env_path)
             return True
@@ -264,16 +696,54 @@ def validate_api(
 def ping_api(config: dict[str, str]) -> bool:
     """Test the API credentials by sending a minimal request."""
 
-    client = openai.OpenAI(api_key=config["api_key"], base_url=config["base_url"])
-    resp = client.chat.completions.create(
-        model=config["model_name"],
-        messages=[{"role": "user", "content": "ping"}],
-        max_tokens=1,
+    return run_sync(ping_api_async(config, _active_config.get()))
+
+
+async def ping_api_async(config: dict[str, str], api_config: ApiConfig | None) -> bool:
+    """Async version of ping_api, over `api_config`'s pool if given."""
+
+    import openai
+
+    client = openai.AsyncOpenAI(
+        api_key=config["api_key"],
+        base_url=config["base_url"],
+        http_client=api_config.async_http_client if api_config else None,
+        max_retries=0,
     )
+    try:
+        resp = await client.chat.completions.create(
+            model=config["model_name"],
+            messages=[{"role": "user", "content": "ping"}],
+            max_tokens=1,
+        )
+    finally:
+        if not api_config:
+            # not pooled, don't leak the client's own connections
+            await client.close()
+    if api_config:
+        api_config.mark_active()
     return True
     # raise error if fail
 
 
+def is_trusted(config: dict[str, str]) -> bool:
+    """Check whether `config` was validated recently enough to skip pinging the API."""
+
+    api_config = _active_config.get()
+    if not api_config or not api_config.credential_cache:
+        return False
+    return is_validated(api_config.credential_cache, config, api_config.credential_ttl)
+
+
+def forget_api(api_config: ApiConfig) -> None:
+    """Drop credentials the API rejected, so that the next ensure_api call
+    looks them up and validates them again."""
+
+    if api_config.credential_cache:
+        forget_validated(api_config.credential_cache, api_config.config)
+    api_config.set_config({"model_name": "", "base_url": "", "api_key": ""})
+
+
 def offer_save_env(config: dict[str, str], env_path: Path) -> None:
     """Offer to save API credentials to a .env file."""
 
@@ -304,11 +774,19 @@ def save_env_file(config: dict[str, str], env_path: Path) -> bool:
     return save_file(file, overwrite=True)
 
 
-def find_api_info(env_path: Path) -> dict[str, str]:
+def find_api_info(env_path: Path, interactive: bool = True) -> dict[str, str]:
     """Locate and validate API credentials by trying environment file,
     system environment variables, and user prompt (in that order).
     Validates credentials before returning.
 
+    Recently validated credentials are trusted without a request. Otherwise
+    the .env and system candidates are validated concurrently, with the
+    .env file still taking priority.
+
+    Args:
+        env_path (Path): Path to the .env file.
+        interactive (bool, optional): Whether the user may be prompted.
+
     Returns:
         dict[str, str]: Validated API configuration, with "model_name",
         "base_url", and "api_key" keys
@@ -317,18 +795,41 @@ def find_api_info(env_path: Path) -> dict[str, str]:
         ValueError: If no valid credentials are found.
     """
 
-    config = {}
+    candidates: list[tuple[str, dict[str, str]]] = []
+    for source, config in (("env", load_env_file(env_path)), ("sys", load_sys_env())):
+        if config and config not in [c for _, c in candidates]:
+            candidates.append((source, config))
 
-    for loader in (
-        ("env", lambda: load_env_file(env_path)),
-        ("sys", load_sys_env),
-        ("prompt", prompt_api_info),
-    ):
-        source, func = loader
-        config = func()
-        if config and validate_api(config, env_path, source):
+    for source, config in candidates:
+        if is_trusted(config):
             return config
 
+    if len(candidates) > 1:
+        with ThreadPoolExecutor(max_workers=len(candidates)) as executor:
+            # copy_context so every worker sees the active ApiConfig
+            futures = [
+                executor.submit(
+                    copy_context().run, validate_api, config, env_path, source
+                )
+                for source, config in candidates
+            ]
+            results = [future.result() for future in futures]
+    else:
+        results = [
+            validate_api(config, env_path, source) for source, config in candidates
+        ]
+
+    for (source, config), valid in zip(candidates, results):
+        if valid:
+            return config
+
+    if not interactive:
+        raise ValueError("No valid API credentials in .env or the environment")
+
+    config = prompt_api_info()
+    if config and validate_api(config, env_path, "prompt"):
+        return config
+
     raise ValueError()
 
 
@@ -336,6 +837,8 @@ def load_env_file(env_path: Path):
     """Load API credentials from a .env file if available."""
 
     if env_path.exists():
+        from dotenv import dotenv_values
+
         env_dict = dotenv_values(env_path)
         model_name = env_dict.get("MODEL_NAME")
         base_url = env_dict.get("BASE_URL")
@@ -366,7 +869,7 @@ def load_sys_env():
     return None
 
 
-def ensure_api(env_path: Path, api_config: ApiConfig) -> bool:
+def ensure_api(env_path: Path, api_config: ApiConfig, interactive: bool = True) -> bool:
     """Ensure that API credentials are configured and valid. Uses
     existing configuration if already set, otherwise attempts to
     locate and validate credentials.
@@ -374,6 +877,8 @@ def ensure_api(env_path: Path, api_config: ApiConfig) -> bool:
     Args:
         env_path (Path): Path to .env file for fallback.
         api_config (ApiConfig): API configuration object to update.
+        interactive (bool, optional): Whether the user may be prompted for
+            credentials, False where stdout isn't a conversation (/batch).
 
     Returns:
         bool: True if valid credentials are available, False otherwise.
@@ -384,20 +889,133 @@ def ensure_api(env_path: Path, api_config: ApiConfig) -> bool:
         # don't validate again b/c if these have been set, the user must've made a valid call before
         return True
 
+    token = _active_config.set(api_config)
     try:
-        config = find_api_info(env_path)
+        config = find_api_info(env_path, interactive)
         api_config.set_config(config)
         return True
     except ValueError as e:
         logger.exception("ValueError: Unable to find valid API credentials\n%s", e)
         return False
+    finally:
+        _active_config.reset(token)
+
+
+def prewarm_connection(env_path: Path, api_config: ApiConfig) -> Future | None:
+    """Resolve the API host and open a pooled connection in the background,
+    so the handshake overlaps with the user typing their prompt. Does nothing
+    if the pool was used recently enough to still hold a live connection, or
+    if a warm-up is already in flight. Cheap enough to call on a keystroke.
+
+    Args:
+        env_path (Path): Path to .env file, used if no credentials are set yet.
+        api_config (ApiConfig): API configuration whose pool should be warmed.
+
+    Returns:
+        Future | None: The warm-up running on the session loop, or None if skipped.
+    """
+
+    if not api_config.prewarm or not api_config.is_idle:
+        return None
+    if api_config.warming is not None and not api_config.warming.done():
+        # still in its handshake, a second one would open another connection
+        return None
+
+    api_config.warming = submit(warm_connection(env_path, api_config))
+    return api_config.warming
+
+
+async def warm_connection(env_path: Path, api_config: ApiConfig):
+    """Send a cheap request to the API host so DNS, TCP and TLS are done and
+    the connection is left open in the pool, then import openai so the first
+    prompt doesn't pay for that either."""
+
+    import httpx
+
+    base_url = api_config.base_url
+    if not base_url:
+        # credentials are validated later, only the host is needed here
+        config = await asyncio.to_thread(
+            lambda: load_env_file(env_path) or load_sys_env()
+        )
+        if not config:
+            return
+        base_url = config["base_url"]
+
+    try:
+        # any response at all (even a 404) leaves a kept-alive connection
+        await api_config.async_http_client.head(base_url)
+        api_config.mark_active()
+    except httpx.HTTPError as e:
+        logger.debug("%s: Connection warm-up failed\n%s", type(e).__name__, e)
+
+    # in a worker thread, so the loop can already serve a fast typist's prompt
+    await asyncio.to_thread(importlib.import_module, "openai")
+
+
+def check_endpoints(api_config: ApiConfig) -> Future | None:
+    """Check, in the background, endpoints that haven't been used for a
+    while, so one that went down (or came back) is known before a request
+    is sent to it. Cheap enough to call on a keystroke.
+
+    Returns:
+        Future | None: The checks running on the session loop, or None if
+        there's nothing to check or checks are already in flight.
+    """
+
+    router = api_config.router
+    if router is None or (router.checking is not None and not router.checking.done()):
+        return None
+    due = router.due_for_check()
+    if not due:
+        return None
+    router.checking = submit(check_endpoints_async(api_config, due))
+    return router.checking
+
+
+async def check_endpoints_async(api_config: ApiConfig, endpoints: list[Endpoint]):
+    """Check `endpoints` at the same time."""
+
+    await asyncio.gather(*(check_endpoint(api_config, e) for e in endpoints))
+
+
+async def check_endpoint(api_config: ApiConfig, endpoint: Endpoint) -> None:
+    """A HEAD request over the shared pool. Any response below 500 means
+    the endpoint is up (a 404 from an API root is normal)."""
+
+    import httpx
+
+    try:
+        response = await api_config.async_http_client.head(endpoint.config["base_url"])
+        endpoint.health.record(response.status_code < 500)
+    except httpx.HTTPError as e:
+        logger.debug(
+            "%s: Health check of %s failed\n%s", type(e).__name__, endpoint.name, e
+        )
+        endpoint.health.record(False)
+
+
+def api_error_messages() -> dict[type[Exception], str]:
+    """User-facing messages for the errors an API call can raise."""
+
+    import openai
+
+    return {
+        openai.AuthenticationError: "API information validation failed: invalid API key",
+        openai.BadRequestError: "API information validation failed: invalid model name",
+        openai.NotFoundError: "API information validation failed: invalid base URL",
+        openai.RateLimitError: "Request failed: rate limit exceeded (too many requests). Please wait and try again",
+        openai.APIConnectionError: "Request failed: unable to connect to the API (network error). Please check your connection and try again",
+        ValueError: "Invalid API credentials (checked .env, system environment variables, and user input)",
+    }
+
 
+def __getattr__(name: str) -> Any:
+    # module attributes that need openai are only built when first used
+    if name == "openai":
+        import openai
 
-API_ERROR_MESSAGES = {
-    openai.AuthenticationError: "API information validation failed: invalid API key",
-    openai.BadRequestError: "API information validation failed: invalid model name",
-    openai.NotFoundError: "API information validation failed: invalid base URL",
-    openai.RateLimitError: "Request failed: rate limit exceeded (too many requests). Please wait and try again",
-    openai.APIConnectionError: "Request failed: unable to connect to the API (network error). Please check your connection and try again",
-    ValueError: "Invalid API credentials (checked .env, system environment variables, and user input)",
-}
+        return openai
+    if name == "API_ERROR_MESSAGES":
+        return api_error_messages()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import IO, Any, Iterable
+
+from cliqq.log import logger
+from cliqq.models import ActionParser, ApiConfig
+from cliqq.prep import prep_prompt
+
+
+def read_prompts(lines: Iterable[str], field: str = "prompt") -> list[dict[str, Any]]:
+    """Prompts from a text or JSONL source, one per line.
+
+    A line that is a JSON object gives its `field` as the prompt (and its
+    "id" or "request_id", if any, as the id), any other line is the prompt
+    itself. Blank lines are skipped. A record without a prompt, or with a
+    blank one, keeps its place but gets an "error" instead of being sent.
+
+    Returns:
+        list[dict[str, Any]]: {"index", "id", "prompt"} per prompt, and
+        "error" if there is nothing to send.
+    """
+
+    prompts = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        record: Any = line
+        if line.startswith("{"):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                pass
+        index = len(prompts)
+        item: dict[str, Any] = {"index": index, "id": index, "prompt": line}
+        if isinstance(record, dict):
+            value = record.get(field)
+            item["prompt"] = "" if value is None else str(value)
+            item["id"] = record.get("id", record.get("request_id", index))
+            if value is None:
+                item["error"] = f"No {field!r} in the record"
+        if "error" not in item and not item["prompt"].strip():
+            item["error"] = "Empty prompt"
+        prompts.append(item)
+    return prompts
+
+
+async def answer_prompt(
+    api_config: ApiConfig, system: str, template: str, item: dict[str, Any]
+) -> dict[str, Any]:
+    """Send one prompt on its own (no history) and describe the answer.
+
+    Requests fail over between endpoints and are retried like interactive
+    ones, see send_with_failover. Errors are recorded in the result instead
+    of raised, so one bad prompt doesn't stop the batch.
+    """
+
+    from cliqq.ai import send_with_failover
+
+    result: dict[str, Any] = {"index": item["index"], "id": item["id"]}
+    if "error" in item:
+        # nothing to send
+        result.update(error=item["error"], latency=0.0)
+        return result
+
+    started = time.monotonic()
+    messages = [
+        {"role": "system", "content": system},
+        {"role": "user", "content": prep_prompt(item["prompt"], template)},
+    ]
+
+    async def send() -> Any:
+        # this attempt's endpoint, before waiting lets another prompt fail over
+        client, model = api_config.async_client, api_config.model_name
+        # paced, so a burst of prompts slows down instead of failing
+        await api_config.scheduler.acquire()
+        return await client.chat.completions.create(model=model, messages=messages)
+
+    try:
+        response = await send_with_failover(api_config, send)
+        api_config.mark_active()
+    except Exception as e:
+        logger.exception(
+            "%s: Error while answering batch prompt\n%s", type(e).__name__, e
+        )
+        result.update(
+            error=f"{type(e).__name__}: {e}",
+            latency=round(time.monotonic() - started, 3),
+        )
+        return result
+
+    # same split of prose and action as an interactive answer
+    parser = ActionParser()
+    parser.feed(response.choices[0].message.content or "")
+    parser.close()
+    usage = response.usage
+    result.update(
+        answer=parser.clean_text,
+        action=parser.action,
+        latency=round(time.monotonic() - started, 3),
+        usage=usage.model_dump() if usage is not None else None,
+    )
+    return result
+
+
+async def run_batch(
+    prompts: list[dict[str, Any]],
+    api_config: ApiConfig,
+    system: str,
+    template: str,
+    out: IO[str],
+    concurrency: int = 8,
+) -> dict[str, float]:
+    """Answer `prompts` with at most `concurrency` requests in flight over
+    the shared connection pool, writing one JSON line per result to `out`
+    in input order, as soon as all earlier results are in.
+
+    Actions are only reported, never run.
+
+    Returns:
+        dict[str, float]: Totals for the report, see report_batch.
+    """
+
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    done: dict[int, dict[str, Any]] = {}
+    next_index = 0
+    totals = {"prompts": len(prompts), "errors": 0, "tokens": 0, "latency": 0.0}
+
+    async def answer(item: dict[str, Any]) -> None:
+        nonlocal next_index
+        async with semaphore:
+            result = await answer_prompt(api_config, system, template, item)
+
+        totals["errors"] += "error" in result
+        totals["latency"] += result["latency"]
+        totals["tokens"] += (result.get("usage") or {}).get("total_tokens") or 0
+
+        done[result["index"]] = result
+        while next_index in done:
+            out.write(json.dumps(done.pop(next_index), ensure_ascii=False) + "\n")
+            next_index += 1
+        out.flush()
+
+    started = time.monotonic()
+    await asyncio.gather(*(answer(item) for item in prompts))
+    totals["elapsed"] = time.monotonic() - started
+    return totals
+
+
+def report_batch(totals: dict[str, float]) -> str:
+    """One line on how the batch went."""
+
+    elapsed = max(totals["elapsed"], 1e-9)
+    answered = totals["prompts"] - totals["errors"]
+    mean = totals["latency"] / totals["prompts"] if totals["prompts"] else 0.0
+    return (
+        f"{answered:.0f}/{totals['prompts']:.0f} prompts answered in {elapsed:.1f}s "
+        f"({totals['prompts'] / elapsed:.2f} prompts/s, "
+        f"{totals['tokens'] / elapsed:.0f} tokens/s, "
+        f"mean latency {mean:.2f}s)"
+    )
+
+
+def open_source(source: str) -> IO[str]:
+    """The prompt file, or stdin for "-"."""
+
+    if source == "-":
+        return sys.stdin
+    return open(Path(source).expanduser(), encoding="utf-8")
@@ -0,0 +1,268 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from cliqq.log import logger
+
+
+def credential_key(config: dict[str, str]) -> str:
+    """Hash (model_name, base_url, api_key) so the key itself is never stored."""
+
+    raw = "\0".join((config["model_name"], config["base_url"], config["api_key"]))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def load_validated(cache_path: Path) -> dict[str, float]:
+    """Load the credential cache, mapping credential hashes to the time
+    (seconds since epoch) they were last validated."""
+
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            entries = json.load(f)
+        return {k: float(v) for k, v in entries.items()}
+    except FileNotFoundError:
+        return {}
+    except (ValueError, AttributeError, OSError) as e:
+        # corrupt cache just means validating again
+        logger.exception(
+            "%s: Error while reading credential cache\n%s", type(e).__name__, e
+        )
+        return {}
+
+
+def is_validated(cache_path: Path, config: dict[str, str], ttl: float) -> bool:
+    """Check whether `config` was successfully validated in the last `ttl` seconds."""
+
+    validated_at = load_validated(cache_path).get(credential_key(config))
+    return validated_at is not None and time.time() - validated_at < ttl
+
+
+def remember_validated(cache_path: Path, config: dict[str, str], ttl: float) -> None:
+    """Record that `config` was just validated, dropping expired entries."""
+
+    now = time.time()
+    entries = {k: v for k, v in load_validated(cache_path).items() if now - v < ttl}
+    entries[credential_key(config)] = now
+    save_validated(cache_path, entries)
+
+
+def forget_validated(cache_path: Path, config: dict[str, str]) -> None:
+    """Drop `config` from the cache, e.g. after the API rejected it."""
+
+    entries = load_validated(cache_path)
+    if entries.pop(credential_key(config), None) is not None:
+        save_validated(cache_path, entries)
+
+
+def save_validated(cache_path: Path, entries: dict[str, float]) -> None:
+    """Atomically write the credential cache."""
+
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.exception("OSError: Error while writing credential cache\n%s", e)
+
+
+class ResponseCache:
+    """Opt-in cache of complete AI responses in an SQLite database, keyed by
+    model, base URL and the exact messages sent. Responses are stored as the
+    deltas they were streamed in, so a replay renders exactly like the
+    original answer.
+
+    Entries older than `max_age` are dropped, and once there are more than
+    `max_entries` or `max_bytes` of them the least recently used go first.
+
+    Concurrent identical requests, from this process or another Cliqq, are
+    coalesced: the first one claims the key and the others wait for its
+    response instead of sending their own.
+
+    The methods block on SQLite (which may wait on another process's lock),
+    async code should use them through lookup or asyncio.to_thread.
+
+    Args:
+        path (Path): SQLite database file, created on first use.
+        max_entries (int, optional): Maximum number of cached responses.
+        max_bytes (int, optional): Maximum total size of cached responses.
+        max_age (float, optional): Seconds a response stays valid.
+        claim_timeout (float, optional): Seconds after which a claim is
+            considered abandoned (e.g. its process crashed).
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_entries: int = 1000,
+        max_bytes: int = 20_000_000,
+        max_age: float = 7 * 24 * 60 * 60,
+        claim_timeout: float = 300.0,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.claim_timeout = claim_timeout
+        self._db = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: dict[str, Any], path: Path) -> "ResponseCache | None":
+        """Build a ResponseCache from the "response_cache" section of
+        config.json, or None unless it is enabled."""
+
+        options = config.get("response_cache", {})
+        if not options.get("enabled", False):
+            return None
+        known = ("max_entries", "max_bytes", "max_age", "claim_timeout")
+        return cls(path, **{key: options[key] for key in known if key in options})
+
+    @staticmethod
+    def key(model_name: str, base_url: str, messages: list[dict[str, str]]) -> str:
+        """Hash of everything that determines a response."""
+
+        raw = json.dumps(
+            [model_name, base_url, messages], sort_keys=True, separators=(",", ":")
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @property
+    def db(self):
+        if self._db is None:
+            # only opted-in sessions pay for sqlite
+            import sqlite3
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # autocommit, every statement is its own transaction
+            db = sqlite3.connect(
+                self.path, timeout=10, isolation_level=None, check_same_thread=False
+            )
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY,"
+                " deltas TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS claims (key TEXT PRIMARY KEY,"
+                " claimed REAL NOT NULL)"
+            )
+            self._db = db
+        return self._db
+
+    def get(self, key: str) -> list[str] | None:
+        """Return the cached deltas for `key`, marking them as recently used."""
+
+        now = time.time()
+        with self._lock:
+            row = self.db.execute(
+                "SELECT deltas, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] >= self.max_age:
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self.db.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (now, key)
+            )
+        return json.loads(row[0])
+
+    def put(self, key: str, deltas: list[str]) -> None:
+        """Store a complete response, then evict down to the limits."""
+
+        now = time.time()
+        encoded = json.dumps(deltas)
+        with self._lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, encoded, len(encoded), now, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        self.db.execute(
+            "DELETE FROM responses WHERE created <= ?", (now - self.max_age,)
+        )
+
+        # newest first, everything past either limit goes
+        rows = self.db.execute(
+            "SELECT key, size FROM responses ORDER BY last_used DESC"
+        ).fetchall()
+        total = 0
+        evicted = []
+        for i, (key, size) in enumerate(rows):
+            total += size
+            if i >= self.max_entries or total > self.max_bytes:
+                evicted.append((key,))
+        if evicted:
+            self.db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def claim(self, key: str) -> bool:
+        """Claim the right to request `key` from the API. False if someone
+        else is already requesting it."""
+
+        now = time.time()
+        with self._lock:
+            # abandoned claims don't block anyone forever
+            self.db.execute(
+                "DELETE FROM claims WHERE claimed <= ?", (now - self.claim_timeout,)
+            )
+            cursor = self.db.execute(
+                "INSERT OR IGNORE INTO claims VALUES (?, ?)", (key, now)
+            )
+        return cursor.rowcount == 1
+
+    def is_claimed(self, key: str) -> bool:
+        now = time.time()
+        with self._lock:
+            row = self.db.execute(
+                "SELECT claimed FROM claims WHERE key = ?", (key,)
+            ).fetchone()
+        return row is not None and now - row[0] < self.claim_timeout
+
+    def release(self, key: str) -> None:
+        """Give up a claim, whether or not a response was stored."""
+
+        with self._lock:
+            self.db.execute("DELETE FROM claims WHERE key = ?", (key,))
+
+    def _get_or_claim(self, key: str) -> tuple[list[str] | None, bool]:
+        """(cached deltas, None) or (None, whether we now hold the claim)."""
+
+        deltas = self.get(key)
+        if deltas is not None:
+            return deltas, False
+        if not self.claim(key):
+            return None, False
+        # the previous claim may have stored it just before we claimed
+        deltas = self.get(key)
+        if deltas is not None:
+            self.release(key)
+            return deltas, False
+        return None, True
+
+    async def lookup(self, key: str, poll_interval: float = 0.05) -> list[str] | None:
+        """Return the cached deltas for `key`, waiting for them if another
+        request for it is in flight. None means it isn't cached and the
+        caller now holds the claim, and must release it when done."""
+
+        while True:
+            # sqlite may block on another process, keep it off the event loop
+            deltas, claimed = await asyncio.to_thread(self._get_or_claim, key)
+            if deltas is not None or claimed:
+                return deltas
+            while await asyncio.to_thread(self.is_claimed, key):
+                await asyncio.sleep(poll_interval)
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+        self._db = None
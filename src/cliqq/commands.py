@@ -1,12 +1,30 @@
 import argparse
+import json
 import os
 import sys
 import logging
 import inspect
+from pathlib import Path
+from itertools import islice
 from typing import NoReturn
 
-from cliqq.log import logger
-from cliqq.io import program_output
+from cliqq.log import (
+    clear_segments,
+    flush_logs,
+    logger,
+    parse_since,
+    search_log,
+    stop_logging,
+)
+from cliqq.io import program_choice, program_output
+from cliqq.journal import session_records
+from cliqq.sessions import (
+    SessionLog,
+    find_session,
+    list_sessions,
+    load_messages,
+    session_title,
+)
 from cliqq.action import run_command
 from cliqq.models import (
     Command,
@@ -14,8 +32,18 @@ from cliqq.models import (
     ChatHistory,
     CommandRegistry,
     PathManager,
+    estimate_tokens,
+)
+from cliqq.prep import load_prompt_templates, measure_requests
+from cliqq.stats import (
+    export_stats,
+    finish_turn,
+    format_stats,
+    load_turns,
+    session_turns,
+    summarize,
+    to_prometheus,
 )
-from cliqq.prep import load_template
 
 
 def help_cliqq(registry: CommandRegistry) -> None:
@@ -23,6 +51,9 @@ def help_cliqq(registry: CommandRegistry) -> None:
 
 
 def exit_cliqq() -> NoReturn:
+    # e.g. the answer to /q
+    finish_turn()
+    stop_logging()
     logging.shutdown()
     program_output("Bye! Let's talk again soon!")
     sys.exit(0)
@@ -32,27 +63,104 @@ def clear() -> None:
     os.system("clear||cls")
 
 
-def show_log(paths: PathManager) -> None:
+def show_log(
+    paths: PathManager,
+    count: int = 20,
+    since: str | None = None,
+    grep: list[str] | None = None,
+    session: str | None = None,
+) -> None:
+    """Show the newest log entries, then older ones a page at a time.
+
+    The log is read backwards from the end, so this is quick however large
+    it has grown.
+
+    Args:
+        paths (PathManager): Where the log is.
+        count (int, optional): Entries per page.
+        since (str, optional): Only entries from this time on, e.g. "2h" or
+            "2025-01-01 09:00".
+        grep (list[str], optional): Only entries containing these words.
+        session (str, optional): Show this session from the structured
+            journal instead.
+    """
+
+    if session:
+        show_session(paths, session)
+        return
+
+    try:
+        start = parse_since(since) if since else None
+    except ValueError:
+        program_output(
+            f"Can't read the time '{since}', try e.g. 30m, 2h, 1d or 2025-01-01",
+            style_name="error",
+        )
+        return
+
     try:
-        for handler in logger.handlers:
-            handler.flush()
-        with open(paths.log_path, encoding="utf-8") as f:
-            log = f.read()
-            # TODO a better way to display log, especially if it's large
-            program_output(log, style_name="action")
-            program_output("--------- end of log ---------", style_name="action")
-    except FileNotFoundError:
-        program_output("The log is empty!", style_name="action")
-        # create log if it doesn't exist, probably redundant but check
-        f = open(paths.log_path, "a", encoding="utf-8")
-        f.close()
+        flush_logs()
+        entries = search_log(paths.log_path, start, " ".join(grep) if grep else None)
+        page = list(islice(entries, max(count, 1)))
+        if not page:
+            empty = "No log entries match." if since or grep else "The log is empty!"
+            program_output(empty, style_name="action", log=False)
+            return
+
+        choices = [
+            ("yes", "Yes"),
+            ("no", "No"),
+        ]
+        while page:
+            # pages go back in time, entries on a page read top to bottom
+            program_output("\n".join(reversed(page)), style_name="action", log=False)
+            page = list(islice(entries, max(count, 1)))
+            if page and (
+                program_choice("Show older entries?", choices, log=False) != "yes"
+            ):
+                break
+        program_output("--------- end of log ---------", style_name="action", log=False)
     except IOError as e:
         program_output("Error reading log file", style_name="error")
         logger.exception("IOError: Error while reading log file\n%s", e)
 
 
+def show_session(paths: PathManager, session: str) -> None:
+    """Show one session's turns from the structured journal."""
+
+    try:
+        lines = []
+        for turn in session_records(paths.journal_path, session):
+            detail = turn.get("content") or turn.get("command", "")
+            if turn["role"] == "command":
+                detail += f"  ({turn.get('status')}, exit code {turn.get('code')})"
+            lines.append(f"{turn['time']} {turn['role']}: {detail}")
+    except IOError as e:
+        program_output("Error reading session journal", style_name="error")
+        logger.exception("IOError: Error while reading session journal\n%s", e)
+        return
+
+    if not lines:
+        program_output(
+            f"No session '{session}' in {paths.journal_path}", style_name="action"
+        )
+        return
+    program_output("\n".join(lines), style_name="action", log=False)
+
+
+def add_log_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("count", nargs="?", type=int, default=20)
+    parser.add_argument("--since", help="e.g. 30m, 2h, 1d or 2025-01-01 09:00")
+    parser.add_argument("--grep", nargs="+", help="only entries with this text")
+    parser.add_argument("--session", help="a session from the structured journal")
+
+
 def clear_log(paths: PathManager) -> None:
     try:
+        # pending records would otherwise land in the fresh file
+        flush_logs()
+        clear_segments(paths.log_path)
+        clear_segments(paths.debug_path)
         with open(paths.log_path, "w", encoding="utf-8") as f:
             f.write("")
         with open(paths.debug_path, "w", encoding="utf-8") as f:
@@ -65,8 +173,11 @@ def clear_log(paths: PathManager) -> None:
 
 def clear_context(history: ChatHistory, paths: PathManager) -> None:
     history.forget()
-    template = load_template(paths.script_path / "templates" / "starter_template.txt")
-    history.remember({"role": "system", "content": template})
+    if history.store is not None:
+        # the old conversation stays resumable, a new one starts here
+        history.store = SessionLog(history.store.directory)
+    system_template, _ = load_prompt_templates(paths)
+    history.remember({"role": "system", "content": system_template})
     program_output(
         "Chat history cleared. I don't remember anything? I don't remember anything!",
         style_name="action",
@@ -74,6 +185,187 @@ def clear_context(history: ChatHistory, paths: PathManager) -> None:
     program_output("How can I help you?")
 
 
+def show_sessions(history: ChatHistory, paths: PathManager, count: int = 20) -> None:
+    """List the most recently used saved sessions."""
+
+    current = history.store.session_id if history.store is not None else None
+    try:
+        sessions = list_sessions(paths.sessions_path)
+        lines = []
+        for session in sessions[:count]:
+            marker = "*" if session["id"] == current else " "
+            lines.append(
+                f"{marker} {session['id']}  {session['modified']:%Y-%m-%d %H:%M}  "
+                f"{session['size'] / 1024:7.1f} KB  {session_title(session['path'])}"
+            )
+    except OSError as e:
+        program_output("Error reading saved sessions", style_name="error")
+        logger.exception("%s: Error while listing sessions\n%s", type(e).__name__, e)
+        return
+
+    if not lines:
+        program_output("No saved sessions yet.", style_name="action")
+        return
+    if len(sessions) > count:
+        lines.append(f"... and {len(sessions) - count} older sessions")
+    program_output(
+        "\n".join(lines) + "\nResume one with /resume <id> (the start of it is enough)",
+        style_name="action",
+        log=False,
+    )
+
+
+def add_sessions_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("count", nargs="?", type=int, default=20)
+
+
+def resume_session(
+    history: ChatHistory, paths: PathManager, session: str | None = None
+) -> None:
+    """Continue a saved session: the newest turns that fit in the history's
+    budget are loaded, and new turns are appended to the same session.
+    Without an id, the most recent other session is resumed.
+
+    Args:
+        history (ChatHistory): Replaced by the saved session.
+        paths (PathManager): Where sessions are saved.
+        session (str, optional): The session's id, or the start of it.
+    """
+
+    current = history.store.session_id if history.store is not None else None
+    try:
+        found = find_session(paths.sessions_path, session, current)
+    except ValueError as e:
+        program_output(f"Which one? {e}", style_name="error")
+        return
+    if found is None:
+        program_output(
+            f"No saved session '{session}'" if session else "No saved sessions yet.",
+            style_name="error",
+        )
+        return
+
+    system_template, _ = load_prompt_templates(paths)
+    system = {"role": "system", "content": system_template}
+    budget = None
+    if history.max_tokens is not None:
+        budget = history.max_tokens - estimate_tokens(system)
+    try:
+        messages = load_messages(found["path"], budget)
+    except OSError as e:
+        program_output("Error reading saved session", style_name="error")
+        logger.exception("%s: Error while resuming session\n%s", type(e).__name__, e)
+        return
+
+    history.forget()
+    history.remember(system)
+    history.restore(messages)
+    if history.store is not None:
+        history.store = SessionLog(paths.sessions_path, found["id"])
+
+    title = session_title(found["path"])
+    program_output(
+        f"Resumed session {found['id']}"
+        + (f" ({title})" if title else "")
+        + f", {len(messages)} messages loaded. Where were we?",
+        style_name="action",
+    )
+
+
+def add_resume_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("session", nargs="?", help="id, or the start of it")
+
+
+def measure_prompt(history: ChatHistory, paths: PathManager) -> None:
+    """Show how big requests are in this session and how the full and
+    compact prompt modes compare as a conversation grows."""
+
+    current = len(json.dumps(history.messages()).encode("utf-8"))
+    lines = [
+        f"This session's history is {current:,} bytes (~{history.total_tokens:,} tokens) and is sent with every request.",
+        "Request size for a one-line question with a short answer, full mode -> compact mode:",
+    ]
+
+    question = "how do I list the files in this folder?"
+    answer = 'You can use `ls -la` to list every file, including hidden ones.\n\x1e\n{"type": "command", "command": "ls -la"}\n\x1f'
+    turns = (1, 10, 25)
+    full, compact = (
+        measure_requests(
+            *load_prompt_templates(paths, mode), max(turns), question, answer
+        )
+        for mode in ("full", "compact")
+    )
+    for turn in turns:
+        (full_bytes, full_tokens), (compact_bytes, compact_tokens) = (
+            full[turn - 1],
+            compact[turn - 1],
+        )
+        saved = 100 * (full_bytes - compact_bytes) / full_bytes
+        lines.append(
+            f"  turn {turn:>2}: {full_bytes:,} B / ~{full_tokens:,} tok -> {compact_bytes:,} B / ~{compact_tokens:,} tok ({saved:.0f}% smaller)"
+        )
+
+    program_output("\n".join(lines), style_name="action")
+
+
+def show_stats(
+    paths: PathManager,
+    all_sessions: bool = False,
+    export: str | None = None,
+    out: str | None = None,
+) -> None:
+    """Show latency and throughput percentiles of this session's turns, or
+    of the latest saved turns of every session, or export them.
+
+    Args:
+        paths (PathManager): Where saved turns and exports go.
+        all_sessions (bool, optional): Across sessions instead of this one.
+        export (str, optional): "prometheus" or "json".
+        out (str, optional): File to export to. Prometheus exports default
+            to ~/.cliqq/cliqq.prom, JSON ones are shown.
+    """
+
+    scope = "all" if all_sessions else "session"
+    try:
+        turns = load_turns(paths.stats_path) if all_sessions else session_turns()
+    except OSError as e:
+        program_output("Error reading saved stats", style_name="error")
+        logger.exception("%s: Error while reading saved stats\n%s", type(e).__name__, e)
+        return
+    summary = summarize(turns)
+
+    if not export:
+        program_output(format_stats(summary, len(turns)), style_name="action")
+        return
+
+    if export == "prometheus":
+        text = to_prometheus(summary, scope)
+        target = out or str(paths.home_path / "cliqq.prom")
+    else:
+        text = json.dumps(
+            {"scope": scope, "turns": len(turns), "metrics": summary}, indent=2
+        )
+        target = out
+        if not target:
+            program_output(text, style_name="action", log=False)
+            return
+
+    try:
+        export_stats(text, Path(target).expanduser())
+        program_output(f"Stats exported to {target}", style_name="action")
+    except OSError as e:
+        program_output(f"Can't export stats to {target}: {e}", style_name="error")
+        logger.exception("%s: Error while exporting stats\n%s", type(e).__name__, e)
+
+
+def add_stats_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--all", dest="all_sessions", action="store_true", help="across sessions"
+    )
+    parser.add_argument("--export", choices=("prometheus", "json"))
+    parser.add_argument("--out", help="file to export to")
+
+
 def quick_response(
     args: str, api_config: ApiConfig, history: ChatHistory, paths: PathManager
 ) -> None:
@@ -84,6 +376,73 @@ def quick_response(
     exit_cliqq()
 
 
+def batch_prompts(
+    api_config: ApiConfig,
+    paths: PathManager,
+    source: str = "-",
+    out: str | None = None,
+    concurrency: int = 8,
+    field: str = "prompt",
+) -> NoReturn:
+    """Answer every prompt in a file (or stdin) concurrently and write the
+    results as JSONL, see cliqq.batch. Actions are never run."""
+
+    from concurrent.futures import CancelledError
+
+    from cliqq.ai import ensure_api
+    from cliqq.batch import open_source, read_prompts, report_batch, run_batch
+    from cliqq.loop import run_sync
+
+    try:
+        f = open_source(source)
+        prompts = read_prompts(f, field)
+        if f is not sys.stdin:
+            f.close()
+    except OSError as e:
+        # stdout may be the results, so errors go to stderr
+        print(f"Can't read prompts from {source}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    # validated once for the whole batch, never prompted for since the
+    # prompt would end up in the results
+    if not ensure_api(paths.env_path, api_config, interactive=False):
+        print(
+            f"No valid API credentials found, set them in {paths.env_path} "
+            "or the MODEL_NAME, BASE_URL and API_KEY environment variables.",
+            file=sys.stderr,
+        )
+        stop_logging()
+        sys.exit(1)
+
+    system, template = load_prompt_templates(paths)
+    results = open(out, "w", encoding="utf-8") if out else sys.stdout
+    try:
+        totals = run_sync(
+            run_batch(prompts, api_config, system, template, results, concurrency)
+        )
+    except (KeyboardInterrupt, CancelledError):
+        # results written so far are complete lines
+        print("Batch interrupted", file=sys.stderr)
+        stop_logging()
+        sys.exit(130)
+    finally:
+        if out:
+            results.close()
+
+    report = report_batch(totals)
+    logger.info(report)
+    print(report, file=sys.stderr)
+    stop_logging()
+    sys.exit(1 if totals["errors"] else 0)
+
+
+def add_batch_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("source", nargs="?", default="-", help="file, or - for stdin")
+    parser.add_argument("--out", help="JSONL file for the results (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--field", default="prompt", help="prompt key in JSONL input")
+
+
 def dispatch(
     user_input: argparse.Namespace,  # namespace
     api_config: ApiConfig,
@@ -107,6 +466,11 @@ def dispatch(
     if "paths" in sig.parameters:
         kwargs["paths"] = paths
 
+    # options the command added to its own subparser
+    for name in sig.parameters:
+        if name not in kwargs and name != "args" and hasattr(user_input, name):
+            kwargs[name] = getattr(user_input, name)
+
     # if this Command takes positional arguments
     if command.args:
         # currently all commands only take one, alter if future commands need more
@@ -137,8 +501,9 @@ def register_commands(registry: CommandRegistry) -> None:
         "/log",
         Command(
             name="/log",
-            description="See chat log",
+            description="See chat log, newest first: /log [N] [--since 2h] [--grep text]",
             function=show_log,
+            add_options=add_log_options,
         ),
     )
     registry.register_command(
@@ -165,6 +530,41 @@ def register_commands(registry: CommandRegistry) -> None:
             function=clear_context,
         ),
     )
+    registry.register_command(
+        "/sessions",
+        Command(
+            name="/sessions",
+            description="List saved sessions, most recent first: /sessions [N]",
+            function=show_sessions,
+            add_options=add_sessions_options,
+        ),
+    )
+    registry.register_command(
+        "/resume",
+        Command(
+            name="/resume",
+            description="Continue a saved session (default: the most recent one)",
+            function=resume_session,
+            add_options=add_resume_options,
+        ),
+    )
+    registry.register_command(
+        "/measure",
+        Command(
+            name="/measure",
+            description="Show how many bytes/tokens are sent per request",
+            function=measure_prompt,
+        ),
+    )
+    registry.register_command(
+        "/stats",
+        Command(
+            name="/stats",
+            description="Show turn latency percentiles: /stats [--all] [--export prometheus|json] [--out file]",
+            function=show_stats,
+            add_options=add_stats_options,
+        ),
+    )
     registry.register_command(
         "/run",
         Command(
@@ -174,6 +574,15 @@ def register_commands(registry: CommandRegistry) -> None:
             args="[command]",
         ),
     )
+    registry.register_command(
+        "/batch",
+        Command(
+            name="/batch",
+            description="Answer prompts from a file or stdin concurrently, as JSONL",
+            function=batch_prompts,
+            add_options=add_batch_options,
+        ),
+    )
     registry.register_command(
         "/q",
         Command(
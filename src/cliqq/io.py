@@ -1,16 +1,23 @@
-from prompt_toolkit import prompt
+from typing import Callable
+
+from prompt_toolkit import PromptSession
 from prompt_toolkit import print_formatted_text
 from prompt_toolkit.formatted_text import FormattedText, to_plain_text
 from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
+from prompt_toolkit.output import create_output
 from prompt_toolkit.shortcuts import choice
 
 from cliqq.styles import DEFAULT_STYLE
 from cliqq.log import logger
 
 
-def user_input(log: bool = True) -> str:
+def user_input(log: bool = True, on_typing: Callable[[], None] | None = None) -> str:
     """Prompt the user for input with styled formatting and returns
     the entered text. Optionally logs the input.
+
+    Args:
+        log (bool, optional): Whether to log the input. Defaults to True.
+        on_typing (Callable, optional): Called once, on the first keystroke.
     """
 
     message = FormattedText(
@@ -18,9 +25,22 @@ def user_input(log: bool = True) -> str:
             ("class:user", ">> "),
         ]
     )
-    input_text = prompt(
+    session: PromptSession[str] = PromptSession(
         message=message, style=DEFAULT_STYLE, auto_suggest=AutoSuggestFromHistory()
     )
+
+    if on_typing:
+        typed = False
+
+        def first_keystroke(_buffer) -> None:
+            nonlocal typed
+            if not typed:
+                typed = True
+                on_typing()
+
+        session.default_buffer.on_text_changed += first_keystroke
+
+    input_text = session.prompt()
     if log:
         logger.info(f"{to_plain_text(message)}{input_text}\n")
     return input_text
@@ -90,3 +110,28 @@ def program_output(
             logger.info(plain_text + text)
 
     print_formatted_text(message, style=DEFAULT_STYLE, end=end, flush=True)
+
+
+def stream_writer(style_name: str = "program") -> Callable[[str], None]:
+    """Return a function that prints streamed text in one style.
+
+    Unlike program_output(continuous=True), the terminal output and the
+    style's attributes are looked up once for the whole stream, so each
+    write is only the text and the escape codes around it. Nothing is
+    logged.
+
+    Args:
+        style_name (str, optional): Style class name to apply. Defaults to "program".
+    """
+
+    output = create_output()
+    attrs = DEFAULT_STYLE.get_attrs_for_style_str("class:" + style_name)
+    color_depth = output.get_default_color_depth()
+
+    def write(text: str) -> None:
+        output.set_attributes(attrs, color_depth)
+        output.write(text)
+        output.reset_attributes()
+        output.flush()
+
+    return write
@@ -0,0 +1,225 @@
+import itertools
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterator
+
+from cliqq.log import add_handler, logger
+
+# set by start_journal, log_turn does nothing until then
+_journal: "SessionJournal | None" = None
+_session_id = ""
+_seq = itertools.count(1)
+
+
+def new_session_id() -> str:
+    """Sortable, and unique enough for one user's sessions."""
+
+    return time.strftime("%Y%m%d-%H%M%S-") + os.urandom(2).hex()
+
+
+class SessionJournal(logging.Handler):
+    """Logging handler that appends turn records as JSON lines, and keeps a
+    sidecar index of where each session and each day starts in the file.
+
+    The index has one line per entry, "session <id> <offset>" or
+    "day <YYYY-MM-DD> <offset>", so it stays small however large the
+    journal grows, and a reader can seek straight to a session.
+
+    Only records logged with log_turn (which carry a `turn` attribute) are
+    written, everything else is left to the text logs.
+
+    Attributes:
+        path (Path): The JSONL journal.
+        index_path (Path): Its offset index.
+    """
+
+    def __init__(self, path: Path, index_path: Path | None = None):
+        super().__init__()
+        self.path = path
+        self.index_path = index_path or path.with_suffix(".idx")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd: int | None = None
+        self._sessions: dict[str, int] | None = None
+        self._days: dict[str, int] = {}
+        # sessions this process wrote to, they get an end record on close
+        self._open_sessions: set[str] = set()
+
+    def emit(self, record: logging.LogRecord):
+        turn = getattr(record, "turn", None)
+        if turn is None:
+            return
+        try:
+            self.write(turn)
+        except Exception:
+            self.handleError(record)
+
+    def write(self, turn: dict[str, Any]) -> int:
+        """Append one record and index it if it starts a session or a day.
+
+        Returns:
+            int: The record's byte offset in the journal.
+        """
+
+        line = (json.dumps(turn, ensure_ascii=False) + "\n").encode("utf-8")
+        with self.lock:  # type: ignore[union-attr]
+            if self._fd is None:
+                # O_APPEND, so lines from several processes never overlap
+                self._fd = os.open(
+                    self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+                )
+            if self._sessions is None:
+                self._sessions, self._days = load_index(self.index_path)
+
+            os.write(self._fd, line)
+            offset = os.lseek(self._fd, 0, os.SEEK_CUR) - len(line)
+
+            entries = []
+            session = turn.get("session", "")
+            if session not in self._sessions:
+                self._sessions[session] = offset
+                entries.append(f"session {session} {offset}\n")
+            day = turn.get("time", "")[:10]
+            if day and day not in self._days:
+                self._days[day] = offset
+                entries.append(f"day {day} {offset}\n")
+            if entries:
+                with open(self.index_path, "a", encoding="utf-8") as f:
+                    f.write("".join(entries))
+
+            if turn.get("role") != "end":
+                self._open_sessions.add(session)
+            return offset
+
+    def close(self):
+        with self.lock:  # type: ignore[union-attr]
+            for session in sorted(self._open_sessions):
+                # readers stop at this instead of scanning to the end
+                self.write({"session": session, "time": now(), "role": "end"})
+            self._open_sessions.clear()
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+        super().close()
+
+
+def now() -> str:
+    return datetime.now().isoformat(timespec="milliseconds")
+
+
+def load_index(index_path: Path) -> tuple[dict[str, int], dict[str, int]]:
+    """First offset of each session and each day in a journal."""
+
+    sessions: dict[str, int] = {}
+    days: dict[str, int] = {}
+    try:
+        with open(index_path, encoding="utf-8") as f:
+            for line in f:
+                kind, key, offset = line.split()
+                target = sessions if kind == "session" else days
+                target.setdefault(key, int(offset))
+    except FileNotFoundError:
+        pass
+    except ValueError as e:
+        # a torn last line, the entries before it are still good
+        logger.warning("ValueError: Bad line in journal index\n%s", e)
+    return sessions, days
+
+
+def read_from(path: Path, offset: int) -> Iterator[dict[str, Any]]:
+    """Journal records from `offset` on."""
+
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # a record still being written by another process
+                continue
+
+
+def session_records(path: Path, session_id: str) -> Iterator[dict[str, Any]]:
+    """Records of one session, found through the index.
+
+    Args:
+        path (Path): The journal.
+        session_id (str): Session to read.
+    """
+
+    sessions, _ = load_index(path.with_suffix(".idx"))
+    if session_id not in sessions:
+        return
+    for record in read_from(path, sessions[session_id]):
+        if record.get("session") != session_id:
+            # another process's session, written at the same time
+            continue
+        if record.get("role") == "end":
+            return
+        yield record
+
+
+def day_records(path: Path, day: str) -> Iterator[dict[str, Any]]:
+    """Records written on `day` (YYYY-MM-DD), found through the index."""
+
+    _, days = load_index(path.with_suffix(".idx"))
+    if day not in days:
+        return
+    for record in read_from(path, days[day]):
+        if record.get("time", "")[:10] > day:
+            return
+        yield record
+
+
+def session_ids(path: Path) -> list[str]:
+    """Every session in the journal, oldest first."""
+
+    sessions, _ = load_index(path.with_suffix(".idx"))
+    return sorted(sessions, key=sessions.__getitem__)
+
+
+def start_journal(config: dict[str, Any], path: Path) -> None:
+    """Start writing turns to the journal at `path` if the "structured"
+    option of the "logging" section is on.
+
+    Args:
+        config (dict[str, Any]): The whole config.
+        path (Path): The journal, e.g. ~/.cliqq/sessions.jsonl.
+    """
+
+    global _journal, _session_id
+
+    if not config.get("logging", {}).get("structured", False):
+        return
+    _session_id = new_session_id()
+    _journal = SessionJournal(path)
+    add_handler(_journal)
+
+
+def session_id() -> str:
+    return _session_id
+
+
+def log_turn(role: str, **fields: Any) -> None:
+    """Record one turn of the session in the journal, if it is on.
+
+    Args:
+        role (str): "user", "assistant" or "command".
+        **fields: Anything else worth recording, e.g. elapsed time, the
+            action or the exit code. Must be JSON serializable.
+    """
+
+    if _journal is None:
+        return
+    turn = {
+        "session": _session_id,
+        "seq": next(_seq),
+        "time": now(),
+        "role": role,
+        **fields,
+    }
+    # written by the log writer thread, like everything else
+    logger.info("%s turn", role, extra={"turn": turn})
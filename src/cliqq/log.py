@@ -1,29 +1,88 @@
+import atexit
+import gzip
 import logging
+import logging.handlers
+import os
+import queue
+import re
+import shutil
 import sys
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Any, Iterator
+
+# rotation defaults, overridden by the "logging" section of config.json
+MAX_BYTES = 5_000_000
+BACKUP_COUNT = 5
+RETENTION = 30 * 24 * 60 * 60
+
+# every record in the logs starts with its asctime
+ENTRY_START = re.compile(rb"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3} ")
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+# how much of a log file is read at a time when reading backwards
+READ_BLOCK = 64 * 1024
 
 
 # can use MemoryHandler instead?
 class BufferingFileHandler(logging.Handler):
     """Custom logging handler that buffers log records before writing to a file.
 
+    The file is opened once and kept open. Buffered records are written once
+    `buffer_size` records or `flush_interval` seconds have accumulated, or
+    right away for records at `flush_level` or above, so errors reach the
+    disk even if the process is killed.
+
+    Before a write would take the file past `max_bytes`, or once the file is
+    older than `max_age` seconds, it is renamed to a timestamped segment
+    (e.g. cliqq.log.20250101-120000.gz), gzipped if `compress` is set, and a
+    new file is started. Only the newest `backup_count` segments are kept,
+    and segments older than `retention` seconds are deleted. A limit of 0
+    turns that check off.
+
     Attributes:
         _buffer_size (int): Number of records to buffer before flushing.
-        _buffer (list[str]): In-memory buffer of formatted log records.
+        _buffer (list[str]): In-memory buffer of formatted log records, each
+            followed by a blank line.
         _filename (Path): Path to the log file.
     """
 
-    def __init__(self, filename: str, buffer_size: int = 10):
+    def __init__(
+        self,
+        filename: str,
+        buffer_size: int = 10,
+        flush_interval: float = 1.0,
+        flush_level: int = logging.ERROR,
+        directory: Path | None = None,
+        max_bytes: int = MAX_BYTES,
+        max_age: float = 0,
+        backup_count: int = BACKUP_COUNT,
+        retention: float = RETENTION,
+        compress: bool = True,
+    ):
         super().__init__()
         self._buffer_size = buffer_size
         self._buffer: list[str] = []
+        self.flush_interval = flush_interval
+        self.flush_level = flush_level
+        # monotonic time of the oldest unwritten record
+        self._buffered_since = 0.0
 
-        home = Path("~/.cliqq").expanduser()
+        home = directory or Path("~/.cliqq").expanduser()
         home.mkdir(parents=True, exist_ok=True)
 
         self._filename = home / filename
 
         self._filename.touch(exist_ok=True)
+        self._stream = None
+        # when the current file was started, for max_age
+        self._opened_at = 0.0
+
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backup_count = backup_count
+        self.retention = retention
+        self.compress = compress
 
     def emit(self, record: logging.LogRecord):
         """Handle a new log record, which is the type by which
@@ -34,19 +93,312 @@ class BufferingFileHandler(logging.Handler):
         """
 
         msg = self.format(record)
-        self._buffer.append(msg)
-        if len(self._buffer) >= self._buffer_size:
+        if not self._buffer:
+            self._buffered_since = time.monotonic()
+        # one record per line (or lines), so readers can split them apart
+        # by their timestamps however many are flushed together
+        self._buffer.append(msg + "\n\n")
+        if (
+            len(self._buffer) >= self._buffer_size
+            or record.levelno >= self.flush_level
+            or self.is_due()
+        ):
             self.flush()
 
+    def is_due(self) -> bool:
+        """True if the oldest buffered record has waited `flush_interval`."""
+
+        return bool(self._buffer) and (
+            time.monotonic() - self._buffered_since >= self.flush_interval
+        )
+
     def flush(self):
         """Write buffered log records to file and clear the buffer."""
 
-        if not self._buffer:
+        with self.lock:  # type: ignore[union-attr]
+            if not self._buffer:
+                return
+            log_text = "".join(self._buffer)
+            self._open()
+            if self.should_rotate(len(log_text.encode("utf-8"))):
+                self.rotate()
+                self._open()
+            self._stream.write(log_text)  # type: ignore[union-attr]
+            self._stream.flush()  # type: ignore[union-attr]
+            self._buffer.clear()
+
+    def _open(self) -> None:
+        if self._stream is not None:
             return
-        log_text = "".join(self._buffer)
-        with open(self._filename, "a", encoding="utf-8") as f:
-            f.write(log_text + "\n\n")
-        self._buffer.clear()
+        # append mode, so writes land at the end even after /wipe
+        self._stream = open(self._filename, "a", encoding="utf-8")
+        stat = os.fstat(self._stream.fileno())
+        # an existing file is at least as old as its last write
+        self._opened_at = stat.st_mtime if stat.st_size else time.time()
+
+    def should_rotate(self, pending: int) -> bool:
+        """True if writing `pending` more bytes would pass `max_bytes`, or
+        the current file has been written to for longer than `max_age`."""
+
+        size = os.fstat(self._stream.fileno()).st_size  # type: ignore[union-attr]
+        if not size:
+            return False
+        if self.max_bytes and size + pending > self.max_bytes:
+            return True
+        return bool(self.max_age) and time.time() - self._opened_at >= self.max_age
+
+    def rotate(self) -> None:
+        """Move the current file to a new segment and prune old segments."""
+
+        with self.lock:  # type: ignore[union-attr]
+            if self._stream is not None:
+                self._stream.close()
+                self._stream = None
+
+            # several rotations in one second get a counter, never reused so
+            # the order survives pruning
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            same_second = [
+                segment_key(p)[1]
+                for p in log_segments(self._filename)[:-1]
+                if segment_key(p)[0] == stamp
+            ]
+            name = f"{self._filename.name}.{stamp}"
+            if same_second:
+                name += f"-{max(same_second) + 1}"
+            segment = self._filename.with_name(name)
+
+            os.replace(self._filename, segment)
+            self._filename.touch()
+            if self.compress:
+                with (
+                    open(segment, "rb") as src,
+                    gzip.open(segment.with_name(segment.name + ".gz"), "wb") as dst,
+                ):
+                    shutil.copyfileobj(src, dst)
+                segment.unlink()
+
+            self.prune()
+
+    def prune(self) -> None:
+        """Delete segments past `backup_count` or older than `retention`."""
+
+        segments = log_segments(self._filename)[:-1]
+        now = time.time()
+        for i, segment in enumerate(segments):
+            too_many = len(segments) - i > self.backup_count
+            try:
+                if too_many or (
+                    self.retention and now - segment.stat().st_mtime > self.retention
+                ):
+                    segment.unlink()
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        self.flush()
+        with self.lock:  # type: ignore[union-attr]
+            if self._stream is not None:
+                self._stream.close()
+                self._stream = None
+        super().close()
+
+
+def segment_key(segment: Path) -> tuple[str, int]:
+    """Sort key for a rotated segment: its timestamp and counter."""
+
+    # name.20250101-120000[-N][.gz]
+    stamp = segment.name.removesuffix(".gz").rsplit(".", 1)[-1]
+    date, clock, *count = stamp.split("-")
+    return f"{date}-{clock}", int(count[0]) if count else 0
+
+
+def log_segments(path: Path) -> list[Path]:
+    """Rotated segments of the log at `path`, oldest first, followed by
+    the current file."""
+
+    # timestamped names sort in the order they were written
+    pattern = path.name + "." + "[0-9]" * 8 + "-*"
+    segments = sorted(path.parent.glob(pattern), key=segment_key)
+    return [*segments, path]
+
+
+def reverse_lines(path: Path, block_size: int = READ_BLOCK) -> Iterator[bytes]:
+    """Lines of an uncompressed file, last first, read a block at a time
+    from the end so only the lines asked for are ever read."""
+
+    with open(path, "rb") as f:
+        position = f.seek(0, os.SEEK_END)
+        # the unfinished start of the last line read
+        partial = b""
+        while position > 0:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            lines = (f.read(step) + partial).split(b"\n")
+            partial = lines.pop(0)
+            yield from reversed(lines)
+        yield partial
+
+
+def reverse_entries(path: Path) -> Iterator[str]:
+    """Entries (one log record, possibly several lines) of a log file or
+    gzipped segment, newest first."""
+
+    if path.suffix == ".gz":
+        # can't seek backwards in a gzip stream, but a segment is at most
+        # max_bytes, so read it forwards once
+        with gzip.open(path, "rb") as f:
+            lines = f.read().split(b"\n")
+        lines.reverse()
+    else:
+        lines = reverse_lines(path)  # type: ignore[assignment]
+
+    entry: list[bytes] = []
+    for line in lines:
+        entry.append(line)
+        if ENTRY_START.match(line):
+            yield b"\n".join(reversed(entry)).decode("utf-8", "replace").strip("\n")
+            entry.clear()
+    # lines before the first timestamp, e.g. from a file written by hand
+    text = b"\n".join(reversed(entry)).decode("utf-8", "replace").strip("\n")
+    if text:
+        yield text
+
+
+def parse_since(since: str, now: datetime | None = None) -> str:
+    """Turn "30m", "2h", "1d" or a date/time into a log timestamp that can
+    be compared with an entry's first characters.
+
+    Raises:
+        ValueError: If `since` is neither.
+    """
+
+    now = now or datetime.now()
+    units = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+    match = re.fullmatch(r"(\d+)([smhdw])", since.strip())
+    if match:
+        start = now - timedelta(**{units[match.group(2)]: int(match.group(1))})
+    else:
+        start = datetime.fromisoformat(since.strip())
+    return start.strftime(TIMESTAMP_FORMAT)
+
+
+def search_log(
+    path: Path, since: str | None = None, pattern: str | None = None
+) -> Iterator[str]:
+    """Entries of the log at `path`, newest first, across its segments.
+
+    Entries are read lazily from the end, so the newest ones come back
+    right away however large the log is.
+
+    Args:
+        path (Path): The current log file.
+        since (str, optional): Only entries from this timestamp on, in
+            TIMESTAMP_FORMAT (see parse_since).
+        pattern (str, optional): Only entries containing this text,
+            ignoring case.
+    """
+
+    needle = pattern.lower() if pattern else None
+    for segment in reversed(log_segments(path)):
+        try:
+            for entry in reverse_entries(segment):
+                # timestamps are fixed width, so they compare as strings
+                if since and entry[: len(since)] < since:
+                    return
+                if needle and needle not in entry.lower():
+                    continue
+                yield entry
+        except FileNotFoundError:
+            # pruned while reading
+            continue
+
+
+def clear_segments(path: Path) -> None:
+    """Delete the rotated segments of the log at `path`."""
+
+    for segment in log_segments(path)[:-1]:
+        segment.unlink(missing_ok=True)
+
+
+class LogWriter(logging.handlers.QueueListener):
+    """Background thread that writes queued records to the file handlers,
+    and flushes them when the queue has been quiet for `flush_interval`."""
+
+    def __init__(self, log_queue: queue.Queue, *handlers, flush_interval: float = 1.0):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.flush_interval = flush_interval
+
+    def dequeue(self, block: bool):
+        while True:
+            try:
+                return self.queue.get(block, timeout=self.flush_interval)
+            except queue.Empty:
+                self.flush_due()
+
+    def flush_due(self):
+        for handler in self.handlers:
+            if not isinstance(handler, BufferingFileHandler) or handler.is_due():
+                handler.flush()
+
+
+_log_queue: queue.Queue = queue.Queue()
+_writer: LogWriter | None = None
+
+
+def flush_logs() -> None:
+    """Wait until every record logged so far is written to disk."""
+
+    if _writer is None or _writer._thread is None:
+        return
+    _log_queue.join()
+    for handler in _writer.handlers:
+        handler.flush()
+
+
+def stop_logging() -> None:
+    """Drain the queue and close the log files. Called on exit, including
+    after an uncaught exception."""
+
+    global _writer
+
+    if _writer is None:
+        return
+    writer, _writer = _writer, None
+    if writer._thread is not None:
+        writer.stop()
+    for handler in writer.handlers:
+        handler.close()
+
+
+def add_handler(handler: logging.Handler) -> None:
+    """Have the log writer thread pass records to `handler` as well."""
+
+    if _writer is not None:
+        _writer.handlers = (*_writer.handlers, handler)
+
+
+def configure_logging(config: dict[str, Any]) -> None:
+    """Apply the "logging" section of config.json to the running handlers.
+
+    Args:
+        config (dict[str, Any]): The whole config, see README for the keys.
+    """
+
+    options = config.get("logging", {})
+    if _writer is None:
+        return
+    for handler in _writer.handlers:
+        if not isinstance(handler, BufferingFileHandler):
+            continue
+        with handler.lock:  # type: ignore[union-attr]
+            handler.max_bytes = options.get("max_bytes", MAX_BYTES)
+            handler.max_age = options.get("max_age", 0)
+            handler.backup_count = options.get("backup_count", BACKUP_COUNT)
+            handler.retention = options.get("retention", RETENTION)
+            handler.compress = options.get("compress", True)
+            handler.prune()
 
 
 def handle_exception(exc_type, exc_value, exc_traceback):
@@ -71,23 +423,28 @@ def handle_exception(exc_type, exc_value, exc_traceback):
 def setup_logging() -> logging.Logger:
     """Configure and return the application logger.
 
-    Sets up two handlers:
-      - debug.log: For detailed error messages (level=ERROR).
-      - cliqq.log: For general program logs.
+    The logger only puts records on a queue, a background LogWriter writes
+    them to two handlers:
+      - debug.log: Everything, with level and source (level=DEBUG).
+      - cliqq.log: For general program logs (INFO only).
 
     Returns:
         logging.Logger: The configured logger instance.
     """
 
+    global _writer
+
     logger = logging.getLogger("cliqq")
+    logger.setLevel(logging.DEBUG)
     # don’t bubble up to root logger aka console
     logger.propagate = False
 
     # clear any existing handlers (was causing issues while testing)
     if logger.handlers:
         logger.handlers.clear()
+    stop_logging()
 
-    debug_handler = BufferingFileHandler("debug.log", 1)
+    debug_handler = BufferingFileHandler("debug.log", 50)
     debug_handler.setFormatter(
         logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
     )
@@ -98,9 +455,14 @@ def setup_logging() -> logging.Logger:
     io_handler.setLevel(logging.INFO)
     io_handler.addFilter(lambda record: record.levelno == logging.INFO)  # only INFO
 
-    # Attach handlers
-    logger.addHandler(debug_handler)
-    logger.addHandler(io_handler)
+    # turns are only for the structured journal, see cliqq.journal
+    for handler in (debug_handler, io_handler):
+        handler.addFilter(lambda record: not hasattr(record, "turn"))
+
+    # the caller only pays for putting the record on the queue
+    logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+    _writer = LogWriter(_log_queue, debug_handler, io_handler)
+    _writer.start()
 
     return logger
 
@@ -108,3 +470,5 @@ def setup_logging() -> logging.Logger:
 logger = setup_logging()
 
 sys.excepthook = handle_exception
+# runs before logging's own shutdown, which can't see queued records
+atexit.register(stop_logging)
@@ -0,0 +1,94 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Coroutine, TypeVar
+
+T = TypeVar("T")
+
+# one loop for the whole session, so the async connection pool (which is
+# bound to the loop it was first used on) survives between prompts
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_thread: threading.Thread | None = None
+_loop_lock = threading.Lock()
+
+# how often a waiting thread wakes up, so Ctrl-C is noticed on every platform
+POLL_INTERVAL = 0.1
+
+
+def event_loop() -> asyncio.AbstractEventLoop:
+    """The session's event loop, running forever on a daemon thread.
+    Started on first use."""
+
+    global _loop, _loop_thread
+
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(
+                target=_loop.run_forever, name="cliqq-loop", daemon=True
+            )
+            _loop_thread.start()
+    return _loop
+
+
+def in_loop_thread() -> bool:
+    """True if called from the session loop's own thread."""
+
+    return _loop_thread is not None and threading.current_thread() is _loop_thread
+
+
+def submit(coro: Coroutine[Any, Any, T]) -> concurrent.futures.Future[T]:
+    """Schedule `coro` on the session loop without waiting for it."""
+
+    return asyncio.run_coroutine_threadsafe(coro, event_loop())
+
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """Run `coro` on the session loop and wait for its result.
+
+    Ctrl-C while waiting cancels the task and keeps waiting, so the coroutine
+    can clean up and return what it has (it sees asyncio.CancelledError).
+    A second Ctrl-C stops waiting and raises KeyboardInterrupt.
+
+    Raises:
+        RuntimeError: If called from the loop thread, which would deadlock.
+    """
+
+    if in_loop_thread():
+        coro.close()
+        raise RuntimeError("run_sync() called from the event loop thread")
+
+    loop = event_loop()
+    future: concurrent.futures.Future[T] = concurrent.futures.Future()
+    task: asyncio.Task | None = None
+
+    def start() -> None:
+        nonlocal task
+        task = loop.create_task(coro)
+        task.add_done_callback(lambda done: _copy_result(done, future))
+
+    loop.call_soon_threadsafe(start)
+
+    try:
+        return _wait(future)
+    except KeyboardInterrupt:
+        # runs after start(), callbacks are called in order
+        loop.call_soon_threadsafe(lambda: task and task.cancel())
+        return _wait(future)
+
+
+def _wait(future: concurrent.futures.Future[T]) -> T:
+    while True:
+        try:
+            return future.result(timeout=POLL_INTERVAL)
+        except concurrent.futures.TimeoutError:
+            continue
+
+
+def _copy_result(task: asyncio.Task, future: concurrent.futures.Future) -> None:
+    if task.cancelled():
+        future.cancel()
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
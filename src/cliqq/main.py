@@ -1,10 +1,15 @@
 # pip install -e . --> from project root
 
+import atexit
+from functools import partial
 from pathlib import Path
 import shlex
 import sys
 
-from cliqq.log import logger
+from cliqq.log import configure_logging, logger
+from cliqq.journal import start_journal
+from cliqq.sessions import start_session
+from cliqq.stats import current_turn, finish_turn, stage, start_stats, start_turn
 from cliqq.io import program_choice, program_output, user_input
 from cliqq.models import ApiConfig, ChatHistory, CommandRegistry, PathManager
 from cliqq.prep import (
@@ -12,10 +17,15 @@ from cliqq.prep import (
     prep_prompt,
     parse_commands,
     parse_input,
-    load_template,
+    load_prompt_templates,
 )
 from cliqq.commands import dispatch, exit_cliqq, register_commands
-from cliqq.ai import ai_response
+from cliqq.ai import (
+    ai_response,
+    check_endpoints,
+    prewarm_connection,
+    summarize_messages,
+)
 from cliqq.action import run
 
 
@@ -41,20 +51,31 @@ def main() -> None:
     """
 
     # set up session
-    api_config = ApiConfig()
-    history = ChatHistory()
+    paths = PathManager()
+    configure_logging(paths.config)
+    start_journal(paths.config, paths.journal_path)
+    start_stats(paths.config, paths.stats_path)
+    api_config = ApiConfig.from_config(
+        paths.config, paths.credentials_path, paths.response_cache_path
+    )
+    # runs before logging's shutdown, which was registered first
+    atexit.register(api_config.close)
+    # older turns are summarised in the background to stay within budget
+    history = ChatHistory.from_config(
+        paths.config, summarizer=partial(summarize_messages, api_config)
+    )
+    # saved as it goes, so /resume can pick it up in a later session
+    history.store = start_session(paths.config, paths.sessions_path)
     registry = CommandRegistry()
     register_commands(registry)
-    paths = PathManager()
 
     user_prompt = None
     input = ""
     template = ""
 
     # FIXME probably should save the templates...make sure to change all when i do
-    template = load_template(paths.script_path / "templates" / "starter_template.txt")
-    history.remember({"role": "system", "content": template})
-    template = load_template(paths.script_path / "templates" / "reminder_template.txt")
+    system_template, template = load_prompt_templates(paths)
+    history.remember({"role": "system", "content": system_template})
 
     # build the parser once and reuse it in the interactive loop
     parser = parse_commands(registry)
@@ -63,10 +84,11 @@ def main() -> None:
 
     # parse arguments when program is run from the command line
 
-    parsed_input = parse_input(sys.argv, parser)
+    # argv[0] is the path of the executable, not a command
+    parsed_input = parse_input(sys.argv[1:], parser)
 
     if parsed_input.command:
-        if parsed_input.command == "/q":
+        if parsed_input.command in ("/q", "/batch"):
             dispatch(parsed_input, api_config, history, registry, paths)
         elif parsed_input.command == "/invalid":
             program_output(
@@ -92,10 +114,19 @@ def main() -> None:
 
         init_arg = None
 
+    # open a connection to the API while the user is still typing,
+    # and again on the first keystroke if the prompt sat idle long enough
+    # for pooled connections to expire (and check on idle endpoints)
+    def prewarm() -> None:
+        prewarm_connection(paths.env_path, api_config)
+        check_endpoints(api_config)
+
+    prewarm()
+
     if init_arg:
         input = init_arg
     else:
-        input = user_input().strip()
+        input = user_input(on_typing=prewarm).strip()
 
     # interactive mode below
 
@@ -121,11 +152,17 @@ def main() -> None:
             input = " ".join(parsed_input.prompt)
 
         if input:
-            user_prompt = prep_prompt(input, template)
-            
+            # the action it leads to is timed as part of the same turn
+            start_turn()
+            if history.store is not None:
+                history.store.set_title(input)
+            with stage("prep_prompt"):
+                user_prompt = prep_prompt(input, template)
+
             action_str, response = ai_response(
                 user_prompt, paths.env_path, api_config, history
             )
+            current_turn().end()
             print("\n")
 
             if response:
@@ -172,9 +209,7 @@ def main() -> None:
                             "And your request has been completed! Do you have another question?"
                         )
                     else:
-                        program_output(
-                            "Got it. Do you have another request for me?"
-                        )
+                        program_output("Got it. Do you have another request for me?")
                 else:
                     # maybe have a bank of different wording for this?
                     program_output(
@@ -185,7 +220,9 @@ def main() -> None:
                     "I'm sorry I couldn't get an answer for you. Would you like to ask me another question?"
                 )
 
-        input = user_input().strip()
+        finish_turn()
+        prewarm()
+        input = user_input(on_typing=prewarm).strip()
 
     exit_cliqq()
 
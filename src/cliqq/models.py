@@ -1,8 +1,15 @@
 import argparse
 import json
+import os
+import re
+import threading
+import time
+from collections import deque
 from pathlib import Path
 from typing import Callable, Optional, Any
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+
+from cliqq.scheduler import RequestScheduler
 
 # should maybe use dependency injection (FastAPI) or contextvars (Flask)...
 
@@ -16,22 +23,425 @@ class Command:
         description (str): Help text for the command.
         function (Callable): Function that implements the command.
         args (str, optional): Description of command arguments, if any.
+        add_options (Callable, optional): Adds the command's own options to
+            its subparser. Parsed values are passed to `function` by name.
     """
 
     name: str
     description: str
     function: Callable[..., Any]
     args: Optional[str] = None
+    add_options: Optional[Callable[[argparse.ArgumentParser], None]] = None
+
+
+@dataclass(frozen=True)
+class PromptContext:
+    """Snapshot of the user's environment that is inserted into prompts.
+
+    Attributes:
+        op_sys (str): Platform name (e.g., "linux").
+        shell (str): Name of the shell Cliqq was started from.
+        home (str): User's home directory.
+        cwd (str): Working directory the snapshot was taken in.
+        safe_cwd (str): `cwd` with the home directory replaced by "~".
+    """
+
+    op_sys: str
+    shell: str
+    home: str
+    cwd: str
+    safe_cwd: str
+
+
+@dataclass(frozen=True)
+class CommandResult:
+    """Outcome of running a shell command.
+
+    Attributes:
+        code (int): Exit code, negative if killed by a signal.
+        stdout (str): Kept stdout, the head and tail if it was too long.
+        stderr (str): Kept stderr, likewise.
+        wall_time (float): Seconds from start until the process exited.
+        stdout_bytes (int): Bytes written to stdout in total.
+        stderr_bytes (int): Bytes written to stderr in total.
+        timed_out (bool): Killed because it ran past the timeout.
+        interrupted (bool): Killed because the user pressed Ctrl-C.
+    """
+
+    code: int
+    stdout: str
+    stderr: str
+    wall_time: float = 0.0
+    stdout_bytes: int = 0
+    stderr_bytes: int = 0
+    timed_out: bool = False
+    interrupted: bool = False
+
+
+class OutputBuffer:
+    """Keeps the first `head_bytes` and last `tail_bytes` of a stream, so
+    memory stays bounded however much a command prints.
+
+    Args:
+        head_bytes (int, optional): Bytes kept from the start.
+        tail_bytes (int, optional): Bytes kept from the end.
+    """
+
+    def __init__(self, head_bytes: int = 64 * 1024, tail_bytes: int = 64 * 1024):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self._head = bytearray()
+        self._tail = bytearray()
+        self.total = 0
+
+    def write(self, data: bytes) -> None:
+        self.total += len(data)
+        room = self.head_bytes - len(self._head)
+        if room > 0:
+            self._head += data[:room]
+            data = data[room:]
+        if data:
+            self._tail += data
+            # trim in bulk rather than on every write
+            if len(self._tail) > 2 * self.tail_bytes:
+                del self._tail[: -self.tail_bytes]
+
+    @property
+    def omitted(self) -> int:
+        """Bytes dropped from the middle."""
+
+        return self.total - len(self._head) - min(len(self._tail), self.tail_bytes)
+
+    def text(self, encoding: str = "utf-8") -> str:
+        """The kept output, with a marker where the middle was dropped."""
+
+        head = self._head.decode(encoding, errors="replace")
+        tail = bytes(self._tail[-self.tail_bytes :] if self.tail_bytes else b"")
+        if self.omitted:
+            return (
+                f"{head}\n[... {self.omitted} bytes omitted ...]\n"
+                f"{tail.decode(encoding, errors='replace')}"
+            )
+        return head + tail.decode(encoding, errors="replace")
+
+
+class PromptTemplate:
+    """Template parsed once into literal text and <PLACEHOLDER> slots, so
+    rendering is a single join instead of a str.replace pass per slot.
+
+    Args:
+        text (str): Template text with <OS>, <SHELL>, <CWD> and <QUESTION> slots.
+    """
+
+    PLACEHOLDER = re.compile(r"<(OS|SHELL|CWD|QUESTION)>")
+
+    def __init__(self, text: str):
+        # split with a group alternates literal text and slot names
+        self._parts = self.PLACEHOLDER.split(text)
+
+    def render(self, values: dict[str, str]) -> str:
+        parts = self._parts[:]
+        for i in range(1, len(parts), 2):
+            parts[i] = values[parts[i]]
+        return "".join(parts)
+
+
+class EndpointHealth:
+    """Recent outcomes of requests to one endpoint.
+
+    Keeps the last `window` samples. Failures put the endpoint in a cooldown
+    that doubles with each failure in a row (up to `max_cooldown`), and any
+    success ends it.
+
+    Args:
+        window (int, optional): Number of samples kept.
+        cooldown (float, optional): Seconds an endpoint is avoided after
+            its first failure in a row.
+        max_cooldown (float, optional): Longest cooldown, in seconds.
+    """
+
+    def __init__(
+        self, window: int = 20, cooldown: float = 30.0, max_cooldown: float = 300.0
+    ):
+        # (ok, seconds to first token or None for a health check)
+        self._samples: deque[tuple[bool, float | None]] = deque(maxlen=window)
+        self._failures_in_a_row = 0
+        self._lock = threading.Lock()
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        # monotonic times, 0 = never
+        self.down_until = 0.0
+        self.last_checked = 0.0
+
+    def record(self, ok: bool, latency: float | None = None) -> None:
+        """Add the outcome of a request (with its latency) or of a health
+        check (without)."""
+
+        with self._lock:
+            now = time.monotonic()
+            self._samples.append((ok, latency))
+            self.last_checked = now
+            if ok:
+                self._failures_in_a_row = 0
+                self.down_until = 0.0
+            else:
+                self._failures_in_a_row += 1
+                backoff = self.cooldown * 2 ** (self._failures_in_a_row - 1)
+                self.down_until = now + min(backoff, self.max_cooldown)
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    @property
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self._samples:
+                return 0.0
+            return sum(not ok for ok, _ in self._samples) / len(self._samples)
+
+    def latency(self, percentile: float) -> float | None:
+        """Latency of successful requests at `percentile` (0-100), or None
+        without any."""
+
+        with self._lock:
+            latencies = sorted(
+                latency for ok, latency in self._samples if ok and latency is not None
+            )
+        if not latencies:
+            return None
+        index = min(int(len(latencies) * percentile / 100), len(latencies) - 1)
+        return latencies[index]
+
+    @property
+    def p50(self) -> float | None:
+        return self.latency(50)
+
+    @property
+    def p95(self) -> float | None:
+        return self.latency(95)
+
+
+@dataclass
+class Endpoint:
+    """One provider Cliqq can send requests to.
+
+    Attributes:
+        name (str): Shown in logs, e.g. "openai".
+        config (dict[str, str]): model_name, base_url and api_key.
+        health (EndpointHealth): Recent outcomes.
+    """
+
+    name: str
+    config: dict[str, str]
+    health: EndpointHealth = field(default_factory=EndpointHealth)
+
+
+class EndpointRouter:
+    """Orders endpoints from healthiest to least healthy.
+
+    Healthy endpoints (not cooling down, error rate at most `max_error_rate`)
+    come first, in the order they were configured, so the primary is used
+    whenever it works. One whose p95 latency is over `slow_factor` times the
+    fastest healthy endpoint's moves behind the others. Unhealthy endpoints
+    come last, the one that recovers soonest first.
+
+    Args:
+        endpoints (list[Endpoint]): In order of preference.
+        max_error_rate (float, optional): Error rate above which an
+            endpoint counts as unhealthy.
+        slow_factor (float, optional): See above.
+        health_interval (float, optional): Seconds after which an endpoint
+            that hasn't been used is checked again.
+    """
+
+    def __init__(
+        self,
+        endpoints: list[Endpoint],
+        max_error_rate: float = 0.5,
+        slow_factor: float = 3.0,
+        health_interval: float = 300.0,
+    ):
+        self.endpoints = endpoints
+        self.max_error_rate = max_error_rate
+        self.slow_factor = slow_factor
+        self.health_interval = health_interval
+        # health check in flight (a concurrent.futures.Future), if any
+        self.checking = None
+
+    @classmethod
+    def from_config(cls, config: dict[str, Any]) -> "EndpointRouter | None":
+        """Build a router from the "endpoints" list and "routing" section of
+        config.json, or None without endpoints. An endpoint's key is either
+        "api_key" or the environment variable named by "api_key_env", and
+        endpoints without one are left out."""
+
+        entries = config.get("endpoints", [])
+        if not entries:
+            return None
+        options = config.get("routing", {})
+        endpoints = [
+            Endpoint(
+                name=entry.get("name", entry["base_url"]),
+                config={
+                    "model_name": entry["model_name"],
+                    "base_url": entry["base_url"],
+                    "api_key": entry.get("api_key")
+                    or os.environ.get(entry.get("api_key_env", ""), ""),
+                },
+                health=EndpointHealth(cooldown=options.get("cooldown", 30.0)),
+            )
+            for entry in entries
+        ]
+        # e.g. the environment variable isn't set in this shell
+        endpoints = [e for e in endpoints if e.config["api_key"]]
+        if not endpoints:
+            return None
+        known = ("max_error_rate", "slow_factor", "health_interval")
+        return cls(endpoints, **{key: options[key] for key in known if key in options})
+
+    def ordered(self) -> list[Endpoint]:
+        """Endpoints to try, healthiest first."""
+
+        healthy = [
+            e
+            for e in self.endpoints
+            if e.health.available and e.health.error_rate <= self.max_error_rate
+        ]
+        latencies = [e.health.p95 for e in healthy if e.health.p95 is not None]
+        limit = min(latencies) * self.slow_factor if latencies else None
+
+        def slow(endpoint: Endpoint) -> bool:
+            p95 = endpoint.health.p95
+            return limit is not None and p95 is not None and p95 > limit
+
+        # sorted() is stable, so configured order is kept otherwise
+        healthy.sort(key=slow)
+        unhealthy = sorted(
+            (e for e in self.endpoints if e not in healthy),
+            key=lambda e: e.health.down_until,
+        )
+        return healthy + unhealthy
+
+    def due_for_check(self) -> list[Endpoint]:
+        """Endpoints not used or checked in the last `health_interval`."""
+
+        now = time.monotonic()
+        return [
+            e
+            for e in self.endpoints
+            if now - e.health.last_checked >= self.health_interval
+        ]
 
 
 class ApiConfig:
-    """Holds and manages API credentials and OpenAI client configuration."""
+    """Holds and manages API credentials, OpenAI client configuration and the
+    pooled HTTP transport every API call goes through.
 
-    def __init__(self):
+    The connection pool does not depend on the credentials, so changing them
+    only rebuilds the (cheap) OpenAI client while warm connections are kept.
+    API calls made by Cliqq itself go through the async pool, which belongs to
+    the session's event loop (see cliqq.loop); the sync pool is kept for
+    callers that want a plain OpenAI client.
+
+    Args:
+        pool_size (int, optional): Maximum number of pooled connections.
+        keepalive_expiry (float, optional): Seconds an idle connection is kept open.
+        http2 (bool, optional): Use HTTP/2 if the ``h2`` package is installed.
+        timeout (float, optional): Read/write/pool timeout in seconds.
+        connect_timeout (float, optional): Connection timeout in seconds.
+        prewarm (bool, optional): Open a connection in the background while
+            the user is typing.
+        credential_cache (Path, optional): File recording recently validated
+            credentials. None disables the cache.
+        credential_ttl (float, optional): Seconds a validation is trusted for.
+        response_cache (ResponseCache, optional): Cache of complete responses.
+            None disables it.
+        router (EndpointRouter, optional): Endpoints to fail over between.
+            None uses the single set of credentials.
+        scheduler (RequestScheduler, optional): Paces and retries requests.
+        stream_usage (bool, optional): Ask for token usage at the end of
+            each stream, for /stats. Turn off for servers that reject it.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 10,
+        keepalive_expiry: float = 60.0,
+        http2: bool = False,
+        timeout: float = 30.0,
+        connect_timeout: float = 10.0,
+        prewarm: bool = True,
+        credential_cache: Path | None = None,
+        credential_ttl: float = 24 * 60 * 60,
+        response_cache=None,
+        router: EndpointRouter | None = None,
+        scheduler: RequestScheduler | None = None,
+        stream_usage: bool = True,
+    ):
         self._model_name: str = ""
         self._base_url: str = ""
         self._api_key: str = ""
         self._client = None
+        self._http_client = None
+        self._async_client = None
+        self._async_http_client = None
+        # the pool may be first used from the warm-up thread
+        self._http_lock = threading.Lock()
+        # monotonic time of the last request, 0 = never
+        self._last_active: float = 0.0
+        # connection warm-up in flight (a concurrent.futures.Future), if any
+        self.warming = None
+
+        self.pool_size = pool_size
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.prewarm = prewarm
+        self.credential_cache = credential_cache
+        self.credential_ttl = credential_ttl
+        self.response_cache = response_cache
+        self.router = router
+        self.scheduler = scheduler or RequestScheduler()
+        self.stream_usage = stream_usage
+        # the router's endpoint currently in use, if any
+        self.endpoint: Endpoint | None = None
+        if router is not None:
+            self.use_endpoint(router.ordered()[0])
+
+    @classmethod
+    def from_config(
+        cls,
+        config: dict[str, Any],
+        credential_cache: Path | None = None,
+        response_cache: Path | None = None,
+    ) -> "ApiConfig":
+        """Build an ApiConfig from the "http" section of config.json,
+        ignoring any unknown keys. The response cache at `response_cache` is
+        only used if the "response_cache" section enables it, and endpoints
+        are only routed between if "endpoints" lists them."""
+
+        options = config.get("http", {})
+        known = (
+            "pool_size",
+            "keepalive_expiry",
+            "http2",
+            "timeout",
+            "connect_timeout",
+            "prewarm",
+            "stream_usage",
+        )
+        kwargs = {key: options[key] for key in known if key in options}
+        if "credential_ttl" in config:
+            kwargs["credential_ttl"] = config["credential_ttl"]
+        if response_cache:
+            from cliqq.cache import ResponseCache
+
+            kwargs["response_cache"] = ResponseCache.from_config(config, response_cache)
+        kwargs["router"] = EndpointRouter.from_config(config)
+        kwargs["scheduler"] = RequestScheduler.from_config(config)
+        return cls(credential_cache=credential_cache, **kwargs)
 
     # func marked @property is the getter
     # properties good for validation + changing attrib access w/o changing public API
@@ -43,8 +453,9 @@ class ApiConfig:
     @model_name.setter
     def model_name(self, name: str):
         self._model_name = name
-        # credentials changed, invalidate cached client
+        # credentials changed, invalidate cached clients
         self._client = None
+        self._async_client = None
 
     @property
     def base_url(self) -> str:
@@ -54,6 +465,7 @@ class ApiConfig:
     def base_url(self, url: str):
         self._base_url = url
         self._client = None
+        self._async_client = None
 
     @property
     def api_key(self) -> str:
@@ -63,6 +475,42 @@ class ApiConfig:
     def api_key(self, key: str):
         self._api_key = key
         self._client = None
+        self._async_client = None
+
+    @property
+    def http_client(self):
+        """Shared keep-alive connection pool, created on first use."""
+
+        with self._http_lock:
+            if self._http_client is None:
+                self._http_client = self._build_http_client()
+        return self._http_client
+
+    @property
+    def async_http_client(self):
+        """Shared keep-alive connection pool for async calls, created on first
+        use. Must only be used from the event loop it was first used on."""
+
+        with self._http_lock:
+            if self._async_http_client is None:
+                self._async_http_client = self._build_http_client(use_async=True)
+        return self._async_http_client
+
+    def _build_http_client(self, use_async: bool = False):
+        import httpx
+
+        client_class = httpx.AsyncClient if use_async else httpx.Client
+        limits = httpx.Limits(
+            max_connections=self.pool_size,
+            max_keepalive_connections=self.pool_size,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+        timeout = httpx.Timeout(self.timeout, connect=self.connect_timeout)
+        try:
+            return client_class(limits=limits, timeout=timeout, http2=self.http2)
+        except ImportError:
+            # http2=True needs the optional h2 package
+            return client_class(limits=limits, timeout=timeout)
 
     @property
     def client(self):
@@ -70,13 +518,45 @@ class ApiConfig:
             # import here to avoid importing during tests that don't need it
             import openai
 
-            self._client = openai.OpenAI(api_key=self._api_key, base_url=self._base_url)
+            self._client = openai.OpenAI(
+                api_key=self._api_key,
+                base_url=self._base_url,
+                http_client=self.http_client,
+                # the scheduler is the only retry layer, see RequestScheduler
+                max_retries=0,
+            )
         return self._client
 
     @client.setter
     def client(self, client):
         self._client = client
 
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            import openai
+
+            self._async_client = openai.AsyncOpenAI(
+                api_key=self._api_key,
+                base_url=self._base_url,
+                http_client=self.async_http_client,
+                # the scheduler is the only retry layer, see RequestScheduler
+                max_retries=0,
+            )
+        return self._async_client
+
+    @async_client.setter
+    def async_client(self, client):
+        self._async_client = client
+
+    @property
+    def config(self) -> dict[str, str]:
+        return {
+            "model_name": self._model_name,
+            "base_url": self._base_url,
+            "api_key": self._api_key,
+        }
+
     # for updating everything at once for ease
     def set_config(self, config: dict[str, str]):
         self._model_name = config["model_name"]
@@ -84,24 +564,417 @@ class ApiConfig:
         self._api_key = config["api_key"]
         # clear any cached client so it will be recreated with new credentials
         self._client = None
+        self._async_client = None
+
+    def use_endpoint(self, endpoint: Endpoint):
+        """Send requests to `endpoint` from now on. The pool is shared, so
+        switching back and forth keeps warm connections."""
+
+        if self.config != endpoint.config:
+            self.set_config(endpoint.config)
+        self.endpoint = endpoint
+
+    def mark_active(self):
+        """Record that a connection in the pool was just used."""
+
+        self._last_active = time.monotonic()
+
+    @property
+    def is_idle(self) -> bool:
+        """True if the pool's kept-alive connections have likely expired."""
+
+        return time.monotonic() - self._last_active > self.keepalive_expiry
+
+    def close(self):
+        """Close the connection pools, dropping any kept-alive connections.
+        Called on exit. The async pool is closed on the session loop that
+        owns it."""
+
+        if self._http_client is not None:
+            self._http_client.close()
+        self._http_client = None
+        self._client = None
+
+        if self._async_http_client is not None:
+            from cliqq.loop import in_loop_thread, submit
+
+            if in_loop_thread():
+                # would wait on itself, aclose has to be awaited there instead
+                return
+            try:
+                submit(self.aclose()).result(timeout=5)
+            except Exception:
+                # exiting either way, the connections die with the process
+                pass
+
+    async def aclose(self):
+        """Close the async connection pool, on the loop that owns it."""
+
+        if self._async_http_client is not None:
+            await self._async_http_client.aclose()
+        self._async_http_client = None
+        self._async_client = None
+
+
+def estimate_tokens(msg: dict[str, str]) -> int:
+    """Cheap token estimate for a message: ~4 characters per token plus a
+    few tokens of per-message overhead."""
+
+    return len(msg.get("content", "")) // 4 + 4
 
 
 class ChatHistory:
-    """Stores and manages conversation history for the session."""
+    """Stores and manages conversation history for the session.
 
-    def __init__(self):
+    If `max_tokens` is set, the oldest turns are evicted once the estimated
+    size of the history goes over budget. The first system message (the
+    template) and the newest turn are always kept. Evicted turns are handed to `summarizer` on a
+    background thread and replaced by a single summary message when it
+    finishes, so summarising never delays a request.
+
+    Questions, answers and summaries are also appended to `store`, if set,
+    so the conversation can be resumed by a later session (see
+    cliqq.sessions).
+
+    Args:
+        max_tokens (int, optional): Token budget for the whole history.
+            None means unbounded.
+        summarizer (Callable, optional): Turns a list of messages into a
+            short summary. Without one, evicted turns are simply dropped.
+        store (SessionLog, optional): Where the conversation is saved.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int | None = None,
+        summarizer: Callable[[list[dict[str, str]]], str] | None = None,
+        store: Any = None,
+    ):
         self._chat_history: list[dict[str, str]] = []
+        self._token_counts: list[int] = []
+        self._total_tokens = 0
+
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer
+        self.store = store
+
+        self._summary: dict[str, str] | None = None
+        # evicted messages waiting to be folded into the summary
+        self._evicted: list[dict[str, str]] = []
+        self._summarizing = False
+        # bumped by forget() so a late summary of old turns is discarded
+        self._generation = 0
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_config(
+        cls,
+        config: dict[str, Any],
+        summarizer: Callable[[list[dict[str, str]]], str] | None = None,
+    ) -> "ChatHistory":
+        """Build a ChatHistory from the "history" section of config.json."""
+
+        options = config.get("history", {})
+        if not options.get("summarize", True):
+            summarizer = None
+        return cls(max_tokens=options.get("max_tokens", 12000), summarizer=summarizer)
 
     @property
     # sole for AI's benefit, log is for user
     def chat_history(self) -> list[dict[str, str]]:
         return self._chat_history
 
+    def messages(self) -> list[dict[str, str]]:
+        """Snapshot of the history, safe to send while a background summary
+        rewrites it."""
+
+        with self._lock:
+            return list(self._chat_history)
+
+    @property
+    def total_tokens(self) -> int:
+        return self._total_tokens
+
     def remember(self, msg: dict[str, str]):
+        with self._lock:
+            self._add(msg)
+            # the system template isn't saved, every session starts with it
+            if self.store is not None and msg.get("role") in ("user", "assistant"):
+                self.store.append(msg)
+            self._enforce_budget()
+
+    def restore(self, messages: list[dict[str, str]]):
+        """Remember the messages of a saved session without saving them
+        again. A message with the role "summary" becomes the summary."""
+
+        with self._lock:
+            for msg in messages:
+                if msg["role"] == "summary":
+                    self._set_summary(msg["content"])
+                else:
+                    self._add(msg)
+            self._enforce_budget()
+
+    def _add(self, msg: dict[str, str]):
         self._chat_history.append(msg)
+        self._token_counts.append(estimate_tokens(msg))
+        self._total_tokens += self._token_counts[-1]
 
     def forget(self):
-        self._chat_history.clear()
+        with self._lock:
+            self._chat_history.clear()
+            self._token_counts.clear()
+            self._total_tokens = 0
+            self._summary = None
+            self._evicted.clear()
+            self._summarizing = False
+            self._generation += 1
+
+    def _first_evictable(self) -> int:
+        """Index of the oldest message that may be evicted."""
+
+        start = 0
+        if self._chat_history and self._chat_history[0].get("role") == "system":
+            start = 1
+        if self._summary is not None:
+            start += 1
+        return start
+
+    def _pop(self, index: int) -> dict[str, str]:
+        self._total_tokens -= self._token_counts.pop(index)
+        return self._chat_history.pop(index)
+
+    def _enforce_budget(self):
+        if self.max_tokens is None or self._total_tokens <= self.max_tokens:
+            return
+
+        start = self._first_evictable()
+        # never evict the newest turn: the question being sent, or an answer
+        # together with its question
+        keep = 1
+        if (
+            len(self._chat_history) - start >= 2
+            and self._chat_history[-1].get("role") == "assistant"
+            and self._chat_history[-2].get("role") == "user"
+        ):
+            keep = 2
+
+        evicted = []
+        while (
+            self._total_tokens > self.max_tokens
+            and len(self._chat_history) - start > keep
+        ):
+            evicted.append(self._pop(start))
+            # drop whole turns so history never starts with an orphaned answer
+            while (
+                len(self._chat_history) - start > keep
+                and self._chat_history[start].get("role") != "user"
+            ):
+                evicted.append(self._pop(start))
+
+        if evicted and self.summarizer:
+            self._evicted.extend(evicted)
+            self._start_summary()
+
+    def _start_summary(self):
+        if self._summarizing:
+            # the running summary picks up newly evicted turns when it ends
+            return
+        self._summarizing = True
+        thread = threading.Thread(
+            target=self._summarize, args=(self._generation,), daemon=True
+        )
+        thread.start()
+
+    def _summarize(self, generation: int):
+        while True:
+            with self._lock:
+                if generation != self._generation:
+                    # forget() was called, a newer thread owns the summary now
+                    return
+                if not self._evicted:
+                    self._summarizing = False
+                    return
+                evicted = list(self._evicted)
+                # fold the previous summary into the new one
+                messages = [self._summary, *evicted] if self._summary else evicted
+
+            try:
+                summary = self.summarizer(messages)  # type: ignore[misc]
+            except Exception:
+                # a failed summary only means those turns are forgotten
+                summary = ""
+
+            with self._lock:
+                if generation != self._generation:
+                    return
+                del self._evicted[: len(evicted)]
+                if summary:
+                    if self.store is not None:
+                        # what's still in the history, or evicted since,
+                        # isn't in this summary
+                        kept = len(self._evicted) + sum(
+                            msg.get("role") in ("user", "assistant")
+                            for msg in self._chat_history
+                        )
+                        self.store.append(
+                            {"role": "summary", "content": summary}, kept=kept
+                        )
+                    self._set_summary(summary)
+
+    def _set_summary(self, summary: str):
+        msg = {
+            "role": "system",
+            "content": f"Summary of the earlier conversation: {summary}",
+        }
+        index = self._first_evictable()
+        if self._summary is not None:
+            self._pop(index - 1)
+            index -= 1
+        self._chat_history.insert(index, msg)
+        self._token_counts.insert(index, estimate_tokens(msg))
+        self._total_tokens += self._token_counts[index]
+        self._summary = msg
+        # the summary counts towards the budget too
+        self._enforce_budget()
+
+
+class ActionParser:
+    """Single-pass parser that splits a streamed answer into prose and the
+    action payload as deltas arrive.
+
+    The action is delimited by \\x1e and \\x1f, raw or escaped as the
+    four characters "\\\\x1e"/"\\\\x1f". A delimiter split across deltas is
+    held back until it can be recognised, so it is never displayed.
+
+    Args:
+        on_action (Callable, optional): Called with the action payload the
+            moment its closing delimiter arrives.
+    """
+
+    START = ("\x1e", "\\x1e")
+    END = ("\x1f", "\\x1f")
+    # longest delimiter minus one, the most that can be held back
+    _HOLD = 3
+    _STRIP = str.maketrans("", "", "\x1e\x1f")
+
+    def __init__(self, on_action: Callable[[str], None] | None = None):
+        self.on_action = on_action
+        self._state = "prose"  # -> "action" -> "done"
+        self._pending = ""
+        self._raw: list[str] = []
+        self._clean: list[str] = []
+        self._action: list[str] = []
+
+    @property
+    def action_started(self) -> bool:
+        return self._state != "prose"
+
+    @property
+    def action_complete(self) -> bool:
+        return self._state == "done"
+
+    @property
+    def action(self) -> str | None:
+        """The stripped action payload, or None if no complete action was seen."""
+
+        if not self.action_complete:
+            return None
+        return "".join(self._action).strip()
+
+    @property
+    def raw_text(self) -> str:
+        return "".join(self._raw)
+
+    @property
+    def clean_text(self) -> str:
+        """The whole answer with the delimiters removed."""
+
+        return "".join(self._clean)
+
+    def feed(self, delta: str) -> str:
+        """Consume the next delta and return the prose that can be displayed."""
+
+        self._raw.append(delta)
+        text = self._pending + delta
+        self._pending = ""
+        prose = ""
+
+        if self._state == "done":
+            return self._feed_done(text)
+
+        if self._state == "prose":
+            index, length = self._find(text, self.START)
+            if index == -1:
+                text, self._pending = self._hold_back(text, self.START)
+                self._clean.append(text)
+                return text
+            prose = text[:index]
+            self._clean.append(prose)
+            self._state = "action"
+            text = text[index + length :]
+
+        if self._state == "action":
+            index, length = self._find(text, self.END)
+            if index == -1:
+                text, self._pending = self._hold_back(text, self.END)
+                self._action.append(text)
+                self._clean.append(text)
+                return prose
+            self._action.append(text[:index])
+            self._clean.append(text[:index])
+            self._state = "done"
+            text = text[index + length :]
+            if self.on_action:
+                self.on_action(self.action)  # type: ignore[arg-type]
+
+        self._feed_done(text)
+        return prose
+
+    def _feed_done(self, text: str) -> str:
+        # anything after the action is kept but never displayed
+        text, self._pending = self._hold_back(text, self.END)
+        self._clean.append(self._strip(text))
+        return ""
+
+    def close(self) -> str:
+        """Flush text held back at the end of the stream."""
+
+        text, self._pending = self._pending, ""
+        if self._state == "prose":
+            self._clean.append(text)
+            return text
+        if self._state == "action":
+            self._action.append(text)
+        if self._state == "done":
+            text = self._strip(text)
+        self._clean.append(text)
+        return ""
+
+    def _strip(self, text: str) -> str:
+        """Remove stray delimiters, raw or escaped."""
+
+        for escaped in (self.START[1], self.END[1]):
+            text = text.replace(escaped, "")
+        return text.translate(self._STRIP)
+
+    @staticmethod
+    def _find(text: str, delimiters: tuple[str, str]) -> tuple[int, int]:
+        """Earliest occurrence of either delimiter, as (index, length)."""
+
+        found = [(text.find(d), len(d)) for d in delimiters]
+        found = [f for f in found if f[0] != -1]
+        return min(found) if found else (-1, 0)
+
+    def _hold_back(self, text: str, delimiters: tuple[str, str]) -> tuple[str, str]:
+        """Split off a trailing partial delimiter (e.g. "\\\\x1") so it can be
+        completed by the next delta."""
+
+        escaped = delimiters[1]
+        for size in range(min(self._HOLD, len(text)), 0, -1):
+            if escaped.startswith(text[-size:]):
+                return text[:-size], text[-size:]
+        return text, ""
 
 
 class CommandRegistry:
@@ -137,6 +1010,7 @@ class PathManager:
         else:
             config = {}
 
+        self._config: dict[str, Any] = config
         self._script_path = Path(__file__).parent
 
         home = Path(config.get("home", "~/.cliqq")).expanduser()
@@ -147,6 +1021,10 @@ class PathManager:
         self._env_path = config.get("env", home / ".env").expanduser()
 
     # func marked @property is the getter
+    @property
+    def config(self) -> dict[str, Any]:
+        return self._config
+
     @property
     def script_path(self) -> Path:
         return self._script_path
@@ -167,6 +1045,26 @@ class PathManager:
     def env_path(self) -> Path:
         return self._env_path
 
+    @property
+    def credentials_path(self) -> Path:
+        return self._home_path / "credentials.json"
+
+    @property
+    def response_cache_path(self) -> Path:
+        return self._home_path / "responses.sqlite3"
+
+    @property
+    def journal_path(self) -> Path:
+        return self._home_path / "sessions.jsonl"
+
+    @property
+    def stats_path(self) -> Path:
+        return self._home_path / "stats.jsonl"
+
+    @property
+    def sessions_path(self) -> Path:
+        return self._home_path / "sessions"
+
     def create_paths(self):
         self._home_path.mkdir(parents=True, exist_ok=True)
 
@@ -1,11 +1,30 @@
 import os
 import sys
 import json
-import psutil
 import argparse
+from dataclasses import replace
+from functools import lru_cache
 from pathlib import Path
 from cliqq.log import logger
-from cliqq.models import CommandRegistry, QuietArgParser
+from cliqq.models import (
+    CommandRegistry,
+    PathManager,
+    PromptContext,
+    PromptTemplate,
+    QuietArgParser,
+    estimate_tokens,
+)
+
+# (system message, per-turn template) for each prompt mode
+# compact: instructions are sent once, each turn only adds a context line
+# full: each turn also restates who Cliqq is
+# System messages never contain the context, so every request starts with
+# the same bytes and providers can reuse their cached prefix. The context
+# (<OS>, <SHELL>, <CWD>) goes at the end of each turn, after the question
+PROMPT_TEMPLATES = {
+    "compact": ("system_template.txt", "turn_template.txt"),
+    "full": ("starter_template.txt", "reminder_template.txt"),
+}
 
 
 def parse_commands(registry: CommandRegistry) -> argparse.ArgumentParser:
@@ -36,6 +55,8 @@ def parse_commands(registry: CommandRegistry) -> argparse.ArgumentParser:
 
         if command.args:
             subparser.add_argument("args", nargs="+", help=command.args)
+        if command.add_options:
+            command.add_options(subparser)
 
     parser.add_argument(
         "prompt",
@@ -92,17 +113,59 @@ def parse_input(
 def prep_prompt(prompt: str, template: str) -> str:
     """Insert system context and user question into a template."""
 
-    op_sys = sys.platform
-    shell = psutil.Process(os.getppid()).name()
+    context = prompt_context()
+    return compile_template(template).render(
+        {
+            "OS": context.op_sys,
+            "SHELL": context.shell,
+            "CWD": context.safe_cwd,
+            "QUESTION": prompt,
+        }
+    )
+
+
+# computed on the first prompt of the session
+_context: PromptContext | None = None
+
+
+def prompt_context() -> PromptContext:
+    """Return the environment context for prompts. Inspecting the parent
+    process only happens once per session, afterwards only a change of
+    working directory refreshes the snapshot."""
+
+    global _context
+
     cwd = os.getcwd()
-    # this is potentially sensitive info
-    safe_cwd = cwd.replace(str(Path.home()), "~")
+    if _context is None:
+        # psutil is only needed here, don't pay for it at startup
+        import psutil
+
+        _context = PromptContext(
+            op_sys=sys.platform,
+            shell=psutil.Process(os.getppid()).name(),
+            home=str(Path.home()),
+            cwd="",
+            safe_cwd="",
+        )
+    if _context.cwd != cwd:
+        # this is potentially sensitive info
+        safe_cwd = cwd.replace(_context.home, "~")
+        _context = replace(_context, cwd=cwd, safe_cwd=safe_cwd)
+    return _context
+
+
+def reset_prompt_context() -> None:
+    """Forget the environment snapshot so the next prompt inspects it again."""
+
+    global _context
+    _context = None
+
 
-    prompt_template = template.replace("<OS>", op_sys)
-    prompt_template = prompt_template.replace("<SHELL>", shell)
-    prompt_template = prompt_template.replace("<CWD>", safe_cwd)
-    prompt_template = prompt_template.replace("<QUESTION>", prompt)
-    return prompt_template
+@lru_cache(maxsize=16)
+def compile_template(template: str) -> PromptTemplate:
+    """Parse a template once, later calls with the same text are a lookup."""
+
+    return PromptTemplate(template)
 
 
 def parse_action(action_str: str) -> dict[str, str] | None:
@@ -115,9 +178,46 @@ def parse_action(action_str: str) -> dict[str, str] | None:
         return None
 
 
+def load_prompt_templates(
+    paths: PathManager, mode: str | None = None
+) -> tuple[str, str]:
+    """Load the system message and per-turn template for a prompt mode.
+
+    Args:
+        paths (PathManager): Paths, including the "prompt_mode" config setting.
+        mode (str, optional): "compact" or "full". Defaults to the configured
+            mode, or "compact".
+
+    Returns:
+        tuple[str, str]: The system message and the per-turn template.
+    """
+
+    mode = mode or paths.config.get("prompt_mode", "compact")
+    system_name, turn_name = PROMPT_TEMPLATES.get(mode, PROMPT_TEMPLATES["compact"])
+    templates = paths.script_path / "templates"
+    return load_template(templates / system_name), load_template(templates / turn_name)
+
+
+def measure_requests(
+    system: str, template: str, turns: int, question: str, answer: str
+) -> list[tuple[int, int]]:
+    """Size of each request of a conversation that repeats the same question
+    and answer, as (bytes of JSON messages, estimated tokens) per turn."""
+
+    messages = [{"role": "system", "content": system}]
+    sizes = []
+    for _ in range(turns):
+        messages.append({"role": "user", "content": prep_prompt(question, template)})
+        payload = len(json.dumps(messages).encode("utf-8"))
+        sizes.append((payload, sum(estimate_tokens(msg) for msg in messages)))
+        messages.append({"role": "assistant", "content": answer})
+    return sizes
+
+
 # NOTE: for while i'm testing
+@lru_cache(maxsize=16)
 def load_template(file_path: Path) -> str:
-    """Load a text template from disk.
+    """Load a text template from disk, only reading each file once.
 
     Returns:
         str: Template contents, or a fallback default if file not found.
@@ -128,7 +228,7 @@ def load_template(file_path: Path) -> str:
             return f.read()
     except FileNotFoundError as e:
         logger.exception("FileNotFoundError: Error while loading template\n%s", e)
-        return "You are a command line assistant running in a {OS} {SHELL} in {CWD}. {QUESTION}"
+        return "You are a command line assistant running in a <OS> <SHELL> in <CWD>. <QUESTION>"
 
 
 # NOTE: for when this is a pip-installable package
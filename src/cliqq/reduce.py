@@ -0,0 +1,165 @@
+import re
+
+# CSI sequences (colours, cursor movement), OSC sequences (titles,
+# hyperlinks) and the remaining two-character escapes
+ANSI_ESCAPE = re.compile(
+    r"\x1b\[[0-?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)|\x1b[@-Z\\-_]"
+)
+
+# lines worth keeping even from the middle of a long output
+ERROR_LINE = re.compile(
+    r"error|fail|fatal|exception|traceback|panic|denied|refused|"
+    r"not found|no such|cannot|can't|unable|invalid|warning|segmentation",
+    re.IGNORECASE,
+)
+
+# parts of a line that differ between otherwise identical lines
+_VARIABLE = re.compile(r"0x[0-9a-f]+|[0-9a-f]{8,}|\d+", re.IGNORECASE)
+
+# how the budget is split when output has to be cut
+HEAD_SHARE = 0.25
+TAIL_SHARE = 0.35
+# a single line is never longer than this
+MAX_LINE_CHARS = 500
+
+
+def estimate_text_tokens(text: str) -> int:
+    """Same ~4 characters per token estimate as the chat history uses."""
+
+    return len(text) // 4
+
+
+def strip_ansi(text: str) -> str:
+    """Remove terminal escape sequences, and keep only what a progress bar
+    finally showed on each line (the text after its last carriage return)."""
+
+    text = ANSI_ESCAPE.sub("", text)
+    return "\n".join(line.rsplit("\r", 1)[-1] for line in text.split("\n"))
+
+
+def line_shape(line: str) -> str:
+    """A line with its numbers and hashes blanked, so "took 12ms" and
+    "took 15ms" look the same."""
+
+    return _VARIABLE.sub("#", line.strip())
+
+
+def collapse_repeats(lines: list[str]) -> list[str]:
+    """Replace runs of identical or near-identical lines with the first
+    line and a count."""
+
+    collapsed: list[str] = []
+    run_shape = None
+    repeats = 0
+
+    for line in lines:
+        shape = line_shape(line)
+        if shape == run_shape and shape:
+            repeats += 1
+            continue
+        if repeats:
+            collapsed.append(f"[... similar line repeated {repeats} more times]")
+        collapsed.append(line)
+        run_shape = shape
+        repeats = 0
+
+    if repeats:
+        collapsed.append(f"[... similar line repeated {repeats} more times]")
+    return collapsed
+
+
+def select_lines(lines: list[str], max_tokens: int) -> list[str]:
+    """Keep the head, the tail and error lines (with the line before each,
+    for context) that fit in `max_tokens`, marking what was left out."""
+
+    costs = [estimate_text_tokens(line) + 1 for line in lines]
+    keep = [False] * len(lines)
+    used = 0
+
+    def take(index: int, budget: float) -> bool:
+        nonlocal used
+        if keep[index]:
+            return True
+        if used + costs[index] > budget:
+            return False
+        keep[index] = True
+        used += costs[index]
+        return True
+
+    head_budget = max_tokens * HEAD_SHARE
+    for i in range(len(lines)):
+        if not take(i, head_budget):
+            break
+
+    tail_budget = used + max_tokens * TAIL_SHARE
+    for i in reversed(range(len(lines))):
+        if not take(i, tail_budget):
+            break
+
+    # the rest goes to errors, earliest first since later ones often follow
+    # from them
+    for i, line in enumerate(lines):
+        if keep[i] or not ERROR_LINE.search(line):
+            continue
+        if i > 0 and not keep[i - 1] and used + costs[i - 1] + costs[i] <= max_tokens:
+            take(i - 1, max_tokens)
+        take(i, max_tokens)
+
+    selected: list[str] = []
+    omitted = 0
+    for line, kept in zip(lines, keep):
+        if kept:
+            if omitted:
+                selected.append(f"[... {omitted} lines omitted ...]")
+                omitted = 0
+            selected.append(line)
+        else:
+            omitted += 1
+    if omitted:
+        selected.append(f"[... {omitted} lines omitted ...]")
+    return selected
+
+
+def reduce_text(text: str, max_tokens: int) -> str:
+    """Shrink command output to about `max_tokens`: strip escapes, collapse
+    repeated lines, then keep the head, tail and error lines."""
+
+    lines = strip_ansi(text).rstrip("\n").split("\n")
+    lines = [
+        line if len(line) <= MAX_LINE_CHARS else line[:MAX_LINE_CHARS] + " [...]"
+        for line in lines
+    ]
+    lines = collapse_repeats(lines)
+
+    if sum(estimate_text_tokens(line) + 1 for line in lines) > max_tokens:
+        lines = select_lines(lines, max_tokens)
+    return "\n".join(lines)
+
+
+def reduce_output(stdout: str, stderr: str, max_tokens: int = 3000) -> str:
+    """Combine a command's stdout and stderr into one reduced text for
+    analysis. stderr is usually shorter and more telling, so it gets its
+    share of the budget first and stdout gets the rest.
+
+    Args:
+        stdout (str): Command's standard output.
+        stderr (str): Command's standard error.
+        max_tokens (int, optional): Token budget for the result.
+
+    Returns:
+        str: Labelled sections for whichever streams had output.
+    """
+
+    sections = []
+    remaining = max_tokens
+
+    if stderr.strip():
+        budget = remaining // 2 if stdout.strip() else remaining
+        reduced = reduce_text(stderr, budget)
+        remaining -= estimate_text_tokens(reduced)
+        sections.append(("stderr", reduced))
+
+    if stdout.strip():
+        sections.insert(0, ("stdout", reduce_text(stdout, remaining)))
+
+    return "\n\n".join(f"{name}:\n{text}" for name, text in sections)
@@ -0,0 +1,250 @@
+import json
+import re
+import shlex
+from pathlib import Path
+
+from cliqq.log import logger
+
+# programs that run the command given after them
+WRAPPERS = frozenset(
+    {
+        "sudo", "doas", "env", "nohup", "nice", "time", "timeout", "xargs",
+        "exec", "eval", "command", "builtin", "watch", "cmd", "powershell",
+        "pwsh", "bash", "sh", "zsh", "start", "call", "ssh",
+    }
+)  # fmt: skip
+
+# wrapper options that take a separate value, e.g. "timeout -s KILL 5 reboot"
+WRAPPER_OPTIONS = {
+    "sudo": {"-u", "-g", "-h", "-p", "-C", "-D", "-r", "-t", "-U"},
+    "doas": {"-u", "-C"},
+    "env": {"-u", "-C", "-S"},
+    "nice": {"-n"},
+    "timeout": {"-s", "-k"},
+    "xargs": {"-a", "-d", "-E", "-I", "-L", "-n", "-P", "-s"},
+    "watch": {"-n", "-d"},
+    "ssh": {
+        "-b", "-c", "-D", "-E", "-e", "-F", "-I", "-i", "-J", "-L", "-l",
+        "-m", "-O", "-o", "-p", "-Q", "-R", "-S", "-W", "-w",
+    },
+}  # fmt: skip
+
+# arguments a wrapper takes before the command, e.g. "ssh host reboot"
+WRAPPER_ARGUMENTS = {"timeout": 1, "ssh": 1}
+
+# options after which find runs a program
+EXEC_OPTIONS = frozenset({"-exec", "-execdir", "-ok", "-okdir"})
+
+# tokens that start a new command: separators, subshells and backticks
+OPERATORS = frozenset({"|", "||", "&", "&&", ";", "(", ")", "|&", ";;", "`"})
+
+LEVELS = ("DENY_ALWAYS", "CONFIRM_FIRST", "DENY_PROGRAMS", "CONFIRM_PROGRAMS")
+
+
+def load_rules(*rule_paths: Path) -> dict[str, list[str]]:
+    """Load and merge safety rule files. The first path is the packaged
+    rules and must exist, the rest are optional user rule files.
+
+    Returns:
+        dict[str, list[str]]: Lowercased rules for each level.
+    """
+
+    rules: dict[str, list[str]] = {level: [] for level in LEVELS}
+
+    for i, rule_path in enumerate(rule_paths):
+        try:
+            with open(rule_path, encoding="utf-8") as f:
+                loaded = json.load(f)
+        except FileNotFoundError:
+            if i == 0:
+                raise
+            continue
+        except (ValueError, OSError) as e:
+            # a broken user file shouldn't stop the packaged rules from loading
+            logger.exception(
+                "%s: Error while loading safety rules %s\n%s",
+                type(e).__name__,
+                rule_path,
+                e,
+            )
+            continue
+
+        for level in LEVELS:
+            rules[level].extend(rule.lower() for rule in loaded.get(level, []))
+
+    return rules
+
+
+def compile_rules(rules: list[str], whole_words: bool = True) -> re.Pattern | None:
+    """Compile substring rules into a single regex built from a trie, so
+    matching costs the same however many rules there are.
+
+    A rule starting with a letter or digit never matches inside an option
+    name (so "format" doesn't match "--format=json"). With `whole_words`,
+    it also only matches at the start of a word, and a rule that is a
+    single bare word must end at a word boundary too. Without, it is a
+    plain substring otherwise, like every other rule, so "shutdown" still
+    matches "shutdown-now".
+
+    Args:
+        rules (list[str]): Lowercased rules.
+        whole_words (bool, optional): Whether word rules need word boundaries.
+
+    Returns:
+        re.Pattern | None: Pattern matching any rule, or None if no rules.
+    """
+
+    # rules starting with a word character get the leading boundary once,
+    # outside their trie
+    word_start: dict = {}
+    other_start: dict = {}
+
+    for rule in rules:
+        if not rule:
+            continue
+        node = word_start if re.match(r"\w", rule) else other_start
+        for char in rule:
+            node = node.setdefault(char, {})
+        # value of the end marker is what must follow the rule
+        bare_word = whole_words and re.fullmatch(r"[\w.-]+", rule)
+        node[""] = r"(?![\w-])" if bare_word else ""
+
+    branches = []
+    if word_start:
+        start = r"(?<![\w-])" if whole_words else r"(?<!-)"
+        branches.append(start + trie_pattern(word_start))
+    if other_start:
+        branches.append(trie_pattern(other_start))
+    if not branches:
+        return None
+    return re.compile("|".join(branches))
+
+
+def trie_pattern(node: dict) -> str:
+    """Turn a character trie into an equivalent regex, e.g. rules "rm -r"
+    and "rm -f" become "rm\\ \\-(?:f|r)"."""
+
+    alternatives = [
+        re.escape(char) + trie_pattern(child)
+        for char, child in sorted(node.items())
+        if char
+    ]
+    if "" in node:
+        # end of a rule, listed last so longer rules are tried first
+        alternatives.append(node[""])
+
+    if len(alternatives) == 1:
+        return alternatives[0]
+    return "(?:" + "|".join(alternatives) + ")"
+
+
+def command_programs(command: str, depth: int = 0) -> list[str]:
+    """Names of the programs a shell command line runs, e.g.
+    "cd /tmp && sudo /sbin/shutdown now" -> ["cd", "sudo", "shutdown"].
+
+    Quoted scripts passed to other programs (bash -c "...") and command
+    substitutions (`...`, $(...)) are searched as well, so wrapping a command
+    in a shell doesn't hide it.
+
+    This is a best effort, not a shell parser: programs named through
+    variables, aliases or scripts aren't found. DENY_ALWAYS/CONFIRM_FIRST
+    rules, which match the whole command, are the backstop for those.
+    """
+
+    try:
+        lexer = shlex.shlex(command, posix=True, punctuation_chars="();<>|&`")
+        lexer.whitespace_split = True
+        tokens = list(lexer)
+    except ValueError:
+        # unbalanced quotes, fall back to plain words
+        tokens = command.split()
+
+    programs = []
+    expect_program = True
+    # the wrapper whose options/arguments come before the next program
+    wrapper = ""
+    skip_value = False
+    arguments_left = 0
+
+    for token in tokens:
+        if token in OPERATORS or token in EXEC_OPTIONS:
+            expect_program = True
+            wrapper = ""
+            skip_value = False
+            continue
+
+        nested = any(c.isspace() for c in token) or "`" in token or "$(" in token
+        if depth < 2 and nested:
+            programs.extend(command_programs(token, depth + 1))
+
+        if not expect_program:
+            continue
+        if skip_value:
+            skip_value = False
+            continue
+        # VAR=value before a program, or options given to a wrapper
+        if re.match(r"^\w+=", token) or token == "$":
+            continue
+        if wrapper and (token.startswith("-") or re.match(r"^/\w{1,2}$", token)):
+            skip_value = token in WRAPPER_OPTIONS.get(wrapper, ())
+            continue
+        if arguments_left:
+            arguments_left -= 1
+            continue
+
+        name = re.split(r"[/\\]", token)[-1].lower()
+        if name.endswith(".exe"):
+            name = name[: -len(".exe")]
+        programs.append(name)
+
+        wrapper = name if name in WRAPPERS else ""
+        arguments_left = WRAPPER_ARGUMENTS.get(wrapper, 0)
+        expect_program = bool(wrapper)
+
+    return programs
+
+
+class SafetyClassifier:
+    """Classifies commands as "deny", "confirm" or "safe", with all rules
+    compiled once up front.
+
+    Args:
+        rules (dict[str, list[str]]): Lowercased rules, as returned by load_rules.
+            DENY_ALWAYS/CONFIRM_FIRST are matched against the whole command,
+            DENY_PROGRAMS/CONFIRM_PROGRAMS only against program names.
+            DENY_ALWAYS rules match as substrings, see compile_rules.
+    """
+
+    def __init__(self, rules: dict[str, list[str]]):
+        # a false alarm is better than a missed destructive command
+        self._deny = compile_rules(rules.get("DENY_ALWAYS", []), whole_words=False)
+        self._confirm = compile_rules(rules.get("CONFIRM_FIRST", []))
+        self._deny_programs = frozenset(rules.get("DENY_PROGRAMS", []))
+        self._confirm_programs = frozenset(rules.get("CONFIRM_PROGRAMS", []))
+
+    def classify(self, command: str) -> str:
+        lowered = command.lower()
+
+        programs: list[str] | None = None
+        if self._deny_programs or self._confirm_programs:
+            programs = command_programs(command)
+
+        if (self._deny and self._deny.search(lowered)) or self._runs(
+            programs, self._deny_programs
+        ):
+            return "deny"
+        if (self._confirm and self._confirm.search(lowered)) or self._runs(
+            programs, self._confirm_programs
+        ):
+            return "confirm"
+        return "safe"
+
+    @staticmethod
+    def _runs(programs: list[str] | None, names: frozenset[str]) -> bool:
+        if not programs or not names:
+            return False
+        # "mkfs" also covers variants like "mkfs.ext4"
+        return any(
+            program in names or program.split(".", 1)[0] in names
+            for program in programs
+        )
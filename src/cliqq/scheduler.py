@@ -0,0 +1,196 @@
+import asyncio
+import random
+import re
+import time
+from typing import Any, Awaitable, Callable, TypeVar
+
+from cliqq.log import logger
+
+T = TypeVar("T")
+
+# statuses worth sending the same request again for, besides any 5xx
+RETRY_STATUSES = {408, 409, 429}
+
+# "1s", "6m0s", "20ms", "1h2m3.5s", as in x-ratelimit-reset-* headers
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: str) -> float | None:
+    """Seconds in a duration like "6m0s" or "20ms", or None if it isn't one."""
+
+    parts = _DURATION.findall(value.strip())
+    if not parts or "".join(n + u for n, u in parts) != value.strip():
+        return None
+    return sum(float(number) * _UNIT_SECONDS[unit] for number, unit in parts)
+
+
+def header_delay(headers: Any) -> float | None:
+    """How long the server asked us to wait, from Retry-After (seconds or an
+    HTTP date), retry-after-ms, or the x-ratelimit-reset-* headers."""
+
+    if not headers:
+        return None
+
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            from email.utils import parsedate_to_datetime
+
+            try:
+                moment = parsedate_to_datetime(retry_after)
+                return max(moment.timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+
+    resets = [
+        parse_duration(headers[name])
+        for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+        if headers.get(name)
+    ]
+    resets = [reset for reset in resets if reset is not None]
+    return max(resets) if resets else None
+
+
+def is_transient(error: BaseException) -> bool:
+    """True for errors that may well not happen again: connection problems,
+    timeouts, rate limits and server errors."""
+
+    import openai
+
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status in RETRY_STATUSES or status >= 500)
+
+
+class RequestScheduler:
+    """Paces API requests and decides when a failed one is tried again.
+
+    Requests take a token from a bucket refilled at `rate` per second (up
+    to `burst`), so concurrent callers, e.g. /batch, are spread out instead
+    of tripping the provider's rate limit. A rate of 0 means no pacing.
+
+    Transient failures are retried up to `max_retries` times, after a
+    jittered exponential backoff or however long the server asked for,
+    whichever is longer. A rate limit also holds back every other request
+    for that long. A server asking for more than `max_wait` seconds is not
+    waited for.
+
+    Only used from the session's event loop, so it needs no locking.
+
+    Args:
+        max_retries (int, optional): Retries per request.
+        base_delay (float, optional): Backoff before the first retry, doubled
+            for each one after.
+        max_delay (float, optional): Longest backoff, in seconds.
+        max_wait (float, optional): Longest server-requested wait, in seconds.
+        rate (float, optional): Requests per second, 0 for no limit.
+        burst (int, optional): Requests that may be sent at once.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+        max_wait: float = 60.0,
+        rate: float = 0.0,
+        burst: int = 5,
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+        self.rate = rate
+        self.burst = burst
+
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        # monotonic time before which no request is sent, after a rate limit
+        self._paused_until = 0.0
+
+    @classmethod
+    def from_config(cls, config: dict[str, Any]) -> "RequestScheduler":
+        """Build a scheduler from the "retry" section of config.json,
+        ignoring any unknown keys."""
+
+        options = config.get("retry", {})
+        known = ("max_retries", "base_delay", "max_delay", "max_wait", "rate", "burst")
+        return cls(**{key: options[key] for key in known if key in options})
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent."""
+
+        while True:
+            now = time.monotonic()
+            wait = self._paused_until - now
+            if wait <= 0:
+                if not self.rate:
+                    return
+                refill = (now - self._updated) * self.rate
+                self._tokens = min(float(self.burst), self._tokens + refill)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every request for `seconds`."""
+
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def retry_delay(self, error: BaseException, attempt: int) -> float | None:
+        """Seconds to wait before retry number `attempt` (0 = first retry)
+        after `error`, or None if it shouldn't be retried."""
+
+        if attempt >= self.max_retries or not is_transient(error):
+            return None
+
+        response = getattr(error, "response", None)
+        requested = header_delay(getattr(response, "headers", None))
+        if requested is not None and requested > self.max_wait:
+            return None
+
+        # full jitter, so callers that failed together don't retry together
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        delay = max(backoff, requested or 0.0)
+
+        if getattr(error, "status_code", None) == 429:
+            self.pause(delay)
+        return delay
+
+    async def call(self, request: Callable[[], Awaitable[T]]) -> T:
+        """Send a (non-streaming) request, paced and retried.
+
+        Args:
+            request (Callable): Makes a new request each time it is called.
+        """
+
+        attempt = 0
+        while True:
+            await self.acquire()
+            try:
+                return await request()
+            except Exception as e:
+                delay = self.retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                logger.warning(
+                    "%s: Request failed, retrying in %.1fs\n%s",
+                    type(e).__name__,
+                    delay,
+                    e,
+                )
+                attempt += 1
+                await asyncio.sleep(delay)
@@ -0,0 +1,197 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from cliqq.journal import new_session_id, now
+from cliqq.log import logger, reverse_lines
+from cliqq.models import estimate_tokens
+
+
+class SessionLog:
+    """Append-only record of one conversation, so it can be resumed later.
+
+    Each message is appended as one JSON line the moment it is remembered,
+    the file is never rewritten. A line is written with a single O_APPEND
+    write, so a crash loses at most the line being written, and readers
+    skip a torn last line. The file is only created with the first
+    message, so sessions without any leave nothing behind.
+
+    Lines are {"time", "role", "content"} for messages, or {"time", "title"}
+    for the session's first question. A summary of evicted turns has the
+    role "summary" and a "kept" count: how many of the messages just before
+    it it doesn't cover. It covers every message older than those.
+
+    Args:
+        directory (Path): Where sessions are kept, e.g. ~/.cliqq/sessions.
+        session_id (str, optional): An existing session to append to.
+    """
+
+    def __init__(self, directory: Path, session_id: str | None = None):
+        self.directory = directory
+        self.session_id = session_id or new_session_id()
+        self.path = directory / f"{self.session_id}.jsonl"
+        self._titled = session_id is not None
+
+    def write(self, record: dict[str, Any]) -> None:
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            # losing the saved session shouldn't interrupt the conversation
+            logger.warning("%s: Couldn't save session\n%s", type(e).__name__, e)
+
+    def append(self, msg: dict[str, str], **fields: Any) -> None:
+        self.write(
+            {"time": now(), "role": msg["role"], "content": msg["content"], **fields}
+        )
+
+    def set_title(self, text: str) -> None:
+        """Name the session after its first question, later ones are ignored."""
+
+        if self._titled:
+            return
+        self._titled = True
+        self.write({"time": now(), "title": " ".join(text.split())[:80]})
+
+
+def load_messages(path: Path, max_tokens: int | None = None) -> list[dict[str, str]]:
+    """The newest whole turns of a saved session that fit in `max_tokens`,
+    oldest first, after the newest summary read on the way.
+
+    The file is read backwards from the end, so resuming a long session
+    only reads as much of it as the history can hold. Reading stops at the
+    turns the summary covers, so they aren't restored twice.
+
+    Args:
+        path (Path): The session's file.
+        max_tokens (int, optional): Token budget, None for the whole session.
+
+    Returns:
+        list[dict[str, str]]: Messages, a summary has the role "summary".
+    """
+
+    messages: list[dict[str, str]] = []
+    summary: dict[str, str] | None = None
+    # messages before the summary that it doesn't cover, once it is read
+    uncovered: int | None = None
+    used = 0
+
+    for line in reverse_lines(path):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # torn by a crash while it was written
+            continue
+        if "role" not in record:
+            continue
+        msg = {"role": record["role"], "content": record["content"]}
+        if msg["role"] == "summary":
+            if summary is None:
+                summary = msg
+                # older sessions didn't say, only trust what came after
+                uncovered = record.get("kept", 0)
+            continue
+        if uncovered is not None:
+            if uncovered <= 0:
+                break
+            uncovered -= 1
+        used += estimate_tokens(msg)
+        if max_tokens is not None and used > max_tokens and messages:
+            break
+        messages.append(msg)
+
+    messages.reverse()
+    # whole turns only, never an answer without its question
+    while messages and messages[0]["role"] != "user":
+        messages.pop(0)
+    return [summary, *messages] if summary else messages
+
+
+def session_title(path: Path) -> str:
+    """The session's title, from the first lines of its file."""
+
+    with open(path, "rb") as f:
+        for line in f.readlines(4096):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if "title" in record:
+                return record["title"]
+    return ""
+
+
+def list_sessions(directory: Path) -> list[dict[str, Any]]:
+    """Saved sessions, most recently used first.
+
+    Returns:
+        list[dict[str, Any]]: {"id", "path", "modified", "size"} per session.
+    """
+
+    sessions = []
+    if not directory.is_dir():
+        return sessions
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".jsonl"):
+                continue
+            info = entry.stat()
+            sessions.append(
+                {
+                    "id": entry.name.removesuffix(".jsonl"),
+                    "path": Path(entry.path),
+                    "modified": datetime.fromtimestamp(info.st_mtime),
+                    "size": info.st_size,
+                }
+            )
+    sessions.sort(key=lambda session: session["modified"], reverse=True)
+    return sessions
+
+
+def find_session(
+    directory: Path, query: str | None = None, exclude: str | None = None
+) -> dict[str, Any] | None:
+    """The saved session whose id starts with `query`, or the most recent
+    one other than `exclude` without a query.
+
+    Raises:
+        ValueError: If `query` matches more than one session.
+    """
+
+    sessions = [
+        session for session in list_sessions(directory) if session["id"] != exclude
+    ]
+    if not query:
+        return sessions[0] if sessions else None
+    matches = [session for session in sessions if session["id"].startswith(query)]
+    exact = [session for session in matches if session["id"] == query]
+    if exact:
+        return exact[0]
+    if len(matches) > 1:
+        raise ValueError(
+            f"'{query}' matches {', '.join(session['id'] for session in matches)}"
+        )
+    return matches[0] if matches else None
+
+
+def start_session(config: dict[str, Any], directory: Path) -> SessionLog | None:
+    """A new session to save the conversation to, unless the "persist"
+    option of the "sessions" section is off.
+
+    Args:
+        config (dict[str, Any]): The whole config.
+        directory (Path): Where sessions are kept, e.g. ~/.cliqq/sessions.
+    """
+
+    if not config.get("sessions", {}).get("persist", True):
+        return None
+    return SessionLog(directory)
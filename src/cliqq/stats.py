@@ -0,0 +1,318 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from cliqq.journal import new_session_id
+from cliqq.log import logger, reverse_lines
+
+# what a turn records, in the order /stats shows it. Everything is in
+# seconds except tokens_per_s, the prompt token counts and cache_hit (the
+# share of prompt tokens the provider had cached)
+METRICS = (
+    "prep_prompt",
+    "ensure_api",
+    "ttft",
+    "stream",
+    "tokens_per_s",
+    "execute_command",
+    "total",
+    "prompt_tokens",
+    "cached_tokens",
+    "cache_hit",
+)
+QUANTILES = (50, 90, 95, 99)
+
+# Prometheus family, and label, of each metric
+FAMILIES = {
+    "cliqq_turn_stage_seconds": "Time spent in each stage of a turn.",
+    "cliqq_tokens_per_second": "Answer generation speed after the first token.",
+    "cliqq_prompt_tokens": "Prompt tokens sent, and how many of them were cached.",
+    "cliqq_prompt_cache_hit_ratio": "Share of the prompt the provider had cached.",
+}
+EXPORTED_AS = {
+    "tokens_per_s": ("cliqq_tokens_per_second", ""),
+    "prompt_tokens": ("cliqq_prompt_tokens", 'kind="sent",'),
+    "cached_tokens": ("cliqq_prompt_tokens", 'kind="cached",'),
+    "cache_hit": ("cliqq_prompt_cache_hit_ratio", ""),
+}
+
+# defaults, overridden by the "stats" section of config.json
+MAX_TURNS = 5000
+
+# set by start_stats, turns are only kept in memory until then
+_path: Path | None = None
+_max_turns = MAX_TURNS
+_session_id = ""
+_turn: "TurnTimer | None" = None
+_session: list[dict[str, Any]] = []
+
+
+class TurnTimer:
+    """How long each stage of one turn took.
+
+    A stage that runs more than once in a turn (e.g. ensure_api before a
+    retried request) adds up.
+
+    Attributes:
+        started (float): Clock time the turn started.
+        ended (float | None): Clock time the answer was complete, see end.
+        durations (dict[str, float]): Seconds per stage.
+        tokens (int): Estimated tokens streamed in the answer.
+        usage (dict[str, int]): Token counts the provider reported, if any.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self.started = clock()
+        self.ended: float | None = None
+        self.durations: dict[str, float] = {}
+        self.tokens = 0
+        self.usage: dict[str, int] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.durations[stage] = self.durations.get(stage, 0.0) + seconds
+
+    def end(self) -> None:
+        """Stop the total here, so time spent deciding whether to run the
+        answer's action isn't counted. Otherwise it runs until the turn is
+        recorded."""
+
+        if self.ended is None:
+            self.ended = self._clock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the block as stage `name`, even if it raises."""
+
+        started = self._clock()
+        try:
+            yield
+        finally:
+            self.add(name, self._clock() - started)
+
+    def record(self) -> dict[str, Any]:
+        """The turn as a stats record, see METRICS."""
+
+        record: dict[str, Any] = {
+            "session": _session_id,
+            "time": datetime.now().isoformat(timespec="seconds"),
+            **{stage: round(seconds, 4) for stage, seconds in self.durations.items()},
+            "total": round((self.ended or self._clock()) - self.started, 4),
+        }
+        if self.usage:
+            record.update(self.usage)
+            if self.usage.get("prompt_tokens"):
+                record["cache_hit"] = round(
+                    self.usage.get("cached_tokens", 0) / self.usage["prompt_tokens"], 3
+                )
+        # counted by the provider if it said, estimated otherwise
+        tokens = self.usage.get("completion_tokens") or self.tokens
+        if tokens:
+            record["tokens"] = tokens
+            # generation speed, so a slow first token doesn't count twice
+            generating = self.durations.get("stream", 0.0) - self.durations.get(
+                "ttft", 0.0
+            )
+            if generating > 0:
+                record["tokens_per_s"] = round(tokens / generating, 1)
+        return record
+
+
+def start_stats(config: dict[str, Any], path: Path) -> None:
+    """Keep finished turns in `path` as well, unless the "persist" option
+    of the "stats" section is off, so /stats --all can aggregate across
+    sessions.
+
+    Args:
+        config (dict[str, Any]): The whole config.
+        path (Path): The stats file, e.g. ~/.cliqq/stats.jsonl.
+    """
+
+    global _path, _max_turns, _session_id
+
+    options = config.get("stats", {})
+    _session_id = new_session_id()
+    _max_turns = options.get("max_turns", MAX_TURNS)
+    if options.get("persist", True):
+        _path = path
+
+
+def current_turn() -> TurnTimer:
+    """The turn being timed, starting one if there is none."""
+
+    global _turn
+
+    if _turn is None:
+        _turn = TurnTimer()
+    return _turn
+
+
+def start_turn() -> TurnTimer:
+    """Start timing a new turn, finishing any unfinished one first."""
+
+    finish_turn()
+    return current_turn()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the block as stage `name` of the current turn."""
+
+    with current_turn().stage(name):
+        yield
+
+
+def finish_turn() -> dict[str, Any] | None:
+    """Record the current turn, if any of it was timed.
+
+    Returns:
+        dict[str, Any] | None: The turn's record.
+    """
+
+    global _turn
+
+    turn, _turn = _turn, None
+    if turn is None or not turn.durations:
+        return None
+
+    record = turn.record()
+    _session.append(record)
+    if _path is not None:
+        try:
+            _path.parent.mkdir(parents=True, exist_ok=True)
+            # O_APPEND, so turns from several sessions never overlap
+            fd = os.open(_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, (json.dumps(record) + "\n").encode("utf-8"))
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logger.warning("%s: Couldn't save turn stats\n%s", type(e).__name__, e)
+    return record
+
+
+def session_turns() -> list[dict[str, Any]]:
+    """This session's finished turns, oldest first."""
+
+    return list(_session)
+
+
+def load_turns(path: Path, limit: int | None = None) -> list[dict[str, Any]]:
+    """The newest `limit` turns saved in `path` (default: max_turns),
+    oldest first. Reads the file backwards, so only those are read."""
+
+    turns: list[dict[str, Any]] = []
+    if not path.exists():
+        return turns
+    lines = (line for line in reverse_lines(path) if line.strip())
+    for line in islice(lines, limit or _max_turns):
+        try:
+            turns.append(json.loads(line))
+        except ValueError:
+            # a turn still being written by another session
+            continue
+    turns.reverse()
+    return turns
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile (0-100) of sorted, non-empty `values`."""
+
+    index = min(int(len(values) * pct / 100), len(values) - 1)
+    return values[index]
+
+
+def summarize(turns: list[dict[str, Any]]) -> dict[str, dict[str, float]]:
+    """Count, sum, mean, max and QUANTILES of each metric over `turns`.
+    Metrics no turn recorded are left out."""
+
+    summary: dict[str, dict[str, float]] = {}
+    for metric in METRICS:
+        values = sorted(turn[metric] for turn in turns if metric in turn)
+        if not values:
+            continue
+        summary[metric] = {
+            "count": len(values),
+            "sum": sum(values),
+            "mean": sum(values) / len(values),
+            "max": values[-1],
+            **{f"p{q}": percentile(values, q) for q in QUANTILES},
+        }
+    return summary
+
+
+def format_stats(summary: dict[str, dict[str, float]], turns: int) -> str:
+    """A table of the summary for the terminal."""
+
+    if not summary:
+        return "No turns timed yet."
+
+    columns = [f"p{q}" for q in QUANTILES] + ["max"]
+    lines = [
+        f"{turns} turns (seconds, except tokens_per_s, token counts and cache_hit)",
+        f"{'':<16}{'count':>7}" + "".join(f"{column:>9}" for column in columns),
+    ]
+    for metric, values in summary.items():
+        precision = 0 if metric.endswith("_tokens") else 2
+        lines.append(
+            f"{metric:<16}{values['count']:>7.0f}"
+            + "".join(f"{values[column]:>9.{precision}f}" for column in columns)
+        )
+    if "prompt_tokens" in summary and summary["prompt_tokens"]["sum"]:
+        sent = summary["prompt_tokens"]["sum"]
+        cached = summary.get("cached_tokens", {}).get("sum", 0)
+        lines.append(
+            f"{cached:,.0f} of {sent:,.0f} prompt tokens were cached ({cached / sent:.0%})"
+        )
+    return "\n".join(lines)
+
+
+def exported_as(metric: str) -> tuple[str, str]:
+    """Prometheus family of a metric, and its label (the stage, for times)."""
+
+    return EXPORTED_AS.get(metric, ("cliqq_turn_stage_seconds", f'stage="{metric}",'))
+
+
+def to_prometheus(summary: dict[str, dict[str, float]], scope: str) -> str:
+    """The summary in the Prometheus text format, for node_exporter's
+    textfile collector.
+
+    Args:
+        summary (dict[str, dict[str, float]]): See summarize.
+        scope (str): "session" or "all", added as a label.
+    """
+
+    lines = []
+    for name, help_text in FAMILIES.items():
+        metrics = [
+            (metric, exported_as(metric)[1])
+            for metric in summary
+            if exported_as(metric)[0] == name
+        ]
+        if not metrics:
+            continue
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} summary"]
+        for metric, label in metrics:
+            values = summary[metric]
+            labels = f'{label}scope="{scope}"'
+            for q in QUANTILES:
+                lines.append(
+                    f'{name}{{{labels},quantile="{q / 100}"}} {values[f"p{q}"]}'
+                )
+            lines.append(f"{name}_sum{{{labels}}} {values['sum']}")
+            lines.append(f"{name}_count{{{labels}}} {values['count']:.0f}")
+    return "\n".join(lines) + "\n"
+
+
+def export_stats(text: str, path: Path) -> None:
+    """Write an export in one go, so a collector never reads half of it."""
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(path.name + ".tmp")
+    temporary.write_text(text, encoding="utf-8")
+    os.replace(temporary, path)
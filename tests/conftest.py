@@ -27,6 +27,9 @@ def disable_program_output(monkeypatch):
     monkeypatch.setattr(
         "cliqq.main.program_output", dummy_program_output, raising=False
     )
+    monkeypatch.setattr(
+        "cliqq.ai.stream_writer", lambda *a, **k: dummy_program_output, raising=False
+    )
 
     return dummy_program_output
 
@@ -43,3 +46,13 @@ def disable_file_logging(monkeypatch):
     monkeypatch.setattr("cliqq.log.logger", dummy_logger)
 
     return dummy_logger
+
+
+@pytest.fixture(autouse=True)
+def reset_prompt_context():
+    # prep caches the environment per session, tests fake a new one each time
+    from cliqq import prep
+
+    prep.reset_prompt_context()
+    yield
+    prep.reset_prompt_context()
@@ -1,7 +1,14 @@
 import re
+import sys
+import time
 from unittest.mock import Mock
+
+import pytest
+
 from cliqq import action
 
+posix_only = pytest.mark.skipif(sys.platform == "win32", reason="POSIX shell")
+
 
 def test_execute_command_success():
     code, out, err = action.execute_command("python --version")
@@ -26,6 +33,48 @@ def test_execute_command_notfound():
     ), f"Expected error pattern not found in: {err}"
 
 
+@posix_only
+def test_run_process_streams_output_live():
+    arrived = []
+    start = time.monotonic()
+
+    def on_output(name, data):
+        arrived.append((name, data, time.monotonic() - start))
+
+    result = action.run_process(
+        "echo first; echo oops >&2; sleep 1; echo second", on_output=on_output
+    )
+
+    assert result.code == 0
+    assert result.stdout == "first\nsecond\n"
+    assert result.stderr == "oops\n"
+    assert (result.stdout_bytes, result.stderr_bytes) == (13, 5)
+    # the first line was shown long before the command finished
+    assert arrived[0][1] == b"first\n" and arrived[0][2] < 0.8
+    assert result.wall_time >= 1
+
+
+@posix_only
+def test_run_process_timeout_kills_the_process_group():
+    start = time.monotonic()
+    # the shell's background child would keep running if only the shell died
+    result = action.run_process("sleep 30 & sleep 30; wait", timeout=0.5)
+
+    assert result.timed_out
+    assert result.code != 0
+    assert time.monotonic() - start < 5
+
+
+@posix_only
+def test_run_process_keeps_only_head_and_tail():
+    result = action.run_process("seq 1 100000", head_bytes=6, tail_bytes=14)
+
+    assert result.stdout_bytes == len("".join(f"{i}\n" for i in range(1, 100001)))
+    assert result.stdout.startswith("1\n2\n3\n")
+    assert "bytes omitted" in result.stdout
+    assert result.stdout.endswith("99999\n100000\n")
+
+
 # testing func run
 def test_run_valid_command(monkeypatch):
     monkeypatch.setattr(action, "run_command", lambda *a, **k: True)
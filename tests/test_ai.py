@@ -1,23 +1,17 @@
+import asyncio
+import threading
+
 import pytest
-from unittest.mock import Mock, ANY
+from unittest.mock import AsyncMock, Mock, ANY
 
-from cliqq import ai
+from cliqq import ai, cache, models
 
 
-@pytest.mark.parametrize(
-    "test_input,expected",
-    [
-        (["a", "b", "c", "d", "e", "f"], ["abcde", "f"]),
-        (
-            ["This is a co", "mmand for", " you: \x1e{ '", "do':1 }\x1f"],
-            ["This is a command for you: \x1e{ 'do':1 }\x1f"],
-        ),
-    ],
-)
-def test_buffer_deltas(test_input, expected):
-    # collect generator output into list
-    result = list(ai.buffer_output(test_input))
-    assert result == expected
+def parse_prose(deltas, parser):
+    async def collect():
+        return [prose async for prose in ai.parse_prose_async(deltas, parser)]
+
+    return [prose for prose in asyncio.run(collect()) if prose]
 
 
 @pytest.mark.parametrize(
@@ -28,12 +22,10 @@ def test_buffer_deltas(test_input, expected):
         ("i'm missing one of the delimitors \x1e{'do':1}", None),
     ],
 )
-def test_extract_action(test_input, expected):
-    result = ai.extract_action(test_input)
-    if expected is None:
-        assert result is None
-    else:
-        assert result == expected
+def test_parse_prose_finds_the_action(test_input, expected):
+    parser = models.ActionParser()
+    parse_prose([test_input], parser)
+    assert parser.action == expected
 
 
 def test_load_env_file(tmp_path):
@@ -80,7 +72,7 @@ def test_validate_api_fail(monkeypatch):
 
 def test_ensure_api_fail(monkeypatch):
 
-    def fail_find(env_path):
+    def fail_find(env_path, interactive=True):
         raise ValueError()
 
     api_config = Mock()
@@ -100,6 +92,17 @@ def test_ensure_api_fail(monkeypatch):
     assert result is False
 
 
+def test_ensure_api_never_prompts_when_not_interactive(monkeypatch, tmp_path):
+    monkeypatch.setattr(ai, "load_env_file", lambda env_path: None)
+    monkeypatch.setattr(ai, "load_sys_env", lambda: None)
+    prompted = Mock()
+    monkeypatch.setattr(ai, "prompt_api_info", prompted)
+
+    api_config = models.ApiConfig()
+    assert not ai.ensure_api(tmp_path / ".env", api_config, interactive=False)
+    prompted.assert_not_called()
+
+
 # integration test: success
 def test_ai_response_success(monkeypatch):
     # fake ensure_api always valid
@@ -124,6 +127,9 @@ def test_ai_response_success(monkeypatch):
     api_config.model_name = "m"
     api_config.base_url = "b"
     api_config.api_key = "k"
+    api_config.response_cache = None
+    api_config.router = None
+    api_config.endpoint = None
 
     history = Mock()
     history.chat_history = []
@@ -139,3 +145,391 @@ def test_ai_response_success(monkeypatch):
     assert action_str == "{1}"
     history.remember.assert_any_call({"role": "user", "content": "prompt"})
     history.remember.assert_any_call({"role": "assistant", "content": ANY})
+
+
+def test_cancelled_response_keeps_partial_answer(monkeypatch):
+    monkeypatch.setattr(ai, "ensure_api", lambda *a, **k: True)
+    monkeypatch.setattr(ai, "program_output", lambda *a, **k: None)
+    streaming = asyncio.Event()
+
+    async def slow_stream(*a, **k):
+        for delta in ["Partial ", "answer ", "\x1e{", '"type": ', '"command"']:
+            yield delta
+        streaming.set()
+        await asyncio.sleep(60)
+        yield "}\x1f"
+
+    monkeypatch.setattr(ai, "stream_chunks", slow_stream)
+    history = models.ChatHistory()
+
+    async def interrupt():
+        task = asyncio.create_task(
+            ai.ai_response_async("prompt", Mock(), models.ApiConfig(), history)
+        )
+        await asyncio.wait_for(streaming.wait(), timeout=5)
+        task.cancel()
+        return await task
+
+    action_str, response = asyncio.run(interrupt())
+
+    # the unfinished action must never be run
+    assert action_str is None
+    assert response == 'Partial answer {"type": "command"'
+    assert history.chat_history[-1] == {
+        "role": "assistant",
+        "content": 'Partial answer \x1e{"type": "command"',
+    }
+
+
+def test_cached_response_is_replayed_without_a_request(monkeypatch, tmp_path):
+    monkeypatch.setattr(ai, "ensure_api", lambda *a, **k: True)
+    rendered = []
+    monkeypatch.setattr(ai, "stream_writer", lambda **k: rendered.append)
+    requests = []
+
+    def fake_stream(api_config, chat_history):
+        requests.append(chat_history)
+        return iter(["Hello ", "there", " \x1e{1}\x1f"])
+
+    monkeypatch.setattr(ai, "stream_chunks", fake_stream)
+    api_config = models.ApiConfig(
+        response_cache=cache.ResponseCache(tmp_path / "responses.sqlite3")
+    )
+
+    results = []
+    for _ in range(2):
+        rendered.clear()
+        history = models.ChatHistory()
+        results.append(ai.ai_response("prompt", Mock(), api_config, history))
+        results.append("".join(rendered))
+
+    assert len(requests) == 1
+    # same action, text and rendering as the original answer
+    assert results[0] == results[2] == ("{1}", "Hello there {1}")
+    assert results[1] == results[3]
+
+
+def test_prewarm_connection_opens_pooled_connection():
+    api_config = models.ApiConfig()
+    api_config.set_config({"model_name": "m", "base_url": "http://b", "api_key": "k"})
+    api_config._async_http_client = AsyncMock()
+
+    warm_up = ai.prewarm_connection(env_path=Mock(), api_config=api_config)
+    warm_up.result(timeout=5)
+
+    api_config.async_http_client.head.assert_awaited_once_with("http://b")
+    assert not api_config.is_idle
+    # pool is still warm, so nothing is done the second time
+    assert ai.prewarm_connection(env_path=Mock(), api_config=api_config) is None
+
+
+def test_prewarm_connection_skips_while_a_warm_up_is_in_flight(monkeypatch):
+    handshake = threading.Event()
+
+    async def slow_head(url):
+        await asyncio.to_thread(handshake.wait, 5)
+
+    env_lookups = []
+    monkeypatch.setattr(ai, "load_env_file", lambda path: env_lookups.append(path))
+    monkeypatch.setattr(
+        ai, "load_sys_env", lambda: {"model_name": "m", "base_url": "http://b"}
+    )
+    api_config = models.ApiConfig()
+    api_config._async_http_client = AsyncMock()
+    api_config.async_http_client.head.side_effect = slow_head
+
+    first = ai.prewarm_connection(env_path=Mock(), api_config=api_config)
+    # a keystroke during the handshake
+    assert ai.prewarm_connection(env_path=Mock(), api_config=api_config) is None
+    handshake.set()
+    first.result(timeout=5)
+
+    api_config.async_http_client.head.assert_awaited_once_with("http://b")
+    # the host was only looked up once, by the warm-up itself
+    assert len(env_lookups) == 1
+
+
+def test_ensure_api_trusts_cached_credentials(monkeypatch, tmp_path):
+    monkeypatch.setattr(ai, "load_env_file", lambda *a: None)
+    monkeypatch.setattr(
+        ai, "load_sys_env", lambda: {"model_name": "m", "base_url": "b", "api_key": "k"}
+    )
+    pings = []
+    monkeypatch.setattr(ai, "ping_api", lambda config: pings.append(config) or True)
+
+    cache_path = tmp_path / "credentials.json"
+
+    # first process validates for real and records it
+    assert ai.ensure_api(Mock(), models.ApiConfig(credential_cache=cache_path))
+    # second process trusts the cache
+    assert ai.ensure_api(Mock(), models.ApiConfig(credential_cache=cache_path))
+    assert len(pings) == 1
+
+
+@pytest.mark.parametrize(
+    "deltas",
+    [
+        # raw delimiters
+        ["Run this: ", "\x1e", '{"type": "command"}', "\x1f"],
+        # escaped delimiters split across deltas
+        ["Run this: \\", "x1", 'e{"type": ', '"command"}\\x', "1f"],
+        # everything in one delta
+        ['Run this: \x1e{"type": "command"}\x1f'],
+    ],
+)
+def test_parse_prose_handles_split_delimiters(deltas):
+    actions = []
+    parser = models.ActionParser(on_action=actions.append)
+
+    prose = "".join(parse_prose(deltas, parser))
+
+    assert prose == "Run this: "
+    assert parser.action == '{"type": "command"}'
+    assert parser.clean_text == 'Run this: {"type": "command"}'
+    assert parser.raw_text == "".join(deltas)
+    assert actions == ['{"type": "command"}']
+
+
+def test_parse_prose_releases_held_back_text():
+    parser = models.ActionParser()
+    prose = parse_prose(["a path like C:\\", "Users"], parser)
+    assert "".join(prose) == "a path like C:\\Users"
+    assert parser.action is None
+
+
+def test_parse_prose_strips_escaped_delimiters_after_the_action():
+    parser = models.ActionParser()
+    parse_prose(["Run: \\x1e{1}\\x1f then \\x", "1f done\x1e"], parser)
+    assert parser.clean_text == "Run: {1} then  done"
+    assert parser.action == "{1}"
+
+
+def test_prose_is_flushed_when_the_action_starts():
+    parser = models.ActionParser()
+    flushed = []
+
+    def write(text):
+        # how much of the action had arrived when the prose was shown
+        flushed.append((text, "".join(parser._action)))
+
+    deltas = ["Run ", "this: ", "\x1e{", "1}", "\x1f"]
+    # the clock never moves, so only the first delta and the flush write
+    asyncio.run(
+        ai.render_stream(
+            ai.parse_prose_async(deltas, parser),
+            write,
+            flush=lambda: parser.action_started,
+            clock=lambda: 0.0,
+        )
+    )
+    assert flushed == [("Run ", ""), ("this: ", "{")]
+
+
+def test_render_stream_coalesces_fast_deltas_into_frames():
+    written = []
+    asyncio.run(ai.render_stream(iter("abcdef"), written.append, clock=lambda: 0.0))
+    # first delta right away, the rest in one write
+    assert written == ["a", "bcdef"]
+
+
+def test_render_stream_writes_held_back_text_when_the_frame_ends():
+    written = []
+
+    async def slow_deltas():
+        yield "a"
+        yield "b"
+        # longer than any frame, "b" must not wait for "c"
+        await asyncio.sleep(ai.MAX_FRAME * 2)
+        written.append("<gap>")
+        yield "c"
+
+    asyncio.run(ai.render_stream(slow_deltas(), written.append))
+    assert written == ["a", "b", "<gap>", "c"]
+
+
+@pytest.mark.parametrize(
+    "write_cost,expected",
+    [
+        # a local terminal: deltas 20 ms apart are each worth a frame
+        (0.0, ["a", "b", "c", "d", "e", "f"]),
+        # 50 ms per write (e.g. over SSH): frames grow and text coalesces
+        (0.05, ["a", "bcdef"]),
+    ],
+)
+def test_render_stream_frame_adapts_to_write_cost(write_cost, expected):
+    now = 0.0
+    written = []
+
+    def deltas():
+        nonlocal now
+        for delta in "abcdef":
+            yield delta
+            now += 0.02
+
+    def write(text):
+        nonlocal now
+        written.append(text)
+        now += write_cost
+
+    asyncio.run(ai.render_stream(deltas(), write, clock=lambda: now))
+    assert written == expected
+
+
+def make_router(*names):
+    return models.EndpointRouter(
+        [
+            models.Endpoint(
+                name, {"model_name": "m", "base_url": f"http://{name}", "api_key": "k"}
+            )
+            for name in names
+        ]
+    )
+
+
+def test_failover_retries_the_same_history_on_the_next_endpoint(monkeypatch):
+    import httpx
+    import openai
+
+    monkeypatch.setattr(ai, "ensure_api", lambda *a, **k: True)
+    sent = []
+
+    async def flaky_stream(api_config, messages):
+        sent.append((api_config.base_url, messages))
+        if api_config.base_url == "http://primary":
+            request = httpx.Request("POST", api_config.base_url)
+            raise openai.APIConnectionError(request=request)
+        yield "from backup"
+
+    monkeypatch.setattr(ai, "stream_chunks", flaky_stream)
+    router = make_router("primary", "backup")
+    api_config = models.ApiConfig(router=router)
+    history = models.ChatHistory()
+
+    action, response = ai.ai_response("prompt", Mock(), api_config, history)
+
+    assert response == "from backup"
+    assert [url for url, _ in sent] == ["http://primary", "http://backup"]
+    assert sent[0][1] == sent[1][1]
+    # the failed endpoint is avoided until its cooldown ends
+    assert not router.endpoints[0].health.available
+    assert [e.name for e in router.ordered()] == ["backup", "primary"]
+    assert router.endpoints[1].health.p50 is not None
+
+
+def test_no_failover_once_the_answer_has_started(monkeypatch):
+    import httpx
+    import openai
+
+    monkeypatch.setattr(ai, "ensure_api", lambda *a, **k: True)
+    sent = []
+
+    async def broken_stream(api_config, messages):
+        sent.append(api_config.base_url)
+        yield "half an answer"
+        raise openai.APIConnectionError(request=httpx.Request("POST", "http://x"))
+
+    monkeypatch.setattr(ai, "stream_chunks", broken_stream)
+    api_config = models.ApiConfig(router=make_router("primary", "backup"))
+
+    assert ai.ai_response("prompt", Mock(), api_config, models.ChatHistory()) == (
+        None,
+        "",
+    )
+    assert sent == ["http://primary"]
+
+
+def test_check_endpoints_records_health_in_the_background():
+    router = make_router("up", "down")
+    api_config = models.ApiConfig(router=router)
+    api_config._async_http_client = AsyncMock()
+    api_config._async_http_client.head.side_effect = lambda url: Mock(
+        status_code=503 if "down" in url else 404
+    )
+
+    ai.check_endpoints(api_config).result(timeout=5)
+
+    up, down = router.endpoints
+    assert up.health.available and up.health.error_rate == 0
+    assert not down.health.available
+    # nothing is due again until health_interval has passed
+    assert ai.check_endpoints(api_config) is None
+
+
+def test_rate_limited_stream_is_retried_before_anything_is_shown(monkeypatch):
+    import httpx
+    import openai
+
+    monkeypatch.setattr(ai, "ensure_api", lambda *a, **k: True)
+    attempts = []
+
+    async def limited_stream(api_config, messages):
+        attempts.append(1)
+        if len(attempts) < 3:
+            request = httpx.Request("POST", "http://api")
+            response = httpx.Response(
+                429, headers={"retry-after": "0"}, request=request
+            )
+            raise openai.RateLimitError("slow down", response=response, body=None)
+        yield "finally"
+
+    monkeypatch.setattr(ai, "stream_chunks", limited_stream)
+    api_config = models.ApiConfig()
+    api_config.scheduler.base_delay = 0.001
+
+    action, response = ai.ai_response(
+        "prompt", Mock(), api_config, models.ChatHistory()
+    )
+
+    assert response == "finally"
+    assert len(attempts) == 3
+
+
+def test_stream_chunks_records_cached_prompt_tokens(monkeypatch):
+    from types import SimpleNamespace as NS
+
+    from cliqq import stats
+
+    monkeypatch.setattr(stats, "_turn", None)
+
+    def chunk(content=None, finish_reason=None, usage=None):
+        choices = (
+            []
+            if usage
+            else [NS(delta=NS(content=content), finish_reason=finish_reason)]
+        )
+        return NS(choices=choices, usage=usage)
+
+    class FakeStream:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def __aiter__(self):
+            yield chunk("Hello")
+            yield chunk(finish_reason="stop")
+            # sent after the last choice when usage is asked for
+            yield chunk(
+                usage=NS(
+                    prompt_tokens=1200,
+                    completion_tokens=3,
+                    prompt_tokens_details=NS(cached_tokens=1024),
+                )
+            )
+
+    create = AsyncMock(return_value=FakeStream())
+    api_config = models.ApiConfig()
+    api_config._async_client = Mock()
+    api_config._async_client.chat.completions.create = create
+
+    async def consume():
+        return [delta async for delta in ai.stream_chunks(api_config, [])]
+
+    assert asyncio.run(consume()) == ["Hello"]
+    assert create.call_args.kwargs["stream_options"] == {"include_usage": True}
+
+    record = stats.current_turn().record()
+    assert record["cached_tokens"] == 1024
+    assert record["cache_hit"] == round(1024 / 1200, 3)
+    assert record["tokens"] == 3
@@ -0,0 +1,134 @@
+import asyncio
+import io
+import json
+from types import SimpleNamespace
+
+from cliqq import batch, models
+
+
+def test_read_prompts_from_text_and_jsonl():
+    lines = [
+        "how do I list files\n",
+        "\n",
+        '{"request_id": "r-1", "body": "count lines", "title": "t"}\n',
+        '{"prompt": "no id"}\n',
+        "{not json\n",
+        '{"id": "blank", "body": "   "}\n',
+    ]
+
+    prompts = batch.read_prompts(lines, field="body")
+
+    assert [p["prompt"] for p in prompts] == [
+        "how do I list files",
+        "count lines",
+        "",
+        "{not json",
+        "   ",
+    ]
+    assert [p["id"] for p in prompts] == [0, "r-1", 2, 3, "blank"]
+    assert [p.get("error") for p in prompts] == [
+        None,
+        None,
+        "No 'body' in the record",
+        None,
+        "Empty prompt",
+    ]
+
+
+class FakeCompletions:
+    """Answers after a delay that depends on the prompt, tracking how many
+    requests are in flight."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.most_in_flight = 0
+
+    async def create(self, model, messages):
+        self.in_flight += 1
+        self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        try:
+            prompt = messages[-1]["content"]
+            if "fail" in prompt:
+                raise RuntimeError("boom")
+            # later prompts finish first
+            await asyncio.sleep(0.05 / (len(prompt) % 7 + 1))
+            usage = SimpleNamespace(model_dump=lambda: {"total_tokens": 10})
+            content = f"answer to {prompt} \x1e{{1}}\x1f"
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+                usage=usage,
+            )
+        finally:
+            self.in_flight -= 1
+
+
+def test_run_batch_writes_ordered_results_with_bounded_concurrency():
+    completions = FakeCompletions()
+    api_config = models.ApiConfig()
+    api_config.set_config({"model_name": "m", "base_url": "http://b", "api_key": "k"})
+    api_config.async_client = SimpleNamespace(
+        chat=SimpleNamespace(completions=completions)
+    )
+    prompts = batch.read_prompts(
+        [f"prompt {'x' * i}" for i in range(10)] + ["fail", '{"prompt": " "}']
+    )
+    out = io.StringIO()
+
+    totals = asyncio.run(
+        batch.run_batch(prompts, api_config, "system", "<QUESTION>", out, 3)
+    )
+
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r["index"] for r in results] == list(range(12))
+    assert results[0]["answer"] == "answer to prompt {1}"
+    assert results[0]["action"] == "{1}"
+    assert results[0]["usage"] == {"total_tokens": 10}
+    assert "boom" in results[-2]["error"]
+    assert results[-1]["error"] == "Empty prompt"
+    assert completions.most_in_flight == 3
+    assert totals["errors"] == 2 and totals["tokens"] == 100
+    assert "10/12 prompts answered" in batch.report_batch(totals)
+
+
+def test_batch_prompts_fail_over_between_endpoints(monkeypatch):
+    import httpx
+    import openai
+
+    class DownCompletions:
+        async def create(self, model, messages):
+            request = httpx.Request("POST", "http://primary")
+            raise openai.APIConnectionError(request=request)
+
+    clients = {
+        "http://primary": SimpleNamespace(
+            chat=SimpleNamespace(completions=DownCompletions())
+        ),
+        "http://backup": SimpleNamespace(
+            chat=SimpleNamespace(completions=FakeCompletions())
+        ),
+    }
+    monkeypatch.setattr(
+        models.ApiConfig,
+        "async_client",
+        property(lambda api_config: clients[api_config.base_url]),
+    )
+    router = models.EndpointRouter(
+        [
+            models.Endpoint(
+                name, {"model_name": "m", "base_url": f"http://{name}", "api_key": "k"}
+            )
+            for name in ("primary", "backup")
+        ]
+    )
+    api_config = models.ApiConfig(router=router)
+    out = io.StringIO()
+
+    totals = asyncio.run(
+        batch.run_batch(
+            batch.read_prompts(["one", "two"]), api_config, "s", "<QUESTION>", out
+        )
+    )
+
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r["answer"] for r in results] == ["answer to one {1}", "answer to two {1}"]
+    assert totals["errors"] == 0
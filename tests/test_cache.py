@@ -0,0 +1,92 @@
+import asyncio
+
+from cliqq import cache
+
+CONFIG = {"model_name": "m", "base_url": "b", "api_key": "k"}
+
+
+def test_remember_and_forget_validated(tmp_path):
+    cache_path = tmp_path / "credentials.json"
+    assert not cache.is_validated(cache_path, CONFIG, ttl=60)
+
+    cache.remember_validated(cache_path, CONFIG, ttl=60)
+    assert cache.is_validated(cache_path, CONFIG, ttl=60)
+    # the api key itself is never written to disk
+    assert "k" not in cache_path.read_text().replace(cache.credential_key(CONFIG), "")
+
+    cache.forget_validated(cache_path, CONFIG)
+    assert not cache.is_validated(cache_path, CONFIG, ttl=60)
+
+
+def test_validated_expires(tmp_path):
+    cache_path = tmp_path / "credentials.json"
+    cache.save_validated(cache_path, {cache.credential_key(CONFIG): 0.0})
+    assert not cache.is_validated(cache_path, CONFIG, ttl=60)
+
+
+def test_corrupt_cache_is_ignored(tmp_path):
+    cache_path = tmp_path / "credentials.json"
+    cache_path.write_text("not json")
+    assert cache.load_validated(cache_path) == {}
+
+
+def test_response_cache_round_trip_and_expiry(tmp_path):
+    responses = cache.ResponseCache(tmp_path / "responses.sqlite3", max_age=60)
+    key = responses.key("m", "b", [{"role": "user", "content": "hi"}])
+
+    assert responses.get(key) is None
+    responses.put(key, ["Hel", "lo"])
+    assert responses.get(key) == ["Hel", "lo"]
+    # a different message list is a different request
+    assert key != responses.key("m", "b", [{"role": "user", "content": "hi!"}])
+
+    responses.max_age = 0
+    assert responses.get(key) is None
+
+
+def test_response_cache_evicts_least_recently_used(tmp_path):
+    responses = cache.ResponseCache(tmp_path / "responses.sqlite3", max_entries=2)
+    responses.put("a", ["a"])
+    responses.put("b", ["b"])
+    responses.get("a")
+    responses.put("c", ["c"])
+
+    assert responses.get("b") is None
+    assert responses.get("a") == ["a"]
+    assert responses.get("c") == ["c"]
+
+    responses.max_bytes = len('["x"]') * 2
+    responses.put("big", ["x" * 100])
+    assert responses.get("big") is None
+
+
+def test_response_cache_disabled_by_default(tmp_path):
+    path = tmp_path / "responses.sqlite3"
+    assert cache.ResponseCache.from_config({}, path) is None
+    enabled = cache.ResponseCache.from_config(
+        {"response_cache": {"enabled": True, "max_entries": 5}}, path
+    )
+    assert enabled.max_entries == 5
+
+
+def test_concurrent_identical_requests_only_stream_once(tmp_path):
+    responses = cache.ResponseCache(tmp_path / "responses.sqlite3")
+    key = responses.key("m", "b", [])
+    requests = 0
+
+    async def request():
+        nonlocal requests
+        deltas = await responses.lookup(key, poll_interval=0.01)
+        if deltas is None:
+            requests += 1
+            await asyncio.sleep(0.1)
+            deltas = ["answer"]
+            responses.put(key, deltas)
+            responses.release(key)
+        return deltas
+
+    async def run_all():
+        return await asyncio.gather(*(request() for _ in range(5)))
+
+    assert asyncio.run(run_all()) == [["answer"]] * 5
+    assert requests == 1
@@ -45,3 +45,20 @@ def test_dispatch_with_args():
         api_config=api_config,
         registry=registry,
     )
+
+
+def test_stats_export_json(tmp_path, monkeypatch):
+    import json
+
+    monkeypatch.setattr(
+        commands, "session_turns", lambda: [{"total": 1.0}, {"total": 3.0}]
+    )
+    paths = Mock(home_path=tmp_path)
+
+    commands.show_stats(paths, export="json", out=str(tmp_path / "stats.json"))
+    commands.show_stats(paths, export="prometheus")
+
+    exported = json.loads((tmp_path / "stats.json").read_text())
+    assert exported["turns"] == 2
+    assert exported["metrics"]["total"]["max"] == 3.0
+    assert "cliqq_turn_stage_seconds_sum" in (tmp_path / "cliqq.prom").read_text()
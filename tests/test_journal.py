@@ -0,0 +1,60 @@
+import logging
+
+from cliqq import journal
+
+
+def test_journal_indexes_sessions_and_days(tmp_path):
+    path = tmp_path / "sessions.jsonl"
+    handler = journal.SessionJournal(path)
+
+    handler.write({"session": "a", "time": "2025-01-01T09:00:00", "role": "user"})
+    handler.write({"session": "b", "time": "2025-01-01T09:00:01", "role": "user"})
+    handler.write({"session": "a", "time": "2025-01-02T08:00:00", "role": "command"})
+    handler.close()
+
+    sessions, days = journal.load_index(tmp_path / "sessions.idx")
+    assert list(sessions) == ["a", "b"]
+    # and today, for the end records written on close
+    assert list(days)[:2] == ["2025-01-01", "2025-01-02"]
+    with open(path, "rb") as f:
+        f.seek(sessions["b"])
+        assert b'"session": "b"' in f.readline()
+
+    assert [r["role"] for r in journal.session_records(path, "a")] == [
+        "user",
+        "command",
+    ]
+    assert [r["session"] for r in journal.day_records(path, "2025-01-02")] == ["a"]
+    assert journal.session_ids(path) == ["a", "b"]
+    assert list(journal.session_records(path, "missing")) == []
+
+
+def test_journal_only_writes_turn_records(tmp_path):
+    handler = journal.SessionJournal(tmp_path / "sessions.jsonl")
+    logger = logging.getLogger("cliqq.test_journal")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    try:
+        logger.info("plain text")
+        logger.info("turn", extra={"turn": {"session": "s", "role": "user"}})
+    finally:
+        logger.handlers.clear()
+        handler.close()
+
+    lines = (tmp_path / "sessions.jsonl").read_text().splitlines()
+    # the turn, then the end record written on close
+    assert len(lines) == 2 and '"end"' in lines[1]
+
+
+def test_log_turn_is_a_no_op_until_started(monkeypatch):
+    calls = []
+    monkeypatch.setattr(journal, "logger", logging.getLogger("cliqq.test_turn"))
+    monkeypatch.setattr(journal.logger, "info", lambda *a, **k: calls.append(k))
+
+    journal.log_turn("user", content="hi")
+    assert calls == []
+
+    monkeypatch.setattr(journal, "_journal", object())
+    journal.log_turn("user", content="hi")
+    assert calls[0]["extra"]["turn"]["content"] == "hi"
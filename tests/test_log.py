@@ -0,0 +1,242 @@
+import gzip
+import logging
+import os
+import queue
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from cliqq import log
+
+
+def make_record(message, level=logging.INFO):
+    return logging.LogRecord("cliqq", level, __file__, 1, message, None, None)
+
+
+def test_buffering_handler_keeps_file_open_and_flushes_by_count(tmp_path):
+    handler = log.BufferingFileHandler("test.log", buffer_size=2, directory=tmp_path)
+    path = tmp_path / "test.log"
+
+    handler.emit(make_record("one"))
+    assert path.read_text() == ""
+
+    handler.emit(make_record("two"))
+    assert path.read_text() == "one\n\ntwo\n\n"
+    stream = handler._stream
+
+    handler.emit(make_record("three"))
+    handler.flush()
+    assert handler._stream is stream
+    assert path.read_text().endswith("three\n\n")
+
+    handler.close()
+    assert handler._stream is None
+
+
+def test_buffering_handler_flushes_errors_and_stale_records(tmp_path):
+    handler = log.BufferingFileHandler(
+        "test.log", buffer_size=100, flush_interval=0, directory=tmp_path
+    )
+    handler.flush_interval = 60
+
+    handler.emit(make_record("boom", logging.ERROR))
+    assert "boom" in (tmp_path / "test.log").read_text()
+
+    handler.emit(make_record("quiet"))
+    assert not handler.is_due()
+    handler.flush_interval = 0
+    assert handler.is_due()
+    handler.close()
+
+
+def test_log_writer_writes_off_the_calling_thread(tmp_path):
+    log_queue: queue.Queue = queue.Queue()
+    handler = log.BufferingFileHandler(
+        "test.log", buffer_size=100, flush_interval=0.05, directory=tmp_path
+    )
+    writer = log.LogWriter(log_queue, handler, flush_interval=0.05)
+    writer.start()
+
+    logger = logging.getLogger("cliqq.test_log")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    try:
+        logger.info("queued")
+        log_queue.join()
+        # quiet queue, the writer flushes on its own
+        for _ in range(100):
+            if "queued" in (tmp_path / "test.log").read_text():
+                break
+            writer._thread.join(0.01)
+        assert "queued" in (tmp_path / "test.log").read_text()
+    finally:
+        logger.handlers.clear()
+        writer.stop()
+        handler.close()
+
+
+def test_rotation_compresses_prunes_and_reads_across_segments(tmp_path):
+    handler = log.BufferingFileHandler(
+        "test.log", buffer_size=1, directory=tmp_path, max_bytes=30, backup_count=2
+    )
+    path = tmp_path / "test.log"
+
+    for i in range(5):
+        handler.emit(make_record(f"record number {i}"))
+
+    segments = log.log_segments(path)
+    # two kept, the oldest ones pruned
+    assert [p.suffix for p in segments] == [".gz", ".gz", ".log"]
+    # no timestamps here, so each segment reads as one entry
+    assert list(log.search_log(path)) == [f"record number {i}" for i in (4, 3, 2)]
+
+    log.clear_segments(path)
+    assert log.log_segments(path) == [path]
+    handler.close()
+
+
+def test_rotation_by_age_and_retention(tmp_path):
+    handler = log.BufferingFileHandler(
+        "test.log",
+        buffer_size=1,
+        directory=tmp_path,
+        max_bytes=0,
+        max_age=60,
+        compress=False,
+    )
+    path = tmp_path / "test.log"
+
+    handler.emit(make_record("old"))
+    handler._opened_at -= 120
+    handler.emit(make_record("new"))
+
+    old, current = log.log_segments(path)
+    assert old.read_text() == "old\n\n"
+    assert current.read_text() == "new\n\n"
+
+    handler.retention = 60
+    os.utime(old, (0, 0))
+    handler.prune()
+    assert not old.exists()
+    handler.close()
+
+
+def write_entries(path, stamps):
+    with open(path, "w", encoding="utf-8") as f:
+        for i, stamp in enumerate(stamps):
+            f.write(f"{stamp},000 | entry {i}\nsecond line {i}\n\n\n")
+
+
+def test_reverse_lines_reads_backwards_in_blocks(tmp_path):
+    path = tmp_path / "test.log"
+    path.write_bytes(b"one\ntwo\nthree and more\n")
+
+    assert list(log.reverse_lines(path, block_size=4)) == [
+        b"",
+        b"three and more",
+        b"two",
+        b"one",
+    ]
+
+
+def test_search_log_newest_first_across_segments(tmp_path):
+    path = tmp_path / "test.log"
+    write_entries(path, ["2025-01-02 10:00:00", "2025-01-02 11:00:00"])
+    segment = tmp_path / "test.log.20250102-095959.gz"
+    with gzip.open(segment, "wt", encoding="utf-8") as f:
+        f.write("2025-01-01 09:00:00,000 | old entry\n\n")
+
+    entries = log.search_log(path)
+    assert next(entries) == "2025-01-02 11:00:00,000 | entry 1\nsecond line 1"
+    assert [e.split(" | ")[1] for e in entries] == [
+        "entry 0\nsecond line 0",
+        "old entry",
+    ]
+
+    since = list(log.search_log(path, since="2025-01-02 10:30:00"))
+    assert len(since) == 1 and "entry 1" in since[0]
+
+    assert [e[-6:] for e in log.search_log(path, pattern="LINE 0")] == ["line 0"]
+
+
+def test_search_log_splits_records_flushed_together(tmp_path):
+    handler = log.BufferingFileHandler("test.log", buffer_size=3, directory=tmp_path)
+    handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+    for i, created in enumerate(["2025-01-02 10:00:00", "2025-01-02 11:00:00"]):
+        record = make_record(f"entry {i}\nsecond line {i}")
+        record.created = datetime.fromisoformat(created).timestamp()
+        record.msecs = 0
+        handler.emit(record)
+    handler.emit(make_record("boom", logging.WARNING))
+    handler.close()
+    path = tmp_path / "test.log"
+
+    lines = [line for line in path.read_text().splitlines() if line]
+    assert [line.split(" [")[1] for line in lines if "[" in line] == [
+        "INFO] entry 0",
+        "INFO] entry 1",
+        "WARNING] boom",
+    ]
+
+    entries = list(log.search_log(path))
+    assert len(entries) == 3
+    assert entries[1].endswith("entry 1\nsecond line 1")
+
+    since = list(log.search_log(path, since="2025-01-02 10:30:00"))
+    assert [entry.split("] ")[1] for entry in since] == [
+        "boom",
+        "entry 1\nsecond line 1",
+    ]
+    assert list(log.search_log(path, pattern="boom")) == entries[:1]
+
+
+def test_parse_since():
+    now = datetime(2025, 1, 2, 12, 0, 0)
+
+    assert log.parse_since("90m", now) == "2025-01-02 10:30:00"
+    assert log.parse_since("1d", now) == "2025-01-01 12:00:00"
+    assert log.parse_since("2025-01-01 09:00", now) == "2025-01-01 09:00:00"
+    with pytest.raises(ValueError):
+        log.parse_since("yesterday", now)
+
+
+def test_show_log_pages_backwards(tmp_path, monkeypatch):
+    from cliqq import commands
+
+    path = tmp_path / "test.log"
+    write_entries(path, [f"2025-01-02 10:00:0{i}" for i in range(5)])
+    paths = SimpleNamespace(log_path=path)
+    shown = []
+    monkeypatch.setattr(
+        commands, "program_output", lambda text, **kwargs: shown.append(text)
+    )
+    monkeypatch.setattr(commands, "program_choice", lambda *args, **kwargs: "yes")
+
+    commands.show_log(paths, count=2)
+
+    pages = [page.count(" | entry") for page in shown[:-1]]
+    assert pages == [2, 2, 1]
+    assert shown[0].index("entry 3") < shown[0].index("entry 4")
+
+
+def test_show_log_pages_records_flushed_together(tmp_path, monkeypatch):
+    from cliqq import commands
+
+    handler = log.BufferingFileHandler("test.log", buffer_size=5, directory=tmp_path)
+    handler.setFormatter(logging.Formatter("%(asctime)s | %(message)s"))
+    for i in range(5):
+        handler.emit(make_record(f"entry {i}"))
+    handler.close()
+    paths = SimpleNamespace(log_path=tmp_path / "test.log")
+    shown = []
+    monkeypatch.setattr(
+        commands, "program_output", lambda text, **kwargs: shown.append(text)
+    )
+    monkeypatch.setattr(commands, "program_choice", lambda *args, **kwargs: "yes")
+
+    commands.show_log(paths, count=2)
+
+    pages = [page.count(" | entry") for page in shown[:-1]]
+    assert pages == [2, 2, 1]
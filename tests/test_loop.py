@@ -0,0 +1,47 @@
+import _thread
+import asyncio
+import threading
+
+import pytest
+
+from cliqq import loop
+
+
+def test_run_sync_returns_result_and_raises_errors():
+    async def add(a, b):
+        await asyncio.sleep(0)
+        return a + b
+
+    async def fail():
+        raise ValueError("boom")
+
+    assert loop.run_sync(add(1, 2)) == 3
+    with pytest.raises(ValueError):
+        loop.run_sync(fail())
+
+
+def test_run_sync_reuses_one_loop():
+    async def current_loop():
+        return asyncio.get_running_loop()
+
+    assert loop.run_sync(current_loop()) is loop.run_sync(current_loop())
+
+
+def test_ctrl_c_cancels_the_task_and_waits_for_cleanup():
+    async def slow():
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            return "cleaned up"
+
+    # simulates Ctrl-C in the waiting (main) thread
+    threading.Timer(0.2, _thread.interrupt_main).start()
+    assert loop.run_sync(slow()) == "cleaned up"
+
+
+def test_run_sync_refuses_to_deadlock_the_loop():
+    async def nested():
+        loop.run_sync(asyncio.sleep(0))
+
+    with pytest.raises(RuntimeError):
+        loop.run_sync(nested())
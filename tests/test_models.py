@@ -0,0 +1,218 @@
+import threading
+import time
+
+from cliqq import models
+
+
+def test_api_config_from_config_ignores_unknown_keys():
+    api_config = models.ApiConfig.from_config(
+        {"http": {"pool_size": 3, "http2": True, "bogus": 1}}
+    )
+    assert api_config.pool_size == 3
+    assert api_config.http2 is True
+
+
+def test_api_config_reuses_pool_across_credential_changes():
+    api_config = models.ApiConfig()
+    pool = api_config.http_client
+
+    api_config.set_config({"model_name": "m", "base_url": "http://b", "api_key": "k"})
+    api_config.api_key = "other"
+
+    # credentials only rebuild the client, never the connection pool
+    assert api_config.http_client is pool
+    assert api_config.client._client is pool
+    api_config.close()
+
+
+def test_api_config_clients_leave_retries_to_the_scheduler():
+    api_config = models.ApiConfig()
+    api_config.set_config({"model_name": "m", "base_url": "http://b", "api_key": "k"})
+
+    assert api_config.client.max_retries == 0
+    assert api_config.async_client.max_retries == 0
+    api_config.close()
+
+
+def test_api_config_close_closes_both_pools():
+    api_config = models.ApiConfig()
+    pool = api_config.http_client
+    async_pool = api_config.async_http_client
+
+    api_config.close()
+
+    assert pool.is_closed and async_pool.is_closed
+    assert api_config._async_http_client is None
+
+
+def test_chat_history_tracks_tokens():
+    history = models.ChatHistory()
+    history.remember({"role": "system", "content": "x" * 40})
+    history.remember({"role": "user", "content": "y" * 80})
+    assert history.total_tokens == 14 + 24
+
+    history.forget()
+    assert history.total_tokens == 0
+    assert history.chat_history == []
+
+
+def test_chat_history_evicts_oldest_turns_keeping_template():
+    history = models.ChatHistory(max_tokens=100)
+    history.remember({"role": "system", "content": "template"})
+    for i in range(10):
+        history.remember({"role": "user", "content": f"question {i} " * 10})
+        history.remember({"role": "assistant", "content": f"answer {i} " * 10})
+
+    messages = history.chat_history
+    assert history.total_tokens <= 100
+    assert messages[0] == {"role": "system", "content": "template"}
+    # whole turns are evicted, newest turn is kept
+    assert messages[1]["role"] == "user"
+    assert messages[-1]["content"].startswith("answer 9")
+
+
+def test_chat_history_summarizes_evicted_turns_in_background():
+    summarized = threading.Event()
+
+    def summarizer(messages):
+        summarized.set()
+        return f"{len(messages)} messages"
+
+    history = models.ChatHistory(max_tokens=80, summarizer=summarizer)
+    history.remember({"role": "system", "content": "template"})
+    history.remember({"role": "user", "content": "first " * 20})
+    history.remember({"role": "assistant", "content": "reply " * 20})
+    history.remember({"role": "user", "content": "second " * 5})
+
+    assert summarized.wait(timeout=5)
+    # wait for the summary to be swapped in
+    for _ in range(100):
+        if len(history.chat_history) == 3:
+            break
+        time.sleep(0.01)
+
+    assert history.chat_history[0]["content"] == "template"
+    assert history.chat_history[1]["role"] == "system"
+    assert "2 messages" in history.chat_history[1]["content"]
+    assert history.chat_history[2] == {"role": "user", "content": "second " * 5}
+
+
+def test_chat_history_keeps_a_large_newest_turn_whole():
+    history = models.ChatHistory(max_tokens=60)
+    history.remember({"role": "system", "content": "template"})
+    history.remember({"role": "user", "content": "q" * 100})
+    history.remember({"role": "assistant", "content": "a" * 100})
+
+    roles = [msg["role"] for msg in history.messages()]
+    assert roles == ["system", "user", "assistant"]
+
+    # the next question makes the old turn evictable as a whole
+    history.remember({"role": "user", "content": "next"})
+    roles = [msg["role"] for msg in history.messages()]
+    assert roles == ["system", "user"]
+
+
+def test_chat_history_summary_stays_within_budget():
+    release = threading.Event()
+
+    def summarizer(messages):
+        release.wait(timeout=5)
+        return "s" * 100
+
+    history = models.ChatHistory(max_tokens=100, summarizer=summarizer)
+    history.remember({"role": "system", "content": "template"})
+    history.remember({"role": "user", "content": "q" * 120})
+    history.remember({"role": "assistant", "content": "a" * 120})
+    # evicts the first turn, its summary is still being written
+    history.remember({"role": "user", "content": "q" * 120})
+    history.remember({"role": "assistant", "content": "a" * 120})
+    history.remember({"role": "user", "content": "x"})
+    release.set()
+
+    for _ in range(100):
+        if any("Summary" in msg["content"] for msg in history.messages()):
+            break
+        time.sleep(0.01)
+
+    # the late summary pushed the older turn out instead of going over budget
+    assert history.total_tokens <= 100
+    assert history.messages()[-1] == {"role": "user", "content": "x"}
+
+
+def test_chat_history_messages_is_a_snapshot():
+    history = models.ChatHistory()
+    history.remember({"role": "user", "content": "hi"})
+    snapshot = history.messages()
+    history.remember({"role": "assistant", "content": "hello"})
+    assert len(snapshot) == 1
+
+
+def test_output_buffer_keeps_head_and_tail():
+    buffer = models.OutputBuffer(head_bytes=4, tail_bytes=4)
+    for _ in range(1000):
+        buffer.write(b"0123456789")
+
+    assert buffer.total == 10000
+    assert buffer.omitted == 10000 - 8
+    assert buffer.text() == "0123\n[... 9992 bytes omitted ...]\n6789"
+
+    small = models.OutputBuffer(head_bytes=4, tail_bytes=4)
+    small.write(b"abcdef")
+    assert small.text() == "abcdef"
+
+
+def test_endpoint_health_cooldown_and_percentiles(monkeypatch):
+    now = 100.0
+    monkeypatch.setattr(models.time, "monotonic", lambda: now)
+    health = models.EndpointHealth(cooldown=10)
+
+    for latency in (0.1, 0.2, 0.3, 0.4):
+        health.record(True, latency)
+    assert health.p50 == 0.3 and health.p95 == 0.4
+
+    health.record(False)
+    health.record(False)
+    assert health.error_rate == 2 / 6
+    # doubled for the second failure in a row
+    assert health.down_until == now + 20
+    assert not health.available
+
+    health.record(True)
+    assert health.available
+
+
+def test_router_prefers_configured_order_unless_unhealthy_or_slow():
+    endpoints = [
+        models.Endpoint(name, {"model_name": "m", "base_url": name, "api_key": "k"})
+        for name in ("a", "b", "c")
+    ]
+    router = models.EndpointRouter(endpoints)
+    assert [e.name for e in router.ordered()] == ["a", "b", "c"]
+
+    for _ in range(3):
+        endpoints[0].health.record(True, 5.0)
+        endpoints[1].health.record(True, 1.0)
+    assert [e.name for e in router.ordered()] == ["b", "c", "a"]
+
+    # with b cooling down, a is the fastest healthy endpoint again
+    endpoints[1].health.record(False)
+    assert [e.name for e in router.ordered()] == ["a", "c", "b"]
+
+
+def test_router_from_config_reads_keys_from_the_environment(monkeypatch):
+    monkeypatch.setenv("BACKUP_KEY", "secret")
+    router = models.EndpointRouter.from_config(
+        {
+            "endpoints": [
+                {"name": "main", "model_name": "m", "base_url": "u", "api_key": "k"},
+                {"model_name": "m2", "base_url": "u2", "api_key_env": "BACKUP_KEY"},
+            ],
+            "routing": {"health_interval": 60},
+        }
+    )
+
+    assert [e.name for e in router.endpoints] == ["main", "u2"]
+    assert router.endpoints[1].config["api_key"] == "secret"
+    assert router.health_interval == 60
+    assert models.EndpointRouter.from_config({}) is None
+    assert models.ApiConfig(router=router).base_url == "u"
@@ -1,6 +1,7 @@
 import os
 import shlex
 import types
+from pathlib import Path
 import sys
 import pytest
 
@@ -131,11 +132,12 @@ def test_prep_prompt(monkeypatch, template, expected):
     # monkeypath = fixture that lets you replace attributes, functions, or variables in tests
     # setattr -> replace an attribute on an object or module
     # remember: methods are just attributes on classes
-    monkeypatch.setattr(sys, "platform", "win32")
-    monkeypatch.setattr(os, "getcwd", lambda: "/fake/path")
+    # psutil is imported lazily, patch it before faking the platform it checks
     monkeypatch.setattr(
         "psutil.Process", lambda pid: types.SimpleNamespace(name=lambda: "bash")
     )
+    monkeypatch.setattr(sys, "platform", "win32")
+    monkeypatch.setattr(os, "getcwd", lambda: "/fake/path")
 
     result = prep.prep_prompt("hello", template)
     assert result == expected
@@ -173,3 +175,81 @@ def test_load_template(tmp_path):
     # check file is loaded correctly
     template = prep.load_template(tfile).strip()
     assert template == file_content
+
+
+@pytest.mark.parametrize("mode", ["compact", "full"])
+def test_load_prompt_templates(mode):
+    paths = types.SimpleNamespace(
+        script_path=Path(prep.__file__).parent, config={"prompt_mode": mode}
+    )
+    system, turn = prep.load_prompt_templates(paths)
+    assert "INSTRUCTIONS" in system
+    assert "<QUESTION>" in turn
+    # only the per-turn template carries the volatile context
+    assert "<CWD>" in turn
+
+
+def test_compact_mode_shrinks_requests():
+    paths = types.SimpleNamespace(script_path=Path(prep.__file__).parent, config={})
+    full, compact = (
+        prep.measure_requests(
+            *prep.load_prompt_templates(paths, mode), 10, "question?", "answer."
+        )
+        for mode in ("full", "compact")
+    )
+    assert all(c[0] < f[0] for c, f in zip(compact, full))
+    # savings grow with every turn
+    assert full[-1][0] - compact[-1][0] > full[0][0] - compact[0][0]
+
+
+def test_prompt_context_is_cached_until_cwd_changes(monkeypatch):
+    calls = []
+
+    def fake_process(pid):
+        calls.append(pid)
+        return types.SimpleNamespace(name=lambda: "bash")
+
+    monkeypatch.setattr("psutil.Process", fake_process)
+    monkeypatch.setattr(os, "getcwd", lambda: "/first")
+
+    assert prep.prep_prompt("q", "<SHELL> <CWD>") == "bash /first"
+    assert prep.prep_prompt("q", "<SHELL> <CWD>") == "bash /first"
+
+    monkeypatch.setattr(os, "getcwd", lambda: "/second")
+    assert prep.prep_prompt("q", "<SHELL> <CWD>") == "bash /second"
+    # the parent process is only inspected once per session
+    assert len(calls) == 1
+
+
+def test_prep_prompt_does_not_expand_placeholders_in_question(monkeypatch):
+    monkeypatch.setattr(
+        "psutil.Process", lambda pid: types.SimpleNamespace(name=lambda: "bash")
+    )
+    assert (
+        prep.prep_prompt("what is <SHELL>?", "Q: <QUESTION>") == "Q: what is <SHELL>?"
+    )
+
+
+@pytest.mark.parametrize("mode", ["compact", "full"])
+def test_prompt_prefix_is_stable_when_the_context_changes(mode, monkeypatch):
+    paths = types.SimpleNamespace(script_path=Path(prep.__file__).parent, config={})
+    system, turn = prep.load_prompt_templates(paths, mode)
+    monkeypatch.setattr(
+        "psutil.Process", lambda pid: types.SimpleNamespace(name=lambda: "bash")
+    )
+
+    def request(cwd: str) -> list[dict[str, str]]:
+        monkeypatch.setattr(os, "getcwd", lambda: cwd)
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prep.prep_prompt("list files", turn)},
+        ]
+
+    first, second = request("/first"), request("/second")
+
+    # the instructions are the same bytes wherever the user is
+    assert first[0] == second[0]
+    assert not any(name in system for name in ("<OS>", "<SHELL>", "<CWD>"))
+    # and each turn only differs at its very end
+    common = os.path.commonprefix([first[1]["content"], second[1]["content"]])
+    assert first[1]["content"][len(common) :].startswith("first]")
@@ -0,0 +1,34 @@
+from cliqq import reduce
+
+
+def test_strip_ansi_keeps_final_progress_text():
+    text = "\x1b[1;32mok\x1b[0m\n10%\r50%\r100% done\n\x1b]0;title\x07plain"
+    assert reduce.strip_ansi(text) == "ok\n100% done\nplain"
+
+
+def test_collapse_repeats_counts_near_identical_lines():
+    lines = [f"step {i} took {i * 3}ms" for i in range(50)] + ["done"]
+    assert reduce.collapse_repeats(lines) == [
+        "step 0 took 0ms",
+        "[... similar line repeated 49 more times]",
+        "done",
+    ]
+
+
+def test_reduce_text_keeps_head_tail_and_errors_within_budget():
+    lines = [f"compiling module_{chr(65 + i % 26) * (i % 9)}" for i in range(5000)]
+    lines[2500] = "error: undefined reference to `main'"
+    reduced = reduce.reduce_text("\n".join(lines), max_tokens=300)
+
+    assert reduce.estimate_text_tokens(reduced) <= 300
+    kept = reduced.split("\n")
+    assert kept[0] == lines[0]
+    assert kept[-1] == lines[-1]
+    assert lines[2500] in kept
+    assert any("lines omitted" in line for line in kept)
+
+
+def test_reduce_output_includes_stderr():
+    reduced = reduce.reduce_output("built 3 targets\n", "warning: unused variable\n")
+    assert reduced == ("stdout:\nbuilt 3 targets\n\nstderr:\nwarning: unused variable")
+    assert reduce.reduce_output("", "") == ""
@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+from cliqq import action, safety
+
+
+@pytest.mark.parametrize(
+    "command,expected",
+    [
+        ("git log --format=json", "safe"),
+        ("ls -la", "safe"),
+        ("format c:", "deny"),
+        # deny rules are substrings, outside option names
+        ("reformat c:", "deny"),
+        ("formatdisk", "deny"),
+        ("shutdown-now", "deny"),
+        ("echo asphalt", "deny"),
+        # confirm rules need whole words
+        ("mycurl https://example.com", "safe"),
+        ("rm -rf /", "deny"),
+        ("bash -c 'shutdown now'", "deny"),
+        ("cd /tmp && sudo -u root /sbin/mkfs.ext4 /dev/sdb", "deny"),
+        ("curl https://example.com", "confirm"),
+        ("FOO=1 nohup truncate -s 0 log.txt", "confirm"),
+        # denied anywhere in the command, not only as the program
+        ("systemctl reboot", "deny"),
+        ("systemctl poweroff", "deny"),
+        ("find / -exec shutdown \\;", "deny"),
+        ("eval shutdown", "deny"),
+        ("echo `reboot`", "deny"),
+        ("ssh host reboot", "deny"),
+        ("timeout -s KILL 5 reboot", "deny"),
+    ],
+)
+def test_classify_command(command, expected):
+    assert action.classify_command(command) == expected
+
+
+def test_command_programs_follows_pipelines_and_wrappers():
+    programs = safety.command_programs(
+        'cat a.txt | sudo -E env X=1 /usr/bin/tee b.txt; powershell.exe -c "ls"'
+    )
+    assert programs == ["cat", "sudo", "env", "tee", "powershell", "ls"]
+
+
+@pytest.mark.parametrize(
+    "command,programs",
+    [
+        ("timeout -s KILL 5 reboot", ["timeout", "reboot"]),
+        ("ssh -p 22 host reboot", ["ssh", "reboot"]),
+        ("eval shutdown", ["eval", "shutdown"]),
+        ("echo `reboot`", ["echo", "reboot"]),
+        ("echo $(reboot now)", ["echo", "reboot"]),
+        ("find / -exec shutdown \\;", ["find", "shutdown"]),
+    ],
+)
+def test_command_programs_finds_hidden_programs(command, programs):
+    assert safety.command_programs(command) == programs
+
+
+def test_compile_rules_matches_like_the_linear_scan():
+    rules = ["rm -r", "rm -f", "/dev/sd", "git push", "curl"]
+    pattern = safety.compile_rules(rules)
+
+    assert pattern.search("sudo rm -rf x")
+    assert pattern.search("dd of=/dev/sda")
+    assert pattern.search("git push --force")
+    assert not pattern.search("mycurl x")
+    # only single-word rules need a word boundary at the end
+    assert pattern.search("git pushd")
+    assert safety.compile_rules([]) is None
+
+
+def test_compile_rules_without_whole_words_matches_substrings():
+    pattern = safety.compile_rules(["format", "shutdown"], whole_words=False)
+
+    assert pattern.search("reformat c:")
+    assert pattern.search("shutdown-now")
+    assert not pattern.search("git log --format=json")
+
+
+def test_user_rules_extend_packaged_rules(tmp_path):
+    packaged = tmp_path / "packaged.json"
+    packaged.write_text(json.dumps({"DENY_ALWAYS": ["rm -rf"]}))
+    user = tmp_path / "user.json"
+    user.write_text(json.dumps({"CONFIRM_PROGRAMS": ["Terraform"]}))
+    broken = tmp_path / "broken.json"
+    broken.write_text("{")
+
+    rules = safety.load_rules(packaged, user, broken, tmp_path / "missing.json")
+    classifier = safety.SafetyClassifier(rules)
+
+    assert classifier.classify("terraform apply") == "confirm"
+    assert classifier.classify("rm -rf build") == "deny"
+    assert classifier.classify("make build") == "safe"
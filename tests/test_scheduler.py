@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from cliqq import scheduler
+
+
+def status_error(status, headers=None):
+    request = httpx.Request("POST", "http://api")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    return openai.APIStatusError("failed", response=response, body=None)
+
+
+@pytest.mark.parametrize(
+    "value,seconds",
+    [("1s", 1.0), ("6m0s", 360.0), ("20ms", 0.02), ("1h2m3.5s", 3723.5), ("x", None)],
+)
+def test_parse_duration(value, seconds):
+    assert scheduler.parse_duration(value) == seconds
+
+
+@pytest.mark.parametrize(
+    "headers,seconds",
+    [
+        ({"retry-after": "2"}, 2.0),
+        ({"retry-after-ms": "250", "retry-after": "9"}, 0.25),
+        ({"x-ratelimit-reset-requests": "1s", "x-ratelimit-reset-tokens": "3s"}, 3.0),
+        ({"retry-after": "Thu, 01 Jan 1970 00:00:00 GMT"}, 0.0),
+        ({}, None),
+    ],
+)
+def test_header_delay(headers, seconds):
+    assert scheduler.header_delay(httpx.Headers(headers)) == seconds
+
+
+def test_retry_delay_honours_retry_after_and_pauses_everyone():
+    requests = scheduler.RequestScheduler(base_delay=0.01)
+
+    delay = requests.retry_delay(status_error(429, {"retry-after": "2"}), 0)
+
+    assert delay == 2.0
+    assert requests._paused_until > time.monotonic() + 1.5
+
+
+def test_retry_delay_gives_up():
+    requests = scheduler.RequestScheduler(max_retries=2, max_wait=10)
+
+    assert requests.retry_delay(status_error(400), 0) is None
+    assert requests.retry_delay(status_error(503), 2) is None
+    assert requests.retry_delay(status_error(429, {"retry-after": "60"}), 0) is None
+    assert 0 <= requests.retry_delay(status_error(503), 1) <= 1.0
+
+
+def test_token_bucket_paces_requests():
+    requests = scheduler.RequestScheduler(rate=50, burst=2)
+
+    async def send(count):
+        start = time.monotonic()
+        for _ in range(count):
+            await requests.acquire()
+        return time.monotonic() - start
+
+    # two at once, then one every 20 ms
+    assert asyncio.run(send(6)) >= 0.07
+
+
+def test_call_retries_transient_failures():
+    requests = scheduler.RequestScheduler(base_delay=0.001)
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise status_error(502)
+        return "ok"
+
+    assert asyncio.run(requests.call(flaky)) == "ok"
+    assert len(attempts) == 3
+
+    async def bad_request():
+        raise status_error(400)
+
+    with pytest.raises(openai.APIStatusError):
+        asyncio.run(requests.call(bad_request))
@@ -0,0 +1,137 @@
+import json
+import os
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from cliqq import commands, sessions
+from cliqq.models import ChatHistory
+
+
+def turn(i):
+    return [
+        {"role": "user", "content": f"question {i} " + "x" * 40},
+        {"role": "assistant", "content": f"answer {i} " + "y" * 40},
+    ]
+
+
+def test_messages_are_appended_as_they_are_remembered(tmp_path):
+    store = sessions.SessionLog(tmp_path)
+    history = ChatHistory(store=store)
+
+    history.remember({"role": "system", "content": "template"})
+    assert not store.path.exists()
+
+    store.set_title("how do I   list files?")
+    store.set_title("a later question")
+    for msg in turn(1):
+        history.remember(msg)
+
+    records = [json.loads(line) for line in store.path.read_text().splitlines()]
+    assert records[0]["title"] == "how do I list files?"
+    assert [r["role"] for r in records[1:]] == ["user", "assistant"]
+    assert sessions.session_title(store.path) == "how do I list files?"
+
+
+def test_load_messages_reads_only_the_newest_whole_turns(tmp_path):
+    store = sessions.SessionLog(tmp_path)
+    store.set_title("first")
+    for i in range(50):
+        for msg in turn(i):
+            store.append(msg)
+        if i == 47:
+            # turns 46 and 47 were still in the history
+            store.append({"role": "summary", "content": "earlier turns"}, kept=4)
+    # a crash in the middle of a write
+    with open(store.path, "a") as f:
+        f.write('{"time": "2025-01-01", "role": "us')
+
+    messages = sessions.load_messages(store.path, max_tokens=100)
+
+    assert messages[0] == {"role": "summary", "content": "earlier turns"}
+    assert messages[1]["role"] == "user"
+    assert messages[-1]["content"].startswith("answer 49")
+    assert len(messages) == 1 + 6
+    # the turns the summary covers aren't restored as well
+    messages = sessions.load_messages(store.path)
+    assert messages[1]["content"].startswith("question 46")
+    assert len(messages) == 1 + 8
+
+
+def test_load_messages_without_kept_count_only_reads_past_the_summary(tmp_path):
+    store = sessions.SessionLog(tmp_path)
+    for i in range(3):
+        for msg in turn(i):
+            store.append(msg)
+        if i == 1:
+            store.append({"role": "summary", "content": "earlier turns"})
+
+    messages = sessions.load_messages(store.path)
+
+    assert [msg["role"] for msg in messages] == ["summary", "user", "assistant"]
+    assert messages[1]["content"].startswith("question 2")
+
+
+def test_resumed_history_matches_the_saved_one(tmp_path):
+    store = sessions.SessionLog(tmp_path)
+    history = ChatHistory(
+        max_tokens=100, summarizer=lambda messages: "earlier turns", store=store
+    )
+    history.remember({"role": "system", "content": "template"})
+    for i in range(6):
+        for msg in turn(i):
+            history.remember(msg)
+    deadline = time.monotonic() + 5
+    while history._summarizing and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    resumed = ChatHistory(max_tokens=100)
+    resumed.remember({"role": "system", "content": "template"})
+    resumed.restore(sessions.load_messages(store.path, max_tokens=100))
+
+    assert resumed.messages() == history.messages()
+
+
+def test_find_session(tmp_path):
+    for name, age in (("20250101-090000-aaaa", 30), ("20250102-090000-bbbb", 20)):
+        path = tmp_path / f"{name}.jsonl"
+        path.write_text("")
+        os.utime(path, (time.time() - age, time.time() - age))
+    (tmp_path / "20250102-100000-cccc.jsonl").write_text("")
+
+    assert sessions.find_session(tmp_path)["id"] == "20250102-100000-cccc"
+    assert (
+        sessions.find_session(tmp_path, exclude="20250102-100000-cccc")["id"]
+        == "20250102-090000-bbbb"
+    )
+    assert sessions.find_session(tmp_path, "20250101")["id"] == "20250101-090000-aaaa"
+    assert sessions.find_session(tmp_path, "2026") is None
+    with pytest.raises(ValueError):
+        sessions.find_session(tmp_path, "20250102")
+
+
+def test_resume_continues_the_saved_session(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        commands, "load_prompt_templates", lambda paths: ("template", "<QUESTION>")
+    )
+    paths = Mock(sessions_path=tmp_path)
+
+    old = sessions.SessionLog(tmp_path)
+    old.set_title("old question")
+    for i in range(3):
+        for msg in turn(i):
+            old.append(msg)
+    size = old.path.stat().st_size
+
+    history = ChatHistory(max_tokens=100, store=sessions.SessionLog(tmp_path))
+    commands.resume_session(history, paths)
+
+    assert history.messages()[0] == {"role": "system", "content": "template"}
+    assert history.messages()[-1]["content"].startswith("answer 2")
+    assert history.total_tokens <= 100
+    # restored messages aren't saved twice, new ones go to the same session
+    assert old.path.stat().st_size == size
+    history.remember({"role": "user", "content": "and now?"})
+    assert history.store.session_id == old.session_id
+    assert json.loads(old.path.read_text().splitlines()[-1])["content"] == "and now?"
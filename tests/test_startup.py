@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+
+def imported_modules(code: str) -> set[str]:
+    # fresh interpreter so nothing imported by other tests leaks in
+    env = dict(os.environ, PYTHONPATH=str(SRC))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env,
+    )
+    return {
+        line.split("|")[-1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:")
+    }
+
+
+@pytest.mark.parametrize(
+    "code,lazy",
+    [
+        # every entry path: argv parsing, /help, /log, ...
+        ("import cliqq.main", ["openai", "httpx", "psutil", "dotenv"]),
+        # psutil is fine once a prompt is built, the network stack isn't
+        (
+            "import cliqq.main\nfrom cliqq.prep import prep_prompt\nprep_prompt('hi', '<SHELL>')",
+            ["openai", "httpx", "dotenv"],
+        ),
+    ],
+)
+def test_heavy_imports_are_lazy(code, lazy):
+    modules = imported_modules(code)
+    assert "cliqq.main" in modules
+    for module in lazy:
+        assert module not in modules
@@ -0,0 +1,94 @@
+import asyncio
+import json
+from itertools import count
+
+import pytest
+
+from cliqq import ai, stats
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch, tmp_path):
+    monkeypatch.setattr(stats, "_path", tmp_path / "stats.jsonl")
+    monkeypatch.setattr(stats, "_session", [])
+    monkeypatch.setattr(stats, "_turn", None)
+    return tmp_path / "stats.jsonl"
+
+
+def test_turn_records_stages_and_generation_speed():
+    ticks = count()
+    turn = stats.TurnTimer(clock=lambda: float(next(ticks)))
+
+    with turn.stage("ensure_api"):
+        pass
+    with turn.stage("ensure_api"):
+        pass
+    turn.durations.update(ttft=2.0, stream=6.0)
+    turn.tokens = 100
+
+    turn.end()
+    record = turn.record()
+
+    assert record["ensure_api"] == 2.0
+    assert record["tokens_per_s"] == 25.0
+    assert record["total"] == 5.0
+    assert turn.record()["total"] == 5.0
+
+
+def test_finished_turns_are_kept_and_saved(fresh_stats):
+    stats.finish_turn()
+    assert stats.session_turns() == []
+
+    for _ in range(3):
+        stats.start_turn()
+        with stats.stage("prep_prompt"):
+            pass
+    stats.finish_turn()
+
+    assert len(stats.session_turns()) == 3
+    saved = [json.loads(line) for line in fresh_stats.read_text().splitlines()]
+    assert saved == stats.session_turns()
+    assert [turn["total"] for turn in stats.load_turns(fresh_stats, limit=2)] == [
+        turn["total"] for turn in saved[1:]
+    ]
+
+
+def test_time_stream_measures_first_token_and_tokens():
+    turn = stats.TurnTimer()
+
+    async def consume():
+        return [delta async for delta in ai.time_stream(["abcd", "efgh"], turn)]
+
+    assert asyncio.run(consume()) == ["abcd", "efgh"]
+    assert 0 <= turn.durations["ttft"] <= turn.durations["stream"]
+    assert turn.tokens == 2
+
+
+def test_summary_percentiles_and_exports():
+    turns = [{"ttft": float(i), "tokens_per_s": 10.0 * i} for i in range(1, 101)]
+
+    summary = stats.summarize(turns)
+
+    assert summary["ttft"]["p50"] == 51.0
+    assert summary["ttft"]["p99"] == 100.0
+    assert summary["ttft"]["count"] == 100
+    assert "total" not in summary
+
+    text = stats.to_prometheus(summary, "session")
+    assert "# TYPE cliqq_turn_stage_seconds summary" in text
+    assert (
+        'cliqq_turn_stage_seconds{stage="ttft",scope="session",quantile="0.95"} 96.0'
+        in text
+    )
+    assert 'cliqq_tokens_per_second_count{scope="session"} 100' in text
+    assert "ttft" in stats.format_stats(summary, len(turns))
+
+
+def test_export_replaces_the_file(tmp_path):
+    target = tmp_path / "metrics" / "cliqq.prom"
+
+    stats.export_stats("old\n", target)
+    stats.export_stats("new\n", target)
+
+    assert target.read_text() == "new\n"
+    assert [path.name for path in target.parent.iterdir()] == ["cliqq.prom"]